@@ -150,11 +150,66 @@ const fetchTimeout = (url, ms, { signal, ...options } = {}) => {
 };
 
 
+// The version of data.compact.json (OUTPUT_FORMAT_VERSION in generate_json.py) this script can read.
+const COMPACT_DATA_FORMAT = 2;
+
+function ExpandCompactItemData(compact) {
+    // Rebuild the layout of data.json from data.compact.json, which is a fraction of the size to download and parse.
+    let strings = compact.strings;
+    let items = compact.items;
+    let metadata = {};
+    for (let i = 0; i < items.id.length; i++) {
+        let item_metadata = {name: strings[items.name[i]], quality: items.quality[i]};
+        if (items.achievement_id[i] >= 0) {
+            item_metadata.achievement_id = items.achievement_id[i];
+        }
+        metadata[items.id[i]] = item_metadata;
+    }
+
+    let itempools = {};
+    for (const pool of compact.pools) {
+        let pool_items = [];
+        for (let bucket = 0; bucket + 1 < pool.quality_offsets.length; bucket++) {
+            for (let i = pool.quality_offsets[bucket]; i < pool.quality_offsets[bucket + 1]; i++) {
+                let item_id = pool.items[i];
+                pool_items.push({id: item_id, name: metadata[item_id].name, weight: pool.weights[i] / 100, quality: compact.min_quality + bucket});
+            }
+        }
+        // data.json lists each pool's items by ID, which is the order they're weighed in.
+        pool_items.sort((a, b) => a.id - b.id);
+        itempools[pool.id] = {name: strings[pool.name], items: pool_items};
+    }
+
+    let recipes = {};
+    for (let i = 0; i < compact.recipes.keys.length; i++) {
+        recipes[compact.recipes.keys[i]] = compact.recipes.items[i];
+    }
+    return {itempools: itempools, metadata: metadata, recipes: recipes};
+}
+
+
+async function FetchItemData(version) {
+    try {
+        let compact_data = await fetchTimeout(`gamedata/${version}/data.compact.json`, 5000);
+        if (compact_data.ok) {
+            let compact = await compact_data.json();
+            if (compact.format === COMPACT_DATA_FORMAT) {
+                return ExpandCompactItemData(compact);
+            }
+        }
+    } catch (e) {
+        console.log(`Couldn't load the compact game data for ${version}: ${e}`);
+    }
+    // Deployments from before the compact format only have data.json.
+    let versioned_data = await fetchTimeout(`gamedata/${version}/data.json`, 5000);
+    return await versioned_data.json();
+}
+
+
 async function GetItemData(version) {
     if (_item_data[version] === undefined) {
         console.log(`Fetching game data for ${version}`);
-        let versioned_data = await fetchTimeout(`gamedata/${version}/data.json`, 5000);
-        _item_data[version] = await versioned_data.json();
+        _item_data[version] = await FetchItemData(version);
     }
     return _item_data[version];
 }
@@ -450,5 +505,5 @@ async function get_result(input_array, currentSeed, version_hash) {
 }
 
 if (typeof exports !== 'undefined') {
-    module.exports = { get_result };
+    module.exports = { get_result, ExpandCompactItemData };
 }
@@ -1,9 +1,35 @@
 #!/usr/bin/env python3
 
 # It's python3 -m http.server PORT for a CORS world
+#
+# Usage: server.py [--dev] [--precompress] [HOST] [PORT]
+#
+# By default this serves the site as it would be in production: from several threads, with gzipped variants of
+# files (FILE.gz, written by --precompress) for clients which accept them, strong ETags, and long-lived caching
+# for hashed bundles (e.g. index.06882ec6.js) and versioned game data. Conditional requests are answered with 304.
+# --dev turns caching off instead, so edits show up on the next reload.
 
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http import HTTPStatus
+from http.server import HTTPServer, SimpleHTTPRequestHandler, ThreadingHTTPServer
+import email.utils
+import gzip
+import hashlib
+import os
+import re
 import sys
+import threading
+
+
+# Files which are worth gzipping.
+COMPRESSIBLE_EXTENSIONS = ['.html', '.js', '.css', '.json', '.svg', '.xml', '.wasm']
+
+# Bundles with a content hash in their name never change, so they can be cached forever.
+HASHED_ASSET = re.compile(r'\.[0-9a-f]{8}\.(js|css)$')
+HASHED_MAX_AGE = 365 * 24 * 60 * 60
+
+# Game data is versioned by path, but is regenerated in place now and then, so it's cached for a week.
+VERSIONED_ASSET = re.compile(r'^/gamedata/[^/]+/[^/]+/')
+VERSIONED_MAX_AGE = 7 * 24 * 60 * 60
 
 
 class CORSRequestHandler(SimpleHTTPRequestHandler):
@@ -33,9 +59,127 @@ class CORSRequestHandler(SimpleHTTPRequestHandler):
         self.end_headers()
 
 
-host = sys.argv[1] if len(sys.argv) > 2 else '0.0.0.0'
-port = int(sys.argv[len(sys.argv)-1]) if len(sys.argv) > 1 else 8080
+class ProductionRequestHandler(CORSRequestHandler):
+    # ETags by (path, modification time, size), so files are only hashed again when they change.
+    etags = {}
+    etags_lock = threading.Lock()
+
+    def end_headers(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', '*')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        return SimpleHTTPRequestHandler.end_headers(self)
+
+    def get_etag(self, path, stat):
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self.etags_lock:
+            etag = self.etags.get(key)
+        if etag is None:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 16), b''):
+                    digest.update(block)
+            etag = '"{}"'.format(digest.hexdigest()[:32])
+            with self.etags_lock:
+                self.etags[key] = etag
+        return etag
+
+    def get_cache_control(self):
+        url_path = self.path.split('?', 1)[0]
+        if HASHED_ASSET.search(url_path):
+            return 'public, max-age={}, immutable'.format(HASHED_MAX_AGE)
+        if VERSIONED_ASSET.match(url_path):
+            return 'public, max-age={}'.format(VERSIONED_MAX_AGE)
+        # Everything else (e.g. index.html, which points at the current bundles) is checked on every load.
+        return 'no-cache'
+
+    def accepts_gzip(self):
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = coding.strip().partition(';')
+            if name.strip() == 'gzip' and params.replace(' ', '') not in ['q=0', 'q=0.0']:
+                return True
+        return False
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) or not os.path.isfile(path):
+            # Directory listings, redirects and 404s are handled as usual.
+            return SimpleHTTPRequestHandler.send_head(self)
+
+        content_type = self.guess_type(path)
+        encoding = None
+        variants = os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS
+        if variants and self.accepts_gzip():
+            gzip_path = path + '.gz'
+            if os.path.isfile(gzip_path) and os.stat(gzip_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+                path, encoding = gzip_path, 'gzip'
+
+        try:
+            file = open(path, 'rb')
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, 'File not found')
+            return None
+        try:
+            stat = os.fstat(file.fileno())
+            etag = self.get_etag(path, stat)
+            if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                file.close()
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self.send_validators(etag, stat, variants)
+                self.end_headers()
+                return None
+
+            self.send_response(HTTPStatus.OK)
+            self.send_header('Content-Type', content_type)
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Content-Length', str(stat.st_size))
+            self.send_validators(etag, stat, variants)
+            self.end_headers()
+            return file
+        except Exception:
+            file.close()
+            raise
+
+    def send_validators(self, etag, stat, variants):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', email.utils.formatdate(stat.st_mtime, usegmt=True))
+        self.send_header('Cache-Control', self.get_cache_control())
+        if variants:
+            self.send_header('Vary', 'Accept-Encoding')
+
+
+def precompress(directory):
+    # Write FILE.gz next to each compressible file which doesn't have an up to date one.
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            gzip_path = path + '.gz'
+            if os.path.isfile(gzip_path) and os.stat(gzip_path).st_mtime_ns >= os.stat(path).st_mtime_ns:
+                continue
+            with open(path, 'rb') as file:
+                data = file.read()
+            # mtime=0 keeps the output (and so its ETag) the same for the same input.
+            with open(gzip_path + '.tmp', 'wb') as file:
+                file.write(gzip.compress(data, 9, mtime=0))
+            os.replace(gzip_path + '.tmp', gzip_path)
+            print("Compressed {}".format(os.path.relpath(path, directory)))
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    dev = '--dev' in sys.argv
+    host = args[0] if len(args) > 1 else '0.0.0.0'
+    port = int(args[len(args)-1]) if args else 8080
+
+    if '--precompress' in sys.argv:
+        precompress(os.getcwd())
 
-print("Listening on {}:{}".format(host, port))
-httpd = HTTPServer((host, port), CORSRequestHandler)
-httpd.serve_forever()
+    print("Listening on {}:{}{}".format(host, port, " (development mode)" if dev else ""))
+    if dev:
+        httpd = HTTPServer((host, port), CORSRequestHandler)
+    else:
+        httpd = ThreadingHTTPServer((host, port), ProductionRequestHandler)
+    httpd.serve_forever()
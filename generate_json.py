@@ -1,48 +1,184 @@
 import argparse
+import gzip
+import hashlib
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
 from crafting_calculator.isaac_recipes import HardcodedRecipe
 from crafting_calculator.isaac_item_pools import ItemPool
 from crafting_calculator.isaac_items import ItemListEntry
-from crafting_calculator.utilities import GAME_VERSIONS, DEFAULT_PLATFORM, DEFAULT_GAME_VERSION
+from crafting_calculator.utilities import GAME_VERSIONS, DEFAULT_PLATFORM, DEFAULT_GAME_VERSION, get_gamedata_path
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument("--output-folder", "-o", required=True)
-    args = parser.parse_args()
+# Bump this when the output changes, so every version is generated again.
+OUTPUT_FORMAT_VERSION = 2
 
-    for platform in GAME_VERSIONS:
-        for version in GAME_VERSIONS[platform]["versions"]:
+# The range of item qualities (some items have a crafting quality of -1), so every pool has the same quality buckets.
+MIN_QUALITY = -1
+MAX_QUALITY = 4
+
+
+def get_source_hash(platform, version):
+    # A hash of the game data files a version is generated from.
+    source_path = get_gamedata_path(platform, version, "")
+    digest = hashlib.sha256(f"{OUTPUT_FORMAT_VERSION}".encode())
+    for filename in sorted(os.listdir(source_path)):
+        digest.update(filename.encode("utf-8") + b"\0")
+        with open(os.path.join(source_path, filename), "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def get_verbose_data(recipes, item_pools, metadata):
+    recipes_new = {k: recipes[k].item_id for k in recipes}
+
+    metadata_new = {}
+    for item_id in metadata:
+        item = metadata[item_id]
+        item_metadata = {"name": item.name, "quality": item.quality}
+        if item.achievement_id is not None:
+            item_metadata["achievement_id"] = item.achievement_id
+        metadata_new[item_id] = item_metadata
+
+    item_pools_new = {}
+    for pool_id in item_pools:
+        item_pool = item_pools[pool_id]
+        item_pool_list = []
+        for quality, item_list in item_pool.quality_lists.items():
+            item_pool_list.extend([{"id": item[0], "name": metadata[item[0]].name, "weight": item[1] / 100.0, "quality": quality} for item in item_list])
+        item_pools_new[pool_id] = {"name": item_pool.pool_name, "items": sorted(item_pool_list, key=lambda item: item["id"])}
+
+    return {"itempools": item_pools_new, "metadata": metadata_new, "recipes": recipes_new}
+
+
+def get_compact_data(recipes, item_pools, metadata):
+    """
+    The same data as `get_verbose_data`, laid out for the browser to use as is:
 
-            recipes = HardcodedRecipe.load_hardcoded_recipes(platform, version)
-            item_pools = ItemPool.load_item_pools(platform, version)
-            metadata = ItemListEntry.load_item_list(platform, version)
+    - `strings`: every item and pool name once. Names elsewhere are indexes into it.
+    - `items`: parallel arrays of `id`, `name`, `quality` and `achievement_id` (-1 if none), sorted by ID.
+    - `pools`: for each pool, its `id`, `name`, and parallel `items` and `weights` arrays sorted by quality, then ID.
+      Weights are integers, in hundredths. The items of quality Q are `items[quality_offsets[i]:quality_offsets[i + 1]]`,
+      where `i = Q - min_quality`.
+    - `recipes`: parallel `keys` (the hardcoded recipe keys, as strings since they don't fit in a JavaScript number)
+      and `items` arrays.
+    """
+    strings = []
+    string_ids = {}
 
-            recipes_new = {k: recipes[k].item_id for k in recipes}
+    def intern(string):
+        if string not in string_ids:
+            string_ids[string] = len(strings)
+            strings.append(string)
+        return string_ids[string]
 
-            metadata_new = {}
-            for item_id in metadata:
-                item = metadata[item_id]
-                item_metadata = {"name": item.name, "quality": item.quality}
-                if item.achievement_id is not None:
-                    item_metadata["achievement_id"] = item.achievement_id
-                metadata_new[item_id] = item_metadata
+    item_ids = sorted(metadata)
+    items = {
+        "id": item_ids,
+        "name": [intern(metadata[item_id].name) for item_id in item_ids],
+        "quality": [metadata[item_id].quality for item_id in item_ids],
+        "achievement_id": [
+            -1 if metadata[item_id].achievement_id is None else metadata[item_id].achievement_id for item_id in item_ids
+        ],
+    }
 
-            item_pools_new = {}
-            for pool_id in item_pools:
-                item_pool = item_pools[pool_id]
-                item_pool_list = []
-                for quality, item_list in item_pool.quality_lists.items():
-                    item_pool_list.extend([{"id": item[0], "name": metadata[item[0]].name, "weight": item[1] / 100.0, "quality": quality} for item in item_list])
-                item_pools_new[pool_id] = {"name": item_pool.pool_name, "items": sorted(item_pool_list, key=lambda item: item["id"])}
+    pools = []
+    for pool_id in sorted(item_pools):
+        item_pool = item_pools[pool_id]
+        pool_items = []
+        weights = []
+        quality_offsets = []
+        if any(not MIN_QUALITY <= quality <= MAX_QUALITY for quality in item_pool.quality_lists):
+            raise ValueError(f"Pool {item_pool.pool_name} has an item with a quality outside {MIN_QUALITY} to {MAX_QUALITY}.")
+        for quality in range(MIN_QUALITY, MAX_QUALITY + 1):
+            quality_offsets.append(len(pool_items))
+            for item_id, weight in sorted(item_pool.quality_lists.get(quality, [])):
+                pool_items.append(item_id)
+                weights.append(weight)
+        quality_offsets.append(len(pool_items))
+        pools.append(
+            {
+                "id": pool_id,
+                "name": intern(item_pool.pool_name),
+                "items": pool_items,
+                "weights": weights,
+                "quality_offsets": quality_offsets,
+            }
+        )
 
-            output = {"itempools": item_pools_new, "metadata": metadata_new, "recipes": recipes_new}
+    recipe_keys = sorted(recipes)
+    return {
+        "format": OUTPUT_FORMAT_VERSION,
+        "min_quality": MIN_QUALITY,
+        "strings": strings,
+        "items": items,
+        "pools": pools,
+        "recipes": {"keys": [str(key) for key in recipe_keys], "items": [recipes[key].item_id for key in recipe_keys]},
+    }
 
+
+def write_json(path, data, compress=False):
+    # Write to a temporary file first, so the web app never reads a partly written file.
+    payload = json.dumps(data, separators=(",", ":") if compress else None).encode("utf-8")
+    with open(path + ".tmp", "wb") as f:
+        f.write(payload)
+    os.replace(path + ".tmp", path)
+    if compress:
+        # mtime=0 keeps the output the same for the same input, so it's only served again when it changes.
+        with open(path + ".gz.tmp", "wb") as f:
+            f.write(gzip.compress(payload, 9, mtime=0))
+        os.replace(path + ".gz.tmp", path + ".gz")
+
+
+def generate_version(output_folder, platform, version):
+    recipes = HardcodedRecipe.load_hardcoded_recipes(platform, version)
+    item_pools = ItemPool.load_item_pools(platform, version)
+    metadata = ItemListEntry.load_item_list(platform, version)
+
+    base_path = os.path.join(output_folder, "gamedata", platform, version)
+    os.makedirs(base_path, exist_ok=True)
+    write_json(os.path.join(base_path, "data.json"), get_verbose_data(recipes, item_pools, metadata))
+    write_json(os.path.join(base_path, "data.compact.json"), get_compact_data(recipes, item_pools, metadata), compress=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output-folder", "-o", required=True)
+    parser.add_argument("--jobs", "-j", type=int, help="The number of versions to generate at once (defaults to the number of CPUs).")
+    parser.add_argument("--force", action="store_true", help="Generate every version, even if its game data hasn't changed.")
+    args = parser.parse_args()
+
+    # The hash of each version's game data when it was last generated, so unchanged versions are skipped.
+    hashes_path = os.path.join(args.output_folder, "gamedata", "hashes.json")
+    hashes = {}
+    if os.path.exists(hashes_path) and not args.force:
+        with open(hashes_path) as f:
+            hashes = json.load(f)
+
+    source_hashes = {}
+    for platform in GAME_VERSIONS:
+        for version in GAME_VERSIONS[platform]["versions"]:
+            name = f"{platform}/{version}"
+            source_hashes[name] = get_source_hash(platform, version)
             base_path = os.path.join(args.output_folder, "gamedata", platform, version)
-            os.makedirs(base_path, exist_ok=True)
-            with open(os.path.join(base_path, "data.json"), "w") as f:
-                json.dump(output, f)
+            outputs = [os.path.join(base_path, filename) for filename in ["data.json", "data.compact.json", "data.compact.json.gz"]]
+            if hashes.get(name) == source_hashes[name] and all(os.path.exists(path) for path in outputs):
+                print(f"Skipping {name}, which hasn't changed.")
+                del source_hashes[name]
+
+    os.makedirs(os.path.join(args.output_folder, "gamedata"), exist_ok=True)
+    try:
+        with ProcessPoolExecutor(args.jobs) as executor:
+            futures = {
+                executor.submit(generate_version, args.output_folder, *name.split("/")): name for name in source_hashes
+            }
+            for future, name in futures.items():
+                future.result()
+                hashes[name] = source_hashes[name]
+                print(f"Generated {name}.")
+    finally:
+        # Only the versions which were generated are recorded, so any which failed are tried again next time.
+        write_json(hashes_path, hashes)
 
     with open(os.path.join(args.output_folder, "gamedata", "versions.json"), "w") as f:
         version_metadata = {"default": f"{DEFAULT_PLATFORM}/{DEFAULT_GAME_VERSION}", "platforms": GAME_VERSIONS}
@@ -37,8 +37,6 @@ setup(
         # that you indicate you support Python 3. These classifiers are *not*
         # checked by 'pip install'. See instead 'python_requires' below.
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.7",
-        "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: 3.9",
         "Programming Language :: Python :: 3.10",
         "Programming Language :: Python :: 3 :: Only",
@@ -55,7 +53,7 @@ setup(
     include_package_data=True,
     package_dir={"": "src"},  # Optional
     packages=find_packages(where="src"),  # Required
-    python_requires=">=3.7, <4",
+    python_requires=">=3.9, <4",
     install_requires=[],  # Optional
     extras_require={  # Optional
         "emulation": ["unicorn", "capstone"],
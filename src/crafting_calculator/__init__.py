@@ -1,16 +1,120 @@
+import os
+import sys
 import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from .utilities import DEFAULT_GAME_VERSION, DEFAULT_PLATFORM, get_all_game_versions, parse_game_version_string
 from .calculator import (
     find_items_for_pickups,
-    find_recipes_for_item,
+    find_recipes_for_items,
     find_uncraftable_items,
-    find_item_id
+    find_item_id,
+    find_item_distribution,
+    find_fixed_recipes,
+    simulate_bag,
+    find_recipe_swaps,
+    print_search_plan,
+    find_cheapest_recipes_for_items,
+    get_item_targets,
 )
+from .archive import DEFAULT_BLOCK_SIZE, OutcomeArchive, archive_results
+from .coordinator import DEFAULT_LEASE, MIN_LEASE, ShardCoordinator, merge_shards, run_worker
+from .batch import DEFAULT_BATCH_SIZE, run_batch
+from .bundle import BUNDLE_PATH_VARIABLE, DEFAULT_BUNDLE_PATH, build_bundle
+from .cache import DEFAULT_CACHE_SIZE
+from .jobs import DEFAULT_MAX_JOBS
+from .store import RecipeStore, store_results
+from .server import DEFAULT_HOST, DEFAULT_PORT, run_server
+from .output import OUTPUT_FORMATS, ResultWriter, recipe_to_dict
+from .context import CraftingContext, get_flags_key, get_unlocked_mask
+from .predicates import ItemPredicate, filter_items
+from .search import get_default_pickup_costs
+from .shards import get_shard_items, parse_shard
+from .isaac_items import ItemListEntry
 from .isaac_pickups import PICKUP_LIST
 from .config import config
 
 
+def parse_pickup_cost(value: str):
+    pickup_id, _, cost = value.partition("=")
+    try:
+        return int(pickup_id), float(cost)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected ID=COST, got {value!r}")
+
+
+def parse_shard_argument(value: str):
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def parse_lease(value: str):
+    try:
+        lease = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected a number of seconds, got {value!r}.")
+    if lease < MIN_LEASE:
+        raise argparse.ArgumentTypeError(f"The lease must be at least {MIN_LEASE} second.")
+    return lease
+
+
+def parse_pickup_count(value: str):
+    pickup_id, _, count = value.partition("=")
+    try:
+        return int(pickup_id), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected ID=COUNT, got {value!r}")
+
+
+def run_query(args) -> None:
+    unlocked_mask = get_unlocked_mask(args.unlocked_achievements)
+    with RecipeStore(args.database) as store:
+        if args.seed is None:
+            seeds = store.find_seeds_for_item(args.game_version, args.item, args.pickups, get_flags_key(), unlocked_mask)
+            if args.format != "text":
+                with ResultWriter(args.format) as writer:
+                    for seed_string in seeds:
+                        writer.write({"seed": seed_string, "item_id": args.item})
+                return
+            print(f"Item {args.item} can be crafted on {len(seeds)} of {len(store.get_seeds(args.game_version, get_flags_key(), unlocked_mask))} stored seeds:")
+            for seed_string in seeds:
+                print(seed_string)
+            return
+
+        pickup_costs = get_default_pickup_costs()
+        pickup_costs.update(args.pickup_costs or [])
+        recipes = store.find_cheapest_recipes(
+            args.game_version, args.seed, args.item, args.top_k or 1, pickup_costs, args.pickups, get_flags_key(), unlocked_mask
+        )
+        if args.format != "text":
+            with ResultWriter(args.format) as writer:
+                for recipe in recipes:
+                    writer.write(recipe._asdict())
+            return
+        if not recipes:
+            print(f"No stored recipes craft item {args.item} on {args.seed}.")
+        for recipe in recipes:
+            print(f"[{', '.join(PICKUP_LIST[pickup_id].pickup_name for pickup_id in recipe.pickups)}] (cost {recipe.cost:g})")
+
+
+def run_shard_command(parser, args) -> None:
+    try:
+        if args.shard_command == "init":
+            job_argv = args.job_argv[1:] if args.job_argv[:1] == ["--"] else args.job_argv
+            coordinator = ShardCoordinator.create(args.directory, job_argv, args.shards)
+            print(f"Set up {coordinator.shard_count} shards in {args.directory}. Run `calculate_bag shard work {args.directory}` on each node.")
+        elif args.shard_command == "work":
+            finished = run_worker(args.directory, args.worker, args.lease)
+            print(f"Finished {finished} shards.")
+        if args.shard_command in ["work", "status"]:
+            status = ShardCoordinator(args.directory).get_status(args.lease)
+            print(f"{status['done']} of {status['shards']} shards done, {status['running']} running, {status['pending']} pending.")
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+
 def main():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -19,12 +123,10 @@ def main():
     )
     parser.add_argument(
         "--seed",
-        required=True,
         help="The seed for your save file (should be 8 characters; remove the space)",
     )
     parser.add_argument(
         "--pickups",
-        required=True,
         metavar="ID",
         type=int,
         nargs="+",
@@ -37,6 +139,13 @@ def main():
             ]
         ),
     )
+    parser.add_argument(
+        "--inventory",
+        metavar="ID=COUNT",
+        type=parse_pickup_count,
+        nargs="+",
+        help="Only use recipes which can be made from this many of each pickup, e.g. 12=3 2=1 8=12. Can be used instead of --pickups when searching.",
+    )
     parser.add_argument(
         "--game-version",
         required=False,
@@ -44,7 +153,88 @@ def main():
         default=f"{DEFAULT_PLATFORM}/{DEFAULT_GAME_VERSION}",
         choices=get_all_game_versions(),
     )
+    parser.add_argument(
+        "--format",
+        required=False,
+        help="The output format. json and ndjson print machine-readable results as they are found.",
+        default="text",
+        choices=OUTPUT_FORMATS,
+    )
+    parser.add_argument(
+        "--where",
+        metavar="CONDITION",
+        nargs="+",
+        help="Only look for items matching all of these conditions, skipping recipes which can't craft them. "
+        "Conditions can be quality<op>N (with =, !=, <, <=, > or >=), tag=NAME, tag!=NAME, pool=NAME, pool!=NAME, active or passive.",
+    )
+    parser.add_argument(
+        "--max-recipes",
+        metavar="N",
+        type=int,
+        help="With --find-item-recipes, stop looking for an item's recipes once N have been found, and stop searching once every item has N.",
+    )
+    parser.add_argument(
+        "--stop-after",
+        metavar="N",
+        type=int,
+        help="Stop searching once N results (items for --find-pickup-recipes, recipes for --find-item-recipes) have been found.",
+    )
+    parser.add_argument(
+        "--stop-when-stable",
+        metavar="N",
+        type=int,
+        help="With --find-pickup-recipes or --find-uncraftable-items, stop searching once N recipes in a row haven't crafted a new item. "
+        "This is faster, but may miss items.",
+    )
+    parser.add_argument(
+        "--top-k",
+        metavar="K",
+        type=int,
+        help="With --find-item-recipes, only find the K cheapest recipes (by --pickup-costs) instead of all of them.",
+    )
+    parser.add_argument(
+        "--pickup-costs",
+        metavar="ID=COST",
+        type=parse_pickup_cost,
+        nargs="+",
+        help="The cost of each pickup for --top-k. Pickups which aren't listed cost their quality.",
+    )
+    parser.add_argument(
+        "--grouped",
+        action="store_true",
+        help="With --find-pickup-recipes, --find-item-recipes or --find-uncraftable-items, evaluate recipes grouped by "
+        "weight table, building each table once. This is quicker and uses far less memory for big searches, but "
+        "finds recipes in a different order.",
+    )
+    parser.add_argument(
+        "--sample",
+        metavar="SECONDS",
+        type=float,
+        help="With --find-pickup-recipes or --find-uncraftable-items, sample recipes for this many seconds instead of "
+        "evaluating all of them, and estimate the chance of each item having been missed. Sampling for longer gets "
+        "closer to the exact answer, and is exact once every recipe has been sampled.",
+    )
+    parser.add_argument(
+        "--unlocked-achievements",
+        metavar="ID",
+        type=int,
+        nargs="*",
+        help="Only craft items whose achievements are in this list of unlocked achievement IDs, as the game does. "
+        "By default every achievement is treated as unlocked.",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        type=parse_shard_argument,
+        help="Only do the I-th (from 0) of N equal parts of a search (split by recipe), or of the seeds for store and archive, "
+        "so a big sweep can be split between machines. See the shard and merge commands.",
+    )
     group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--distribution",
+        action="store_true",
+        help="Calculate the chance of each item being crafted from these 8 pickups over all seeds, instead of for one seed.",
+    )
     group.add_argument(
         "--find-pickup-recipes",
         action="store_true",
@@ -52,9 +242,32 @@ def main():
     )
     group.add_argument(
         "--find-item-recipes",
-        metavar="ITEM_ID",
-        type=int,
-        help="Find all recipes matching this item ID for the given pickup types (sorted by quality).",
+        metavar="ITEM",
+        nargs="+",
+        help="Find all recipes matching these items for the given pickup types (sorted by quality), in a single pass. "
+        "Each item can be an item ID, quality:N for every item of that quality, or tag:NAME for every item with that tag.",
+    )
+    group.add_argument(
+        "--simulate",
+        action="store_true",
+        help="Treat the pickups as a stream picked up in order, and calculate what the bag would craft after each one once it holds 8.",
+    )
+    group.add_argument(
+        "--plan",
+        action="store_true",
+        help="Count the recipes using these pickup types by quality band and weight table, without calculating them. "
+        "With --where, also count how many can craft a matching item. No seed is needed.",
+    )
+    group.add_argument(
+        "--find-swaps",
+        action="store_true",
+        help="Find what every recipe one pickup swap away from these 8 pickups crafts. "
+        "Use --inventory to only swap in pickups you have, and --where to only show matching items.",
+    )
+    group.add_argument(
+        "--find-fixed-recipes",
+        action="store_true",
+        help="Find all recipes using these pickup types which craft the same item on every seed, such as hardcoded recipes. No seed is needed.",
     )
     group.add_argument(
         "--find-uncraftable-items",
@@ -102,8 +315,184 @@ def main():
         action="store_true",
         help="Set to true if the player has Trinket NO!",
     )
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    batch_parser = subparsers.add_parser(
+        "batch",
+        help="Calculate many single recipes from NDJSON input.",
+        description="Read one JSON request per line, e.g. "
+        '{"id": 1, "seed": "28RYNMMM", "pickups": [6, 21, 27, 11, 27, 22, 23, 20], "game_version": "pc/v1.7.9b", "flags": {"is_greed_mode": true}}, '
+        "and write one JSON result per line in the same order.",
+    )
+    batch_parser.add_argument(
+        "input",
+        nargs="?",
+        type=argparse.FileType("r", encoding="utf-8"),
+        default=sys.stdin,
+        help="The NDJSON file to read requests from (defaults to stdin).",
+    )
+    batch_parser.add_argument(
+        "--output",
+        "-o",
+        type=argparse.FileType("w", encoding="utf-8"),
+        default=sys.stdout,
+        help="The file to write NDJSON results to (defaults to stdout).",
+    )
+    batch_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="The number of requests to evaluate per worker task.",
+    )
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Serve crafting queries over HTTP.",
+        description="Answer JSON requests over HTTP, keeping game data loaded between requests. "
+        "POST /craft takes a single recipe lookup in the same format as batch. POST /find-pickup-recipes, "
+        "/find-item-recipes and /find-uncraftable-items take a query like "
+        '{"seed": "28RYNMMM", "pickups": [1, 2, 8, 12], "items": [45]} and are run in a process pool. '
+        "POST them to /jobs/<query> instead to run them in the background, and poll GET /jobs/<id> for progress.",
+    )
+    serve_parser.add_argument("--host", default=DEFAULT_HOST, help="The address to listen on.")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="The port to listen on.")
+    serve_parser.add_argument(
+        "--workers",
+        type=int,
+        help="The number of processes to run queries in (defaults to the number of CPUs).",
+    )
+    serve_parser.add_argument(
+        "--preload",
+        metavar="VERSION",
+        nargs="*",
+        default=[f"{DEFAULT_PLATFORM}/{DEFAULT_GAME_VERSION}"],
+        choices=get_all_game_versions(),
+        help="The game versions to load before serving.",
+    )
+    serve_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help="The number of search results to keep in memory, so repeated searches are answered without recalculating them.",
+    )
+    serve_parser.add_argument(
+        "--cache-dir",
+        help="A directory to also keep search results in, so they are kept between runs.",
+    )
+    serve_parser.add_argument(
+        "--max-jobs",
+        type=int,
+        default=DEFAULT_MAX_JOBS,
+        help="The number of jobs (searches submitted to /jobs) to run at once. The rest of the workers are kept free for other requests.",
+    )
+    bundle_parser = subparsers.add_parser(
+        "build-bundle",
+        help="Pack every version's game data into one file, which loads far quicker than the XML files.",
+        description="Compile every version's game data into one memory mapped bundle. Game data is then loaded from "
+        f"the bundle (or the one at ${BUNDLE_PATH_VARIABLE}) while the XML files it was built from are unchanged.",
+    )
+    bundle_parser.add_argument(
+        "--output",
+        "-o",
+        default=DEFAULT_BUNDLE_PATH,
+        help="The file to write the bundle to (defaults to gamedata/gamedata.bundle in the package).",
+    )
+    bundle_parser.add_argument(
+        "--game-versions",
+        nargs="+",
+        choices=get_all_game_versions(),
+        help="The versions to include (defaults to every version).",
+    )
+    store_parser = subparsers.add_parser(
+        "store",
+        help="Calculate every recipe from the pickups on many seeds, and keep them in an SQLite database to query later.",
+        description="Enumerate every recipe from the pickups on each seed, for --game-version, --unlocked-achievements "
+        "and the --tag-* flags, and write them to an SQLite database. Seeds which already have those recipes stored "
+        "are skipped.",
+    )
+    store_parser.add_argument("database", help="The SQLite database to write to (created if it doesn't exist).")
+    store_parser.add_argument("--pickups", metavar="ID", type=int, nargs="+", required=True, help="The pickup types to use.")
+    store_parser.add_argument("--seeds", metavar="SEED", nargs="+", required=True, help="The seeds to calculate recipes for.")
+    store_parser.add_argument(
+        "--workers",
+        type=int,
+        help="The number of processes to calculate recipes in (defaults to the number of CPUs).",
+    )
+    store_parser.add_argument("--force", action="store_true", help="Calculate seeds again even if their recipes are already stored.")
+    query_parser = subparsers.add_parser(
+        "query",
+        help="Answer questions about an item from a database written by store, without calculating anything.",
+        description="With --seed, find the --top-k cheapest stored recipes (by --pickup-costs) for the item on that "
+        "seed. Without it, find every stored seed the item can be crafted on. --game-version, --unlocked-achievements "
+        "and the --tag-* flags pick which stored results to use.",
+    )
+    query_parser.add_argument("database", help="The SQLite database written by store.")
+    query_parser.add_argument("--item", metavar="ID", type=int, required=True, help="The item to look for.")
+    query_parser.add_argument("--seed", help="The seed to find the item's cheapest recipes on.")
+    query_parser.add_argument("--pickups", metavar="ID", type=int, nargs="+", help="Only use recipes made from these pickup types.")
+    archive_parser = subparsers.add_parser(
+        "archive",
+        help="Calculate the outcome of every recipe on many seeds, and append them to a compressed archive.",
+        description="Calculate the item crafted by every recipe from the pickups (by default, every pickup type) on "
+        "each seed, for --game-version, --unlocked-achievements and the --tag-* flags, and append them to an archive "
+        "in compressed blocks. Seeds which are already archived are skipped.",
+    )
+    archive_parser.add_argument("archive", help="The archive to append to (created if it doesn't exist).")
+    archive_parser.add_argument("--seeds", metavar="SEED", nargs="+", required=True, help="The seeds to archive.")
+    archive_parser.add_argument("--pickups", metavar="ID", type=int, nargs="+", help="The pickup types to use (defaults to every one).")
+    archive_parser.add_argument(
+        "--block-size",
+        type=int,
+        default=DEFAULT_BLOCK_SIZE,
+        help="The number of recipes per compressed block. Smaller blocks make lookups quicker and the archive bigger.",
+    )
+    archive_parser.add_argument(
+        "--workers",
+        type=int,
+        help="The number of processes to calculate recipes in (defaults to the number of CPUs).",
+    )
+    archive_parser.add_argument("--force", action="store_true", help="Archive seeds again even if they're already archived.")
+    lookup_parser = subparsers.add_parser(
+        "lookup",
+        help="Look up the item a recipe crafts on a seed in an archive, without calculating it.",
+    )
+    lookup_parser.add_argument("archive", help="The archive written by the archive command.")
+    lookup_parser.add_argument("--seed", required=True, help="The seed to look up.")
+    lookup_parser.add_argument("--pickups", metavar="ID", type=int, nargs=8, required=True, help="The 8 pickups in the recipe.")
+    shard_parser = subparsers.add_parser(
+        "shard",
+        help="Split a command into shards, which nodes sharing a directory claim and run.",
+        description="Coordinate a sharded command through a shared directory, without any other service.",
+    )
+    shard_subparsers = shard_parser.add_subparsers(dest="shard_command", metavar="COMMAND", required=True)
+    shard_init_parser = shard_subparsers.add_parser(
+        "init",
+        help="Set up a directory to run a command as shards.",
+        description="Set up DIRECTORY to run a calculate_bag command as N shards. The command must contain {shard}, "
+        "which is replaced by each shard's I/N, e.g. --shard {shard}, and may contain {output}, which is replaced by "
+        "the file the shard should write to (e.g. a store or archive). Otherwise what the shard prints is its output.",
+    )
+    shard_init_parser.add_argument("directory", help="The shared directory.")
+    shard_init_parser.add_argument("--shards", type=int, required=True, help="The number of shards.")
+    shard_init_parser.add_argument("job_argv", metavar="ARG", nargs="+", help="The calculate_bag arguments, after --.")
+    for name, help_text in [("work", "Claim and run shards until none are left."), ("status", "Show how many shards are done.")]:
+        shard_command_parser = shard_subparsers.add_parser(name, help=help_text, description=help_text)
+        shard_command_parser.add_argument("directory", help="The shared directory.")
+        shard_command_parser.add_argument(
+            "--lease",
+            type=parse_lease,
+            default=DEFAULT_LEASE,
+            help="Seconds a shard's claim lasts without being renewed, after which another node may take it over.",
+        )
+    shard_subparsers.choices["work"].add_argument("--worker", help="A name for this node (defaults to its host name and process ID).")
+    merge_parser = subparsers.add_parser(
+        "merge",
+        help="Combine the outputs of every shard of a command.",
+        description="Check every shard in DIRECTORY is done, and combine their outputs into OUTPUT: stores and "
+        "archives are merged into it, and json or ndjson search results are written to it in order (keeping each "
+        "item's first recipe for --find-pickup-recipes, and only items no shard could craft for --find-uncraftable-items).",
+    )
+    merge_parser.add_argument("directory", help="The shared directory.")
+    merge_parser.add_argument("output", help="The file to write to.")
     args = parser.parse_args()
-    platform, game_version = parse_game_version_string(args.game_version)
 
     config["is_daily_run"] = True if args.tag_daily_run else False
     config["is_greed_mode"] = True if args.tag_greed_mode else False
@@ -114,23 +503,169 @@ def main():
     config["has_sacred_orb"] = True if args.tag_sacred_orb else False
     config["has_trinket_no"] = True if args.tag_trinket_no else False
 
+    if args.command == "batch":
+        run_batch(args.input, args.output, batch_size=args.batch_size)
+        return
+    if args.command == "build-bundle":
+        build_bundle(args.output, args.game_versions)
+        print(f"Wrote game data for {len(args.game_versions or get_all_game_versions())} versions to {args.output}")
+        return
+    if args.command == "serve":
+        run_server(
+            args.host, args.port, args.workers, args.preload, args.cache_size, args.cache_dir, args.max_jobs
+        )
+        return
+    seeds = None
+    if args.command in ["store", "archive"]:
+        # Shards of these split the seeds between them.
+        seeds = args.seeds if args.shard is None else get_shard_items(args.seeds, args.shard)
+    elif args.shard is not None:
+        if args.command is not None or not (args.find_pickup_recipes or args.find_item_recipes or args.find_uncraftable_items):
+            parser.error("--shard only works with --find-pickup-recipes, --find-item-recipes, --find-uncraftable-items, store and archive.")
+        # Each shard would apply these on its own, so the merged results wouldn't match an unsharded search.
+        if args.top_k is not None or args.grouped or args.sample is not None:
+            parser.error("--shard can't be used with --top-k, --grouped or --sample.")
+        if args.max_recipes is not None or args.stop_after is not None or args.stop_when_stable is not None:
+            parser.error("--shard can't be used with --max-recipes, --stop-after or --stop-when-stable.")
+    if args.command == "shard":
+        run_shard_command(parser, args)
+        return
+    if args.command == "merge":
+        try:
+            count = merge_shards(args.directory, args.output)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        print(f"Merged {count} shards into {args.output}")
+        return
+    if args.command == "store":
+        unlocked_mask = get_unlocked_mask(args.unlocked_achievements)
+        with RecipeStore(args.database) as store, ProcessPoolExecutor(args.workers) as executor:
+            try:
+                for seed_string, stats in store_results(
+                    store, args.game_version, seeds, sorted(set(args.pickups)), get_flags_key(), unlocked_mask, executor, args.grouped, args.force
+                ):
+                    print(f"{seed_string}: " + ("already stored." if stats is None else f"stored {stats.evaluated} recipes in {stats.elapsed:.2f} s."))
+            except ValueError as e:
+                parser.error(str(e))
+        return
+    if args.command == "archive":
+        unlocked_mask = get_unlocked_mask(args.unlocked_achievements)
+        with OutcomeArchive(args.archive, writable=True) as archive, ProcessPoolExecutor(args.workers) as executor:
+            try:
+                for seed_string, stats in archive_results(
+                    archive, args.game_version, seeds, args.pickups, get_flags_key(), unlocked_mask, executor, args.block_size, args.force
+                ):
+                    print(f"{seed_string}: " + ("already archived." if stats is None else f"archived {stats.evaluated} recipes in {stats.elapsed:.2f} s."))
+            except ValueError as e:
+                parser.error(str(e))
+        return
+    if args.command == "lookup":
+        unlocked_mask = get_unlocked_mask(args.unlocked_achievements)
+        try:
+            with OutcomeArchive(args.archive) as archive:
+                item_id = archive.get_item(args.game_version, args.seed, args.pickups, get_flags_key(), unlocked_mask)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        except KeyError:
+            parser.error(f"{args.archive} has no outcomes for these pickups on {args.seed} in {args.game_version} with these flags.")
+        item = ItemListEntry.load_item_list(*parse_game_version_string(args.game_version))[item_id]
+        if args.format != "text":
+            with ResultWriter(args.format) as writer:
+                writer.write(recipe_to_dict(item, args.pickups, sum(PICKUP_LIST[pickup_id].quality for pickup_id in args.pickups)))
+            return
+        print(f"{item.name} (id {item.item_id} {item.quality_str})")
+        return
+    if args.command == "query":
+        if not os.path.exists(args.database):
+            parser.error(f"{args.database} doesn't exist.")
+        try:
+            run_query(args)
+        except ValueError as e:
+            parser.error(str(e))
+        return
+
+    inventory = None
+    if args.inventory:
+        inventory = dict(args.inventory)
+        if args.pickups is None:
+            args.pickups = sorted(inventory)
+    if args.pickups is None:
+        parser.error("the following arguments are required: --pickups")
+    if args.seed is None and not (args.distribution or args.find_fixed_recipes or args.plan):
+        parser.error("the following arguments are required: --seed")
+
+    platform, game_version = parse_game_version_string(args.game_version)
+
+    item_ids = None
+    try:
+        if args.find_item_recipes:
+            item_ids = get_item_targets(platform, game_version, args.find_item_recipes)
+        if args.where:
+            context = CraftingContext.get(platform, game_version)
+            item_ids = filter_items(context, [ItemPredicate.parse(where) for where in args.where], item_ids)
+    except ValueError as e:
+        parser.error(str(e))
+
+    unlocked_mask = get_unlocked_mask(args.unlocked_achievements)
+
     t0 = time.monotonic()
     if args.find_pickup_recipes:
         pickups = list(set(args.pickups))
-        find_items_for_pickups(platform, game_version, args.seed, pickups)
+        find_items_for_pickups(
+            platform, game_version, args.seed, pickups, args.format, inventory, item_ids, args.stop_after, args.stop_when_stable, unlocked_mask, args.grouped, args.sample, args.shard
+        )
+    elif args.find_item_recipes and args.top_k is not None:
+        pickups = list(set(args.pickups))
+        pickup_costs = None
+        if args.pickup_costs:
+            pickup_costs = get_default_pickup_costs()
+            pickup_costs.update(args.pickup_costs)
+        find_cheapest_recipes_for_items(
+            platform, game_version, args.seed, pickups, item_ids, args.top_k, pickup_costs, args.format, inventory, unlocked_mask
+        )
     elif args.find_item_recipes:
         pickups = list(set(args.pickups))
-        find_recipes_for_item(
-            platform, game_version, args.seed, pickups, args.find_item_recipes
+        find_recipes_for_items(
+            platform, game_version, args.seed, pickups, item_ids, args.format, inventory, args.max_recipes, args.stop_after, unlocked_mask, args.grouped, args.shard
         )
+    elif args.plan:
+        print_search_plan(platform, game_version, list(set(args.pickups)), args.format, inventory, item_ids)
+    elif args.simulate:
+        if len(args.pickups) < 8:
+            parser.error("You must provide at least 8 pickup IDs to simulate the bag.")
+        simulate_bag(platform, game_version, args.seed, args.pickups, args.format, unlocked_mask)
+    elif args.find_swaps:
+        if len(args.pickups) != 8:
+            parser.error("You must provide 8 pickup IDs to find swaps.")
+        find_recipe_swaps(platform, game_version, args.seed, args.pickups, args.format, inventory, item_ids, unlocked_mask)
+    elif args.find_fixed_recipes:
+        pickups = list(set(args.pickups))
+        find_fixed_recipes(platform, game_version, pickups, args.format, inventory, unlocked_mask)
     elif args.find_uncraftable_items:
         pickups = list(set(args.pickups))
-        find_uncraftable_items(platform, game_version, args.seed, pickups)
+        find_uncraftable_items(
+            platform, game_version, args.seed, pickups, args.format, inventory, item_ids, args.stop_when_stable, unlocked_mask, args.grouped, args.sample, args.shard
+        )
+    elif args.distribution:
+        assert (
+            len(args.pickups) == 8
+        ), "You must provide 8 pickup IDs when calculating a single result."
+        find_item_distribution(platform, game_version, args.pickups, args.format, unlocked_mask)
     else:
         assert (
             len(args.pickups) == 8
         ), "You must provide 8 pickup IDs when calculating a single result."
-        find_item_id(platform, game_version, args.seed, args.pickups)
+        find_item_id(
+            platform,
+            game_version,
+            args.seed,
+            args.pickups,
+            args.format,
+            None if args.unlocked_achievements is None else unlocked_mask,
+        )
+
+    if args.format != "text":
+        return
 
     t1 = time.monotonic()
     print()
@@ -0,0 +1,480 @@
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .calculator import iter_results_for_pickups
+from .context import ALL_UNLOCKED, CraftedItem
+from .engine import SearchStats, iter_chunks
+from .isaac_pickups import PICKUP_LIST
+from .multisets import RECIPE_SIZE, get_recipe_rank
+from .store import normalize_seed
+from .utilities import parse_game_version_string
+
+
+ARCHIVE_MAGIC = b"BOCARCH\0"
+ARCHIVE_FORMAT_VERSION = 2
+# The magic, format version and committed length: the end of the last entry which was completely written.
+ARCHIVE_HEADER = struct.Struct("<8sIQ")
+# Written after each seed's entry: where the entry starts, the length of its block table and metadata, and the magic.
+ENTRY_TRAILER = struct.Struct("<QII8s")
+
+# The number of recipes per block. A lookup only decompresses the one block it's in.
+DEFAULT_BLOCK_SIZE = 16384
+DEFAULT_COMPRESSION_LEVEL = 6
+COPY_CHUNK_SIZE = 1 << 20
+
+ENCODING_ITEMS = 0
+ENCODING_RUNS = 1
+
+ALL_PICKUPS = [pickup.pickup_id for pickup in PICKUP_LIST if pickup is not None]
+
+
+def to_little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode, data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def split_bytes(item_ids: Sequence[int]) -> bytes:
+    # Item IDs fit in 10 bits, so putting every high byte after the low ones leaves a long, very compressible run.
+    data = to_little_endian(array("H", item_ids))
+    return data[0::2] + data[1::2]
+
+
+def join_bytes(data: bytes) -> List[int]:
+    half = len(data) // 2
+    joined = bytearray(len(data))
+    joined[0::2] = data[:half]
+    joined[1::2] = data[half:]
+    return from_little_endian("H", bytes(joined)).tolist()
+
+
+def encode_block(
+    item_ids: Sequence[int], level: int = DEFAULT_COMPRESSION_LEVEL
+) -> bytes:
+    """
+    Compress a block of outcomes, starting with a byte saying how it was encoded before compression: as the item
+    IDs, or where neighbouring recipes often craft the same item, as runs of an item ID and a count (up to 255).
+    Whichever is smaller is kept.
+    """
+    run_items = []
+    run_lengths = bytearray()
+    for item_id in item_ids:
+        if run_items and run_items[-1] == item_id and run_lengths[-1] < 255:
+            run_lengths[-1] += 1
+        else:
+            run_items.append(item_id)
+            run_lengths.append(1)
+    encodings = [bytes([ENCODING_ITEMS]) + zlib.compress(split_bytes(item_ids), level)]
+    if len(run_items) < len(item_ids):
+        encodings.append(
+            bytes([ENCODING_RUNS])
+            + zlib.compress(split_bytes(run_items) + run_lengths, level)
+        )
+    return min(encodings, key=len)
+
+
+def decode_block(data: bytes) -> List[int]:
+    payload = zlib.decompress(data[1:])
+    if data[0] == ENCODING_ITEMS:
+        return join_bytes(payload)
+    run_count = len(payload) // 3
+    item_ids = []
+    for item_id, run_length in zip(
+        join_bytes(payload[: 2 * run_count]), payload[2 * run_count :]
+    ):
+        item_ids.extend([item_id] * run_length)
+    return item_ids
+
+
+class ArchiveEntry:
+    """One seed's outcomes in an `OutcomeArchive`: the item crafted by each recipe, in enumeration order."""
+
+    def __init__(
+        self,
+        archive: "OutcomeArchive",
+        start: int,
+        end: int,
+        table_length: int,
+        metadata_length: int,
+        metadata: dict,
+    ):
+        self.archive = archive
+        # The entry is the bytes from `start` up to `end`, which is the end of its trailer.
+        self.start = start
+        self.end = end
+        self.table_offset = end - ENTRY_TRAILER.size - metadata_length - table_length
+        self.table_length = table_length
+        self.metadata_length = metadata_length
+        self.game_version = metadata["game_version"]
+        self.flags_key = tuple(metadata["flags"])
+        self.unlocked_mask = metadata["unlocked_mask"]
+        self.seed = metadata["seed"]
+        self.seed_string = metadata["seed_string"]
+        self.pickup_list = metadata["pickups"]
+        self.count = metadata["count"]
+        self.block_size = metadata["block_size"]
+        self.pickup_indexes = {
+            pickup_id: index + 1 for index, pickup_id in enumerate(self.pickup_list)
+        }
+        self.block_offsets = None
+
+    @property
+    def key(self) -> Tuple[str, Tuple[str, ...], int, int]:
+        return self.game_version, self.flags_key, self.unlocked_mask, self.seed
+
+    def covers(self, pickups: Iterable[int]) -> bool:
+        return all(pickup_id in self.pickup_indexes for pickup_id in pickups)
+
+    def get_rank(self, recipe: Sequence[int]) -> int:
+        """The recipe's position in the enumeration of the entry's pickup types."""
+        if len(recipe) != RECIPE_SIZE:
+            raise ValueError(f"A recipe must have {RECIPE_SIZE} pickups.")
+        try:
+            return get_recipe_rank(
+                [self.pickup_indexes[pickup_id] for pickup_id in recipe],
+                len(self.pickup_list),
+            )
+        except KeyError as e:
+            raise ValueError(
+                f"Pickup {e.args[0]} isn't one of the pickups archived for {self.seed_string}."
+            )
+
+    def get_block(self, block: int) -> List[int]:
+        if self.block_offsets is None:
+            # Offsets of each block from the start of the entry, and of the end of the last one.
+            self.block_offsets = from_little_endian(
+                "Q", self.archive.read(self.table_offset, self.table_length)
+            )
+        start, end = self.block_offsets[block], self.block_offsets[block + 1]
+        return decode_block(self.archive.read(self.start + start, end - start))
+
+    def get_item(self, recipe: Sequence[int]) -> int:
+        """The item crafted by a recipe, decompressing only the block it's in."""
+        rank = self.get_rank(recipe)
+        block, index = divmod(rank, self.block_size)
+        cache_key = (self.start, block)
+        if self.archive.cached_block[0] != cache_key:
+            self.archive.cached_block = (cache_key, self.get_block(block))
+        return self.archive.cached_block[1][index]
+
+    def iter_outcomes(self) -> Iterator[int]:
+        """The item crafted by every recipe, in enumeration order."""
+        for block in range((self.count + self.block_size - 1) // self.block_size):
+            yield from self.get_block(block)
+
+
+class OutcomeArchive:
+    """
+    The outcome of every recipe from a set of pickup types (by default, every one) on many seeds, in one file.
+
+    Each seed's outcomes are split into blocks of `block_size` recipes, which are compressed separately, so a single
+    lookup only decompresses one block. Seeds are appended to the end of the file as an entry: its blocks, a table
+    of their offsets, its metadata as JSON, and a fixed size trailer pointing back to the start of the entry, which
+    is how the entries are found again. Adding a seed never rewrites the rest of the archive. A seed may have
+    entries for several sets of pickup types; adding one again for the same pickups shadows the older entry.
+
+    The header records the committed length, which only moves past an entry once the entry is on disk. Anything
+    after it is an append which was interrupted (or is still going on in another process), and is ignored by
+    readers and cut off the next time the archive is opened for writing.
+    """
+
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if not exists and not writable:
+            raise FileNotFoundError(path)
+        self.file = (
+            open(path, "r+b" if exists else "w+b") if writable else open(path, "rb")
+        )
+        if not exists:
+            self.file.write(
+                ARCHIVE_HEADER.pack(
+                    ARCHIVE_MAGIC, ARCHIVE_FORMAT_VERSION, ARCHIVE_HEADER.size
+                )
+            )
+            self.file.flush()
+        header = self.read(0, ARCHIVE_HEADER.size)
+        if len(header) < ARCHIVE_HEADER.size:
+            raise ValueError(
+                f"{path} is not a version {ARCHIVE_FORMAT_VERSION} outcome archive."
+            )
+        magic, format_version, self.length = ARCHIVE_HEADER.unpack(header)
+        if magic != ARCHIVE_MAGIC or format_version != ARCHIVE_FORMAT_VERSION:
+            raise ValueError(
+                f"{path} is not a version {ARCHIVE_FORMAT_VERSION} outcome archive."
+            )
+        if writable and self.file.seek(0, os.SEEK_END) > self.length:
+            # The tail of an append which was killed before it finished.
+            self.file.truncate(self.length)
+        # Each seed's entries, newest first.
+        self.entries: Dict[
+            Tuple[str, Tuple[str, ...], int, int], List[ArchiveEntry]
+        ] = {}
+        self.cached_block = (None, None)
+        self.load_entries()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "OutcomeArchive":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def read(self, offset: int, length: int) -> bytes:
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def load_entries(self) -> None:
+        # Walk back from the last entry to the first, so the newest entry for a seed wins.
+        end = self.length
+        while end > ARCHIVE_HEADER.size:
+            start, table_length, metadata_length, magic = ENTRY_TRAILER.unpack(
+                self.read(end - ENTRY_TRAILER.size, ENTRY_TRAILER.size)
+            )
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError(
+                    f"{self.path} is damaged: there's no entry ending at {end}."
+                )
+            metadata = json.loads(
+                self.read(end - ENTRY_TRAILER.size - metadata_length, metadata_length)
+            )
+            entry = ArchiveEntry(
+                self, start, end, table_length, metadata_length, metadata
+            )
+            self.entries.setdefault(entry.key, []).append(entry)
+            end = start
+
+    def commit(self, length: int) -> None:
+        """Make sure everything up to `length` is on disk, then record it as the committed length."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.seek(0)
+        self.file.write(
+            ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_FORMAT_VERSION, length)
+        )
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.length = length
+
+    def get_entry(
+        self,
+        game_version: str,
+        seed_string: str,
+        pickups: Iterable[int] = (),
+        flags_key: Tuple[str, ...] = (),
+        unlocked_mask: int = ALL_UNLOCKED,
+    ) -> ArchiveEntry:
+        """
+        The newest of the seed's entries which covers every one of `pickups`. Raises KeyError if the seed isn't in
+        the archive, or none of its entries do.
+        """
+        pickups = set(pickups)
+        for entry in self.entries.get(
+            (
+                game_version,
+                tuple(flags_key),
+                unlocked_mask,
+                normalize_seed(seed_string)[0],
+            ),
+            [],
+        ):
+            if entry.covers(pickups):
+                return entry
+        raise KeyError(seed_string)
+
+    def get_item(
+        self,
+        game_version: str,
+        seed_string: str,
+        recipe: Sequence[int],
+        flags_key: Tuple[str, ...] = (),
+        unlocked_mask: int = ALL_UNLOCKED,
+    ) -> int:
+        """The item crafted by a recipe on a seed. Raises KeyError if the recipe's pickups haven't been archived for it."""
+        return self.get_entry(
+            game_version, seed_string, recipe, flags_key, unlocked_mask
+        ).get_item(recipe)
+
+    def add_results(
+        self,
+        game_version: str,
+        seed_string: str,
+        pickup_list: Iterable[int],
+        results: Iterable[CraftedItem],
+        flags_key: Tuple[str, ...] = (),
+        unlocked_mask: int = ALL_UNLOCKED,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        level: int = DEFAULT_COMPRESSION_LEVEL,
+    ) -> ArchiveEntry:
+        """
+        Append a seed's results, which must be every recipe from `pickup_list` in enumeration order (as
+        `iter_results_for_pickups` yields them without `grouped`). Only one block is held in memory at a time.
+        """
+        seed, seed_string = normalize_seed(seed_string)
+        start = self.file.seek(self.length)
+        try:
+            block_offsets = array("Q", [0])
+            count = 0
+            for chunk in iter_chunks(results, block_size):
+                data = encode_block([item_id for _, item_id, _ in chunk], level)
+                self.file.write(data)
+                block_offsets.append(block_offsets[-1] + len(data))
+                count += len(chunk)
+            metadata = {
+                "game_version": game_version,
+                "flags": list(flags_key),
+                "unlocked_mask": unlocked_mask,
+                "seed": seed,
+                "seed_string": seed_string,
+                "pickups": sorted(set(pickup_list)),
+                "count": count,
+                "block_size": block_size,
+            }
+            metadata_data = json.dumps(metadata, separators=(",", ":")).encode("utf-8")
+            table_data = to_little_endian(block_offsets)
+            self.file.write(table_data)
+            self.file.write(metadata_data)
+            self.file.write(
+                ENTRY_TRAILER.pack(
+                    start, len(table_data), len(metadata_data), ARCHIVE_MAGIC
+                )
+            )
+            end = self.file.tell()
+            self.commit(end)
+        except BaseException:
+            # Don't leave a partly written entry behind. If the process is killed instead, it's cut off on the next open.
+            self.file.truncate(start)
+            raise
+        entry = ArchiveEntry(
+            self, start, end, len(table_data), len(metadata_data), metadata
+        )
+        self.entries.setdefault(entry.key, []).insert(0, entry)
+        return entry
+
+    def copy_entry(self, entry: ArchiveEntry) -> ArchiveEntry:
+        """Append an entry from another archive as it is, without decompressing it."""
+        start = self.file.seek(self.length)
+        try:
+            # Block offsets are relative to the start of the entry, so only the trailer has to change.
+            offset = entry.start
+            while offset < entry.end - ENTRY_TRAILER.size:
+                data = entry.archive.read(
+                    offset,
+                    min(COPY_CHUNK_SIZE, entry.end - ENTRY_TRAILER.size - offset),
+                )
+                self.file.write(data)
+                offset += len(data)
+            self.file.write(
+                ENTRY_TRAILER.pack(
+                    start, entry.table_length, entry.metadata_length, ARCHIVE_MAGIC
+                )
+            )
+            end = self.file.tell()
+            self.commit(end)
+        except BaseException:
+            self.file.truncate(start)
+            raise
+        metadata = json.loads(
+            self.read(
+                end - ENTRY_TRAILER.size - entry.metadata_length, entry.metadata_length
+            )
+        )
+        copy = ArchiveEntry(
+            self, start, end, entry.table_length, entry.metadata_length, metadata
+        )
+        self.entries.setdefault(copy.key, []).insert(0, copy)
+        return copy
+
+    def merge(self, path: str) -> int:
+        """
+        Append every entry from another archive, oldest first, except those for seeds and pickups this archive
+        already has. Returns the number of entries appended.
+        """
+        copied = 0
+        with OutcomeArchive(path) as other:
+            for entry in sorted(
+                (entry for entries in other.entries.values() for entry in entries),
+                key=lambda entry: entry.start,
+            ):
+                if any(
+                    existing.pickup_list == entry.pickup_list
+                    for existing in self.entries.get(entry.key, [])
+                ):
+                    continue
+                self.copy_entry(entry)
+                copied += 1
+        return copied
+
+
+def archive_results(
+    archive: OutcomeArchive,
+    game_version: str,
+    seed_strings: Iterable[str],
+    pickup_list: Optional[List[int]] = None,
+    flags_key: Tuple[str, ...] = (),
+    unlocked_mask: int = ALL_UNLOCKED,
+    executor: Optional[Executor] = None,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    force: bool = False,
+) -> Iterator[Tuple[str, Optional[SearchStats]]]:
+    """
+    Calculate every recipe from the given pickup types (by default, every one) on each seed and append the
+    outcomes to the archive, skipping seeds which are already in it unless `force` is set. Yields each seed with its
+    stats, or None if it was skipped. The results are computed with the global config, which should match `flags_key`.
+    """
+    platform, version = parse_game_version_string(game_version)
+    pickup_list = sorted(set(pickup_list or ALL_PICKUPS))
+    owns_executor = executor is None
+    if owns_executor:
+        executor = ProcessPoolExecutor()
+    try:
+        for seed_string in seed_strings:
+            seed = normalize_seed(seed_string)[0]
+            if not force and any(
+                entry.covers(pickup_list)
+                for entry in archive.entries.get(
+                    (game_version, tuple(flags_key), unlocked_mask, seed), []
+                )
+            ):
+                yield seed_string, None
+                continue
+            stats = SearchStats()
+            stats.start()
+            results = iter_results_for_pickups(
+                platform,
+                version,
+                seed,
+                pickup_list,
+                executor,
+                unlocked_mask=unlocked_mask,
+            )
+            stats.evaluated = archive.add_results(
+                game_version,
+                seed_string,
+                pickup_list,
+                results,
+                flags_key,
+                unlocked_mask,
+                block_size,
+            ).count
+            stats.stop()
+            yield seed_string, stats
+    finally:
+        if owns_executor:
+            executor.shutdown()
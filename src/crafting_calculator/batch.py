@@ -0,0 +1,222 @@
+import json
+from collections import defaultdict, deque
+from concurrent.futures import Executor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from .config import config
+from .context import ALL_UNLOCKED, CraftingContext, get_flags_key, get_unlocked_mask
+from .engine import iter_chunks, map_ordered
+from .isaac_pickups import PICKUP_LIST
+from .isaac_rng import string_to_seed
+from .utilities import (
+    DEFAULT_GAME_VERSION,
+    DEFAULT_PLATFORM,
+    get_all_game_versions,
+    parse_game_version_string,
+)
+
+
+DEFAULT_BATCH_SIZE = 4096
+
+
+def parse_request_fields(data: Dict[str, Any]) -> Tuple[int, str, Tuple[str, ...], int]:
+    """
+    Validate the fields shared by every kind of JSON request: `seed`, and the optional `game_version`, `flags` and
+    `unlocked`. Returns the seed, game version, flags key and unlocked-achievement bitmask.
+    """
+    game_version = data.get(
+        "game_version", f"{DEFAULT_PLATFORM}/{DEFAULT_GAME_VERSION}"
+    )
+    if game_version not in get_all_game_versions():
+        raise ValueError(f"Unknown game version {game_version!r}.")
+
+    flags = data.get("flags", {})
+    if not isinstance(flags, dict):
+        raise ValueError("Flags must be a JSON object.")
+    for flag, value in flags.items():
+        if flag not in config:
+            raise ValueError(f"Unknown flag {flag!r}.")
+        if not isinstance(value, bool):
+            raise ValueError(f"Flag {flag!r} must be true or false, not {value!r}.")
+
+    unlocked = data.get("unlocked")
+    if unlocked is not None and not (
+        (isinstance(unlocked, int) and not isinstance(unlocked, bool) and unlocked >= 0)
+        or (
+            isinstance(unlocked, list)
+            and all(
+                isinstance(i, int) and not isinstance(i, bool) and i >= 0
+                for i in unlocked
+            )
+        )
+    ):
+        raise ValueError(
+            "Unlocked achievements must be a list of achievement IDs or a bitmask."
+        )
+
+    try:
+        seed = string_to_seed(str(data.get("seed", "")))
+    except AssertionError:
+        raise ValueError(f"Invalid seed {data.get('seed')!r}.")
+
+    return seed, game_version, get_flags_key(flags), get_unlocked_mask(unlocked)
+
+
+class BatchRequest:
+    """A single recipe lookup read from one line of NDJSON input."""
+
+    def __init__(
+        self,
+        line_number: int,
+        request_id: Any,
+        seed: int,
+        pickups: List[int],
+        game_version: str,
+        flags_key: Tuple[str, ...],
+        unlocked_mask: int = ALL_UNLOCKED,
+    ):
+        self.line_number = line_number
+        self.request_id = request_id
+        self.seed = seed
+        self.pickups = pickups
+        self.game_version = game_version
+        self.flags_key = flags_key
+        self.unlocked_mask = unlocked_mask
+
+    @staticmethod
+    def parse(line_number: int, line: str) -> "BatchRequest":
+        """
+        Each line is a JSON object like
+        `{"id": 1, "seed": "28RY NMMM", "pickups": [6, 21, 27, 11, 27, 22, 23, 20], "game_version": "pc/v1.7.9b", "flags": {"is_greed_mode": true}}`.
+        `id`, `game_version`, `flags` and `unlocked` (the unlocked achievement IDs, or a bitmask of them) are optional.
+        """
+        data = json.loads(line)
+        if not isinstance(data, dict):
+            raise ValueError("Request must be a JSON object.")
+        return BatchRequest.from_dict(line_number, data)
+
+    @staticmethod
+    def from_dict(line_number: int, data: Dict[str, Any]) -> "BatchRequest":
+        pickups = data.get("pickups")
+        if not isinstance(pickups, list) or len(pickups) != 8:
+            raise ValueError("You must provide 8 pickup IDs.")
+        for pickup_id in pickups:
+            if (
+                not isinstance(pickup_id, int)
+                or isinstance(pickup_id, bool)
+                or not 0 < pickup_id < len(PICKUP_LIST)
+            ):
+                raise ValueError(f"Invalid pickup ID {pickup_id!r}.")
+
+        seed, game_version, flags_key, unlocked_mask = parse_request_fields(data)
+        return BatchRequest(
+            line_number,
+            data.get("id"),
+            seed,
+            pickups,
+            game_version,
+            flags_key,
+            unlocked_mask,
+        )
+
+    def get_output(self) -> Dict[str, Any]:
+        output = {"line": self.line_number}
+        if self.request_id is not None:
+            output["id"] = self.request_id
+        return output
+
+
+def evaluate_batch(
+    requests: List[Tuple[str, Tuple[str, ...], int, List[int], int]]
+) -> List[Tuple[int, int]]:
+    """Evaluate a chunk of requests, grouping them by game version and flags so each group shares one context."""
+    groups = defaultdict(list)
+    for index, (game_version, flags_key, _, _, _) in enumerate(requests):
+        groups[(game_version, flags_key)].append(index)
+
+    results = [None] * len(requests)
+    for (game_version, flags_key), indices in groups.items():
+        platform, version = parse_game_version_string(game_version)
+        context = CraftingContext.load(platform, version, flags_key)
+        for index in indices:
+            _, _, seed, pickups, unlocked_mask = requests[index]
+            _, item_id, quality_sum = context.get_item(pickups, seed, unlocked_mask)
+            results[index] = (item_id, quality_sum)
+
+    return results
+
+
+def iter_batch_results(
+    lines: Iterable[str],
+    executor: Optional[Executor] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Evaluate NDJSON recipe lookups, yielding one result per non-empty input line in input order.
+    Input is read and evaluated in batches, so only a few batches are held in memory at once.
+    """
+
+    def parse_batches() -> Iterator[List[Any]]:
+        numbered_lines = (
+            (number, line) for number, line in enumerate(lines, 1) if line.strip()
+        )
+        for chunk in iter_chunks(numbered_lines, batch_size):
+            parsed = []
+            for line_number, line in chunk:
+                try:
+                    parsed.append(BatchRequest.parse(line_number, line))
+                except ValueError as e:
+                    parsed.append({"line": line_number, "error": str(e)})
+            yield parsed
+
+    batches = parse_batches()
+    pending_batches = deque()
+
+    def get_tasks() -> Iterator[Tuple[Any, ...]]:
+        for parsed in batches:
+            pending_batches.append(parsed)
+            yield (
+                [
+                    (
+                        request.game_version,
+                        request.flags_key,
+                        request.seed,
+                        request.pickups,
+                        request.unlocked_mask,
+                    )
+                    for request in parsed
+                    if isinstance(request, BatchRequest)
+                ],
+            )
+
+    batch_results = map_ordered(evaluate_batch, get_tasks(), executor)
+    try:
+        for results in batch_results:
+            parsed = pending_batches.popleft()
+            results = iter(results)
+            for request in parsed:
+                if not isinstance(request, BatchRequest):
+                    yield request
+                    continue
+                item_id, quality_sum = next(results)
+                output = request.get_output()
+                output["pickups"] = request.pickups
+                output["item_id"] = item_id
+                output["quality_sum"] = quality_sum
+                yield output
+    finally:
+        batch_results.close()
+
+
+def run_batch(
+    input_file: TextIO,
+    output_file: TextIO,
+    executor: Optional[Executor] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Stream NDJSON requests from `input_file` to NDJSON results in `output_file`. Returns the number of lines written."""
+    count = 0
+    for output in iter_batch_results(input_file, executor, batch_size):
+        output_file.write(json.dumps(output) + "\n")
+        count += 1
+    return count
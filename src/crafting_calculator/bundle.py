@@ -0,0 +1,313 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from .isaac_item_pools import ItemPool
+from .isaac_items import ItemListEntry
+from .isaac_recipes import HardcodedRecipe
+from .utilities import (
+    get_all_game_versions,
+    get_gamedata_path,
+    parse_game_version_string,
+)
+
+
+BUNDLE_MAGIC = b"BOCBNDL\0"
+BUNDLE_FORMAT_VERSION = 1
+# The magic, format version and index length.
+BUNDLE_HEADER = struct.Struct("<8sII")
+# Tables start on a multiple of this, so they can be viewed as arrays in place.
+TABLE_ALIGNMENT = 8
+
+# Set this to a bundle's path to load game data from it, or to an empty string to always read the XML files.
+BUNDLE_PATH_VARIABLE = "CRAFTING_GAMEDATA_BUNDLE"
+DEFAULT_BUNDLE_PATH = os.path.join(
+    os.path.dirname(__file__), "gamedata", "gamedata.bundle"
+)
+
+# The files each version's tables are compiled from.
+SOURCE_FILES = [
+    "items.xml",
+    "items_metadata.xml",
+    "stringtable.sta",
+    "itempools.xml",
+    "recipes.xml",
+]
+
+
+def get_source_stamp(platform: str, game_version: str) -> List[List[int]]:
+    """The size and modification time of a version's game data files, to tell if a bundle is out of date."""
+    stamp = []
+    for filename in SOURCE_FILES:
+        stat = os.stat(get_gamedata_path(platform, game_version, filename))
+        stamp.append([stat.st_size, stat.st_mtime_ns])
+    return stamp
+
+
+class StringTable:
+    def __init__(self):
+        self.strings = []
+        self.string_ids = {}
+
+    def intern(self, string: str) -> int:
+        if string not in self.string_ids:
+            self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return self.string_ids[string]
+
+    def get_tables(self) -> Dict[str, array]:
+        data = bytearray()
+        offsets = array("i", [0])
+        for string in self.strings:
+            data += string.encode("utf-8")
+            offsets.append(len(data))
+        return {"string_data": array("B", data), "string_offsets": offsets}
+
+
+def compile_version(platform: str, game_version: str) -> Dict[str, array]:
+    """Compile a version's game data, as loaded from the XML files, into flat numeric tables."""
+    strings = StringTable()
+    items = ItemListEntry.load_item_list(platform, game_version)
+    item_pools = ItemPool.load_item_pools(platform, game_version)
+    recipes = HardcodedRecipe.load_hardcoded_recipes(platform, game_version)
+
+    tables = {
+        "item_ids": array("i", [item.item_id for item in items.values()]),
+        "item_names": array(
+            "i", [strings.intern(item.name) for item in items.values()]
+        ),
+        "item_qualities": array("i", [item.quality for item in items.values()]),
+        "item_achievement_ids": array(
+            "i",
+            [
+                -1 if item.achievement_id is None else item.achievement_id
+                for item in items.values()
+            ],
+        ),
+        "item_tags": array(
+            "i", [strings.intern(" ".join(item.tags)) for item in items.values()]
+        ),
+        "item_is_active": array("B", [item.is_active for item in items.values()]),
+        "pool_ids": array("i", item_pools),
+        "pool_names": array(
+            "i",
+            [strings.intern(item_pool.pool_name) for item_pool in item_pools.values()],
+        ),
+        # Pool P's entries are entry_offsets[P]:entry_offsets[P + 1], in the same order as the pool's quality lists.
+        "pool_entry_offsets": array("i", [0]),
+        "entry_item_ids": array("i"),
+        "entry_weights": array("i"),
+        "entry_qualities": array("i"),
+        "recipe_keys": array("q", recipes),
+        "recipe_item_ids": array("i", [recipe.item_id for recipe in recipes.values()]),
+        "recipe_pickups": array(
+            "B",
+            [pickup_id for recipe in recipes.values() for pickup_id in recipe.pickups],
+        ),
+    }
+    for item_pool in item_pools.values():
+        for quality, item_list in item_pool.quality_lists.items():
+            for item_id, weight in item_list:
+                tables["entry_item_ids"].append(item_id)
+                tables["entry_weights"].append(weight)
+                tables["entry_qualities"].append(quality)
+        tables["pool_entry_offsets"].append(len(tables["entry_item_ids"]))
+    tables.update(strings.get_tables())
+    return tables
+
+
+def build_bundle(
+    path: str = DEFAULT_BUNDLE_PATH, game_versions: Optional[Iterable[str]] = None
+) -> None:
+    """
+    Compile every version's game data (or just `game_versions`) into one bundle file.
+
+    The file starts with a header and a JSON index, which gives the offset, length and array type code of each of a
+    version's tables, followed by the tables, each aligned so it can be viewed in place once the file is mapped.
+    """
+    index = {"byteorder": sys.byteorder, "versions": {}}
+    chunks = []
+    offset = 0
+    for name in game_versions or get_all_game_versions():
+        platform, game_version = parse_game_version_string(name)
+        version_index = {
+            "source_stamp": get_source_stamp(platform, game_version),
+            "tables": {},
+        }
+        for table_name, table in compile_version(platform, game_version).items():
+            data = table.tobytes()
+            version_index["tables"][table_name] = [offset, len(table), table.typecode]
+            padding = -len(data) % TABLE_ALIGNMENT
+            chunks.append(data + b"\0" * padding)
+            offset += len(data) + padding
+        index["versions"][name] = version_index
+
+    index_data = json.dumps(index, separators=(",", ":")).encode("utf-8")
+    index_data += b" " * (-(BUNDLE_HEADER.size + len(index_data)) % TABLE_ALIGNMENT)
+    # Write to a temporary file first, so processes which have the old bundle mapped keep working.
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(
+            BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(index_data))
+        )
+        f.write(index_data)
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(temp_path, path)
+
+
+class BundleVersion:
+    """One version's tables in a `GamedataBundle`, as views of the mapped file."""
+
+    def __init__(self, bundle: "GamedataBundle", name: str, index: dict):
+        self.bundle = bundle
+        self.name = name
+        self.source_stamp = index["source_stamp"]
+        self.table_index = index["tables"]
+        self.strings = None
+
+    def get_table(self, table_name: str) -> memoryview:
+        """
+        A table as a read only view of the mapped file, without copying it. It can be indexed like a list, or passed
+        to e.g. `numpy.frombuffer` for a NumPy view.
+        """
+        offset, length, typecode = self.table_index[table_name]
+        start = self.bundle.data_offset + offset
+        return self.bundle.view[start : start + length * array(typecode).itemsize].cast(
+            typecode
+        )
+
+    @property
+    def is_current(self) -> bool:
+        """Whether the version's game data files are the ones the bundle was built from."""
+        try:
+            return self.source_stamp == get_source_stamp(
+                *parse_game_version_string(self.name)
+            )
+        except OSError:
+            return False
+
+    def get_string(self, string_id: int) -> str:
+        if self.strings is None:
+            data = self.get_table("string_data")
+            offsets = self.get_table("string_offsets")
+            self.strings = [
+                bytes(data[offsets[i] : offsets[i + 1]]).decode("utf-8")
+                for i in range(len(offsets) - 1)
+            ]
+        return self.strings[string_id]
+
+    def load_item_list(self) -> Dict[int, ItemListEntry]:
+        tags = {}
+        output = {}
+        for item_id, name, quality, achievement_id, tag_string, is_active in zip(
+            self.get_table("item_ids"),
+            self.get_table("item_names"),
+            self.get_table("item_qualities"),
+            self.get_table("item_achievement_ids"),
+            self.get_table("item_tags"),
+            self.get_table("item_is_active"),
+        ):
+            if tag_string not in tags:
+                tags[tag_string] = self.get_string(tag_string).split(" ")
+            output[item_id] = ItemListEntry(
+                item_id,
+                self.get_string(name),
+                quality,
+                None if achievement_id < 0 else achievement_id,
+                list(tags[tag_string]),
+                bool(is_active),
+            )
+        return output
+
+    def load_item_pools(self) -> Dict[int, ItemPool]:
+        entry_offsets = self.get_table("pool_entry_offsets")
+        entry_item_ids = self.get_table("entry_item_ids")
+        entry_weights = self.get_table("entry_weights")
+        entry_qualities = self.get_table("entry_qualities")
+        output = {}
+        for index, (pool_id, name) in enumerate(
+            zip(self.get_table("pool_ids"), self.get_table("pool_names"))
+        ):
+            item_pool = ItemPool(pool_id, self.get_string(name))
+            for entry in range(entry_offsets[index], entry_offsets[index + 1]):
+                item_pool.quality_lists[entry_qualities[entry]].append(
+                    (entry_item_ids[entry], entry_weights[entry])
+                )
+            output[pool_id] = item_pool
+        return output
+
+    def load_hardcoded_recipes(self) -> Dict[int, HardcodedRecipe]:
+        pickups = self.get_table("recipe_pickups")
+        return {
+            key: HardcodedRecipe.from_pickups(
+                item_id, list(pickups[8 * index : 8 * index + 8])
+            )
+            for index, (key, item_id) in enumerate(
+                zip(self.get_table("recipe_keys"), self.get_table("recipe_item_ids"))
+            )
+        }
+
+
+class GamedataBundle:
+    """
+    Every version's game data in one file, built by `build_bundle`. The file is memory mapped, so tables are paged
+    in when they're first used, and processes on the same machine share one copy of them through the page cache.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        magic, format_version, index_length = BUNDLE_HEADER.unpack_from(self.mmap)
+        if magic != BUNDLE_MAGIC or format_version != BUNDLE_FORMAT_VERSION:
+            raise ValueError(
+                f"{path} is not a version {BUNDLE_FORMAT_VERSION} game data bundle."
+            )
+        index = json.loads(
+            bytes(self.view[BUNDLE_HEADER.size : BUNDLE_HEADER.size + index_length])
+        )
+        if index["byteorder"] != sys.byteorder:
+            raise ValueError(
+                f"{path} was built on a machine with a different byte order."
+            )
+        self.data_offset = BUNDLE_HEADER.size + index_length
+        self.versions = {
+            name: BundleVersion(self, name, version_index)
+            for name, version_index in index["versions"].items()
+        }
+
+    def get_version(self, platform: str, game_version: str) -> Optional[BundleVersion]:
+        return self.versions.get(f"{platform}/{game_version}")
+
+
+@lru_cache(maxsize=None)
+def open_bundle(path: str) -> Optional[GamedataBundle]:
+    try:
+        return GamedataBundle(path)
+    except (OSError, ValueError):
+        return None
+
+
+def get_bundle_version(platform: str, game_version: str) -> Optional[BundleVersion]:
+    """
+    The version's tables from the game data bundle (at `$CRAFTING_GAMEDATA_BUNDLE`, or `gamedata/gamedata.bundle`),
+    or None if there's no bundle, it doesn't have the version, or the version's game data has changed since it was
+    built, in which case the XML files should be read instead.
+    """
+    path = os.environ.get(BUNDLE_PATH_VARIABLE, DEFAULT_BUNDLE_PATH)
+    if not path:
+        return None
+    bundle = open_bundle(path)
+    if bundle is None:
+        return None
+    version = bundle.get_version(platform, game_version)
+    if version is None or not version.is_current:
+        return None
+    return version
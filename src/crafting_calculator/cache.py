@@ -0,0 +1,125 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+def get_request_key(request: Any) -> str:
+    """A hash of a request, which must be JSON serialisable. Dictionary keys are sorted, so their order doesn't matter."""
+    return hashlib.sha256(
+        json.dumps(request, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+class ResultCache:
+    """
+    Remembers the results of the last `max_entries` requests by request key, evicting the least recently used.
+
+    With a `directory`, results are also written there as JSON files, which are kept when they are evicted from
+    memory and read back on a miss, so they survive restarts. Identical requests which arrive while the first one
+    is still being computed wait for it and share its result, rather than computing it again.
+    """
+
+    def __init__(
+        self, max_entries: int = DEFAULT_CACHE_SIZE, directory: Optional[str] = None
+    ):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.entries: "OrderedDict[str, Any]" = OrderedDict()
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """The cached result for a key, or None. Doesn't count towards the hit and miss counters."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.directory is not None:
+            try:
+                with open(self.get_path(key), encoding="utf-8") as file:
+                    result = json.load(file)
+            except (OSError, ValueError):
+                return None
+            self.remember(key, result)
+            return result
+        return None
+
+    def put(self, key: str, result: Any) -> None:
+        self.remember(key, result)
+        if self.directory is not None:
+            # Write to a temporary file first, so other readers never see a partly written result.
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(handle, "w", encoding="utf-8") as file:
+                    json.dump(result, file)
+                os.replace(temp_path, self.get_path(key))
+            except OSError:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    def remember(self, key: str, result: Any) -> None:
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        The cached result for a key, or the result of `compute()`, which is cached. If the same key is already being
+        computed, wait for that instead. Errors aren't cached, but are passed on to every request waiting on them.
+        The computation belongs to the cache, so it isn't cancelled along with any one of the requests waiting on it.
+        """
+        if key in self.entries:
+            self.hits += 1
+            return self.get(key)
+        if key in self.in_flight:
+            self.coalesced += 1
+            return await asyncio.shield(self.in_flight[key])
+        if self.directory is not None:
+            result = self.get(key)
+            if result is not None:
+                self.disk_hits += 1
+                return result
+
+        self.misses += 1
+        task = asyncio.ensure_future(self.compute_and_put(key, compute))
+        # Mark any exception as retrieved, in case every request waiting for it was cancelled.
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        self.in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def compute_and_put(
+        self, key: str, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        try:
+            result = await compute()
+            self.put(key, result)
+            return result
+        finally:
+            del self.in_flight[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.in_flight),
+        }
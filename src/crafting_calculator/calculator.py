@@ -1,124 +1,37 @@
-import bisect
-import itertools
 import math
-from concurrent.futures import ProcessPoolExecutor
-from typing import List, Tuple
-from functools import partial, update_wrapper
-
-from .config import config
-from .isaac_rng import rng_next, string_to_seed
-from .isaac_item_pools import ItemPool
+from collections import defaultdict
+from concurrent.futures import Executor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from .counting import count_by_pool_signature, count_by_quality_sum, count_by_table_key
+from .context import ALL_UNLOCKED, CraftedItem, CraftingContext
+from .engine import SearchStats, iter_recipe_results
+from .isaac_rng import string_to_seed
 from .isaac_items import ItemListEntry
 from .isaac_pickups import PICKUP_LIST
-from .isaac_recipes import find_hardcoded_recipe
-from .utilities import get_quality_ranges, hardcoded_recipe_requires_unlock
+from .output import ResultWriter, item_to_dict, recipe_to_dict
+from .multisets import count_bounded_multisets, get_pickup_limits, iter_recipes
+from .neighbourhood import iter_recipe_swaps
+from .planner import iter_grouped_results
+from .predicates import RecipePruner
+from .probability import get_outcome_distribution
+from .sampling import CraftableSetSampler
+from .search import CheapestRecipeSearch
+from .shards import Shard, get_shard_range, iter_shard_recipes
+from .simulator import iter_bag_results
+from .utilities import get_quality_ranges
 
 
 def get_result(
     platform: str, game_version: str, pickup_array: List[int], seed: int
 ) -> Tuple[List[int], List[int], int]:
-    candidates = []
-    pickup_count = [0] * len(PICKUP_LIST)
-    quality_sum = 0
-    for pickup_id in pickup_array:
-        pickup_count[pickup_id] += 1
-        quality_sum += PICKUP_LIST[pickup_id].quality
-
-    item_pools = ItemPool.load_item_pools(platform, game_version)
-    items = ItemListEntry.load_item_list(platform, game_version)
-
-    hardcoded_recipe = find_hardcoded_recipe(platform, game_version, pickup_array)
-    if hardcoded_recipe:
-        # v1.7.8 requires that hardcoded items are now unlocked. If there's an achievement id, search for more candidates
-        if hardcoded_recipe_requires_unlock(platform, game_version):
-            candidates.append(hardcoded_recipe.item_id)
-        else:
-            return pickup_array, [hardcoded_recipe.item_id], quality_sum
-
-    pool_weights = {
-        0: 1,
-        1: 2,
-        2: 2,
-        3: pickup_count[3] * 10,
-        4: pickup_count[4] * 10,
-        5: pickup_count[6] * 5,
-        7: pickup_count[29] * 10,
-        8: pickup_count[5] * 10,
-        9: pickup_count[25] * 10,
-        12: pickup_count[7] * 10,
-        26: pickup_count[23] * 10
-        if (
-            pickup_count[15] + pickup_count[12] + pickup_count[8] + pickup_count[1] == 0
-        )
-        else 0,
-    }
-
-    current_seed = seed
-    for pickup_id in range(len(pickup_count)):
-        for _ in range(pickup_count[pickup_id]):
-            current_seed = rng_next(current_seed, pickup_id)
-
-    collectible_count = 732
-    collectible_list = [0.0] * collectible_count
-    quality_min = 0
-    quality_max = 4
-
-    quality_ranges = get_quality_ranges(platform, game_version)
-
-    for pool_id, pool_weight in pool_weights.items():
-        if pool_weight <= 0:
-            continue
-
-        item_pool = item_pools[pool_id]
-
-        score = quality_sum
-        if item_pool.lowered_quality:
-            score -= 5
-
-        for min_score, quality_min, quality_max in reversed(quality_ranges):
-            if score >= min_score:
-                break
-            
-        # We only add the items to the list if they are in the quality range
-        # Thus, -1 will never be added to the list
-        for quality in range(quality_min, quality_max + 1):
-            for item_id, item_weight in item_pool.quality_lists[quality]:
-                # Some items are skipped in the WEIGHTING step.
-                if is_item_available(items[item_id], True):
-                    collectible_list[item_id] += pool_weight * item_weight
-
-    cumulative_weights = list(itertools.accumulate(collectible_list))
-    all_weight = sum(collectible_list)
-
-    for _ in range(20):
-        # Increment the RNG seed
-        current_seed = rng_next(current_seed, 6)
-        # Number between 0 and total weight of all possible results
-        remains = float(current_seed) * 2.3283062e-10 * all_weight
-
-        if remains >= all_weight:
-            break
-
-        # Find the first item in the list with a greater weight than the random number
-        selected_item_id = bisect.bisect_right(cumulative_weights, remains)
-    
-        # Some items are skipped in the GENERATING step.
-        if not is_item_available(items[item_id], False):
-            continue
-
-        # Add the item to the list.
-        item_config = items[selected_item_id]
-        candidates.append(selected_item_id)
+    return CraftingContext.get(platform, game_version).get_result(pickup_array, seed)
 
-        # If the item is not available in the current pool, or is tied to an achievement that isn't unlocked, Bag of Crafting will skip it.
-        # So if the item is tied to an achievement, we have to continue finding matches until we find one that isn't.
-        if item_config.achievement_id is None:
-            # This item is not tied to an achievement, so we can stop here.
-            return pickup_array, candidates, quality_sum
 
-    # return breakfast if above fails
-    candidates.append(25)
-    return pickup_array, candidates, quality_sum
+class RecipeMatch(NamedTuple):
+    item_id: int
+    pickups: Sequence[int]
+    quality_sum: int
 
 
 def print_progress(current: int, total: int):
@@ -126,49 +39,364 @@ def print_progress(current: int, total: int):
     if current in when_to_print:
         print(f"{when_to_print[current]}% done")
 
-# 1.7.9 adds a new function to the game that checks if an item is available in the current pool.
-# This takes into whether the player is in Greed Mode, whether the player has The Lost's Birthright, etc.
-# and skips over items which are unavailable based on these conditions.
-def is_item_available(item: ItemListEntry, weight: bool) -> bool:
-    has_any_flags = config["is_daily_run"] or config["is_greed_mode"] or config["is_in_challenge"] or config["has_lost_birthright"] or config["is_keeper"] or config["is_tlost"]
-
-    if not has_any_flags:
-        return True
-
-    if weight:
-        if config["is_daily_run"] and item.has_tag("nodaily"):
-            return False
-        if config["is_greed_mode"] and item.has_tag("nogreed"):
-            return False
-        if config["is_in_challenge"] and item.has_tag("nochallenge"):
-            return False
-        if config["has_lost_birthright"] and item.has_tag("nolostbr"):
-            return False
-    else:
-        if config["is_keeper"] and item.has_tag("nokeeper"):
-            return False
-        if config["is_tlost"] and not item.has_tag("offensive"):
-            return False
-        # TODO: Tainted Lost has 20% reroll chance on Quality 2 or less
-        if config["has_sacred_orb"] and item.quality <= 1:
-            return False
-        # TODO: Sacred Orb has 33% reroll chance on Quality 2
-        if config["has_trinket_no"] and item.is_active:
-            return False
-
-    return True
-
-def find_item_id(platform: str, game_version: str, seed_string: str, pickup_list: List[int]) -> None:
+
+def get_total_recipe_count(
+    pickup_list: List[int], inventory: Optional[Dict[int, int]] = None, shard: Optional[Shard] = None
+) -> Optional[int]:
+    if shard is not None:
+        # Only known up front when the shard is a plain slice of the enumeration.
+        if inventory is not None:
+            return None
+        start, stop = get_shard_range(get_total_recipe_count(pickup_list), shard)
+        return stop - start
+    if inventory is not None:
+        return count_bounded_multisets(get_pickup_limits(pickup_list, inventory))
+    return int(
+        math.factorial(len(pickup_list) + 7)
+        / (math.factorial(len(pickup_list) - 1) * math.factorial(8))
+    )
+
+
+def iter_results_for_pickups(
+    platform: str,
+    game_version: str,
+    seed: int,
+    pickup_list: List[int],
+    executor: Optional[Executor] = None,
+    inventory: Optional[Dict[int, int]] = None,
+    item_ids: Optional[Iterable[int]] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+    grouped: bool = False,
+    shard: Optional[Shard] = None,
+) -> Iterator[CraftedItem]:
+    """
+    Evaluate every recipe from the given pickup types, using no more of each pickup than the inventory holds,
+    with the achievements in `unlocked_mask` unlocked. With `item_ids`, recipes which can't craft any of those items may be skipped without being evaluated.
+    With `grouped`, recipes are evaluated one group of weight tables at a time (see `iter_grouped_results`), which
+    is quicker and uses far less memory for big searches, but doesn't yield them in enumeration order.
+    With `shard`, only the recipes in that shard of the enumeration are evaluated (see `iter_shard_recipes`).
+    """
+    context = CraftingContext.get(platform, game_version)
+    if grouped:
+        if shard is not None:
+            raise ValueError("Grouped searches can't be sharded.")
+        return iter_grouped_results(context, seed, pickup_list, inventory, executor, item_ids, unlocked_mask)
+    prune = None
+    if item_ids is not None:
+        prune = RecipePruner(context, item_ids, get_pickup_limits(pickup_list, inventory))
+    recipes = iter_recipes(pickup_list, inventory, prune)
+    if shard is not None:
+        recipes = iter_shard_recipes(recipes, pickup_list, shard, inventory is None and prune is None)
+    return iter_recipe_results(context, seed, recipes, executor, unlocked_mask=unlocked_mask)
+
+
+def iter_items_for_pickups(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    executor: Optional[Executor] = None,
+    inventory: Optional[Dict[int, int]] = None,
+    item_ids: Optional[Iterable[int]] = None,
+    max_results: Optional[int] = None,
+    stable_after: Optional[int] = None,
+    stats: Optional[SearchStats] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+    grouped: bool = False,
+    shard: Optional[Shard] = None,
+) -> Iterator[RecipeMatch]:
+    """
+    Yield each item (out of `item_ids`, or any item) craftable from the given pickup types, with the first recipe found for it.
+    The search stops early once every item in `item_ids` has been found, once `max_results` items have been found,
+    or once `stable_after` recipes in a row haven't found a new item (which may miss some items).
+    """
     seed = string_to_seed(seed_string)
-    _, item_ids, quality_sum = get_result(platform, game_version, pickup_list, seed)
+    if stats is None:
+        stats = SearchStats()
+    stats.start(get_total_recipe_count(pickup_list, inventory, shard))
+    craftable_set = set()
+    targets = None if item_ids is None else set(item_ids)
+    if targets is not None and not targets:
+        stats.stop("found all items")
+        return
+
+    unchanged = 0
+    results = iter_results_for_pickups(
+        platform, game_version, seed, pickup_list, executor, inventory, targets, unlocked_mask, grouped, shard
+    )
+    try:
+        for pickups, item_id, quality_sum in results:
+            stats.advance()
+            unchanged += 1
+            if item_id not in craftable_set and (targets is None or item_id in targets):
+                craftable_set.add(item_id)
+                unchanged = 0
+                yield RecipeMatch(item_id, pickups, quality_sum)
+                if targets is not None and len(craftable_set) == len(targets):
+                    stats.stop("found all items")
+                    return
+                if max_results is not None and len(craftable_set) >= max_results:
+                    stats.stop(f"found {max_results} items")
+                    return
+            if stable_after is not None and unchanged >= stable_after:
+                stats.stop(f"no new items in {stable_after} recipes")
+                return
+        stats.stop()
+    finally:
+        results.close()
+
+
+def get_item_targets(platform: str, game_version: str, specs: Iterable[Union[int, str]]) -> List[int]:
+    """Resolve item IDs, `quality:N` and `tag:NAME` into a sorted list of item IDs."""
     items = ItemListEntry.load_item_list(platform, game_version)
+    targets = set()
+    for spec in specs:
+        spec = str(spec)
+        kind, _, value = spec.partition(":")
+        if kind == "quality" and value.isdigit():
+            targets.update(item_id for item_id, item in items.items() if item.quality == int(value))
+        elif kind == "tag" and value:
+            targets.update(item_id for item_id, item in items.items() if item.has_tag(value))
+        elif spec.isdigit() and int(spec) in items:
+            targets.add(int(spec))
+        else:
+            raise ValueError(f"Unknown item {spec!r}, expected an item ID, quality:N or tag:NAME.")
+    return sorted(targets)
+
+
+def iter_recipes_for_items(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    item_ids: Iterable[int],
+    executor: Optional[Executor] = None,
+    inventory: Optional[Dict[int, int]] = None,
+    max_recipes: Optional[int] = None,
+    max_results: Optional[int] = None,
+    stats: Optional[SearchStats] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+    grouped: bool = False,
+    shard: Optional[Shard] = None,
+) -> Iterator[RecipeMatch]:
+    """
+    Yield the recipes from the given pickup types which craft any of the items, in enumeration order, in one pass.
+    With `max_recipes`, each item stops matching once it has that many recipes, and the search stops once all of them do.
+    With `max_results`, the search stops once that many recipes have been found in total.
+    """
+    seed = string_to_seed(seed_string)
+    if stats is None:
+        stats = SearchStats()
+    stats.start(get_total_recipe_count(pickup_list, inventory, shard))
+    targets = set(item_ids)
+    remaining = set(targets)
+    recipe_counts = defaultdict(int)
+    found = 0
+    if not targets or max_recipes == 0 or max_results == 0:
+        stats.stop("nothing to find")
+        return
+
+    results = iter_results_for_pickups(
+        platform, game_version, seed, pickup_list, executor, inventory, targets, unlocked_mask, grouped, shard
+    )
+    try:
+        for pickups, item_id, quality_sum in results:
+            stats.advance()
+            if item_id not in remaining:
+                continue
+            recipe_counts[item_id] += 1
+            found += 1
+            yield RecipeMatch(item_id, pickups, quality_sum)
+            if max_recipes is not None and recipe_counts[item_id] >= max_recipes:
+                remaining.discard(item_id)
+                if not remaining:
+                    stats.stop(f"found {max_recipes} recipes for every item")
+                    return
+            if max_results is not None and found >= max_results:
+                stats.stop(f"found {max_results} recipes")
+                return
+        stats.stop()
+    finally:
+        results.close()
+
+
+def iter_recipes_for_item(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    item_id: int,
+    executor: Optional[Executor] = None,
+    inventory: Optional[Dict[int, int]] = None,
+) -> Iterator[RecipeMatch]:
+    """Yield every recipe from the given pickup types which crafts the item, in enumeration order."""
+    return iter_recipes_for_items(platform, game_version, seed_string, pickup_list, [item_id], executor, inventory)
+
+
+def iter_uncraftable_items(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    executor: Optional[Executor] = None,
+    inventory: Optional[Dict[int, int]] = None,
+    item_ids: Optional[Iterable[int]] = None,
+    stable_after: Optional[int] = None,
+    stats: Optional[SearchStats] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+    grouped: bool = False,
+    shard: Optional[Shard] = None,
+) -> Iterator[int]:
+    """
+    Yield the IDs of every item (out of `item_ids`, or any item) which can't be crafted from the given pickup types, once the search is done.
+    The search stops early once every item has been crafted, or once `stable_after` recipes in a row haven't
+    crafted a new item (in which case some of the items yielded may be craftable after all).
+    """
+    seed = string_to_seed(seed_string)
+    if stats is None:
+        stats = SearchStats()
+    stats.start(get_total_recipe_count(pickup_list, inventory, shard))
+    targets = None if item_ids is None else set(item_ids)
+    uncraftable_set = set(ItemListEntry.load_item_list(platform, game_version) if targets is None else targets)
+
+    unchanged = 0
+    results = iter_results_for_pickups(
+        platform, game_version, seed, pickup_list, executor, inventory, targets, unlocked_mask, grouped, shard
+    )
+    try:
+        for _, item_id, _ in results:
+            stats.advance()
+            unchanged += 1
+            if item_id in uncraftable_set:
+                uncraftable_set.discard(item_id)
+                unchanged = 0
+                if not uncraftable_set:
+                    stats.stop("every item is craftable")
+                    break
+            if stable_after is not None and unchanged >= stable_after:
+                stats.stop(f"no new items in {stable_after} recipes")
+                break
+        else:
+            stats.stop()
+    finally:
+        results.close()
+    yield from sorted(uncraftable_set)
+
+
+def iter_fixed_recipes(
+    platform: str,
+    game_version: str,
+    pickup_list: List[int],
+    inventory: Optional[Dict[int, int]] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> Iterator[RecipeMatch]:
+    """Yield every recipe from the given pickup types which crafts the same item on every seed, in enumeration order."""
+    context = CraftingContext.get(platform, game_version)
+    for recipe in iter_recipes(pickup_list, inventory):
+        item_id = context.get_fixed_item(recipe, unlocked_mask)
+        if item_id is not None:
+            yield RecipeMatch(item_id, recipe, sum(PICKUP_LIST[pickup_id].quality for pickup_id in recipe))
+
+
+def estimate_craftable_items(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    time_limit: float,
+    inventory: Optional[Dict[int, int]] = None,
+    item_ids: Optional[Iterable[int]] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> CraftableSetSampler:
+    """
+    Sample recipes from the given pickup types for `time_limit` seconds, to estimate which items (out of `item_ids`,
+    or any item) are craftable. The sampler can be run again to refine the estimate.
+    """
+    context = CraftingContext.get(platform, game_version)
+    sampler = CraftableSetSampler(context, string_to_seed(seed_string), pickup_list, inventory, item_ids, unlocked_mask)
+    sampler.run(time_limit)
+    return sampler
+
+
+def print_sampled_items(
+    sampler: CraftableSetSampler,
+    seed_string: str,
+    pickup_list: List[int],
+    item_ids: Optional[Iterable[int]],
+    output_format: str,
+    craftable: bool,
+) -> None:
+    """Print the items found (or, if not `craftable`, not found) by a sampler, with each item's estimated chance of being missed."""
+    items = sampler.context.items
+    item_ids = sorted(items if item_ids is None else set(item_ids))
+    miss_chances = sampler.get_miss_chances(item_ids)
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            for item_id in item_ids:
+                match = sampler.found.get(item_id)
+                output = item_to_dict(items[item_id]) if match is None else recipe_to_dict(items[item_id], match.pickups, match.quality_sum)
+                output["found"] = match is not None
+                output["miss_chance"] = miss_chances[item_id]
+                writer.write(output)
+        return
+
     print(f"SEED: {seed_string}")
     print()
+    if craftable:
+        print(f"The following {len(sampler.found)} items were found to be craftable with the given pickup types:")
+        print_pickup_list(pickup_list, " ->")
+        for item_id in sorted(sampler.found):
+            item = items[item_id]
+            print(f"{item.name} (id {item.item_id} {item.quality_str})")
+    else:
+        missing = sorted((item_id for item_id in item_ids if item_id not in sampler.found), key=lambda item_id: (miss_chances[item_id], item_id))
+        print(f"The following {len(missing)} items weren't found, with the estimated chance that they are craftable after all:")
+        print_pickup_list(pickup_list, " -X->")
+        for item_id in missing:
+            item = items[item_id]
+            print(f"{item.name} (id {item.item_id} {item.quality_str}): {miss_chances[item_id] * 100:.1f}%")
+    print()
+    if sampler.exhausted:
+        print(f"Every one of the {sampler.total} recipes was evaluated, so this is exact.")
+    else:
+        print(f"Sampled {sampler.evaluated} of {sampler.total} recipes; the estimate gets closer to exact the longer it samples.")
+        if craftable:
+            print(f"{sum(1 for chance in miss_chances.values() if chance >= 0.5)} items which weren't found are more likely than not to be craftable.")
+
+
+def print_pickup_list(pickup_list: List[int], suffix: str = "") -> None:
     print(f"[ {PICKUP_LIST[pickup_list[0]].pickup_name}")
     for pickup_id in pickup_list[1:-1]:
         print(f"  {PICKUP_LIST[pickup_id].pickup_name}")
 
-    print(f"  {PICKUP_LIST[pickup_list[-1]].pickup_name} ]")
+    print(f"  {PICKUP_LIST[pickup_list[-1]].pickup_name} ]{suffix}")
+
+def find_item_id(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    output_format: str = "text",
+    unlocked_mask: Optional[int] = None,
+) -> None:
+    seed = string_to_seed(seed_string)
+    context = CraftingContext.get(platform, game_version)
+    _, item_ids, quality_sum = context.get_result(pickup_list, seed)
+    items = context.items
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            if unlocked_mask is None:
+                output = recipe_to_dict(items[item_ids[0]], pickup_list, quality_sum)
+                output["candidates"] = item_ids
+            else:
+                item_id = context.get_item(pickup_list, seed, unlocked_mask).item_id
+                output = recipe_to_dict(items[item_id], pickup_list, quality_sum)
+            writer.write(output)
+        return
+
+    print(f"SEED: {seed_string}")
+    print()
+    print_pickup_list(pickup_list)
 
     quality_min = 0
     quality_max = 1
@@ -179,121 +407,400 @@ def find_item_id(platform: str, game_version: str, seed_string: str, pickup_list
     print(
         f"(total {quality_sum}, {'★' * quality_min + '☆' * (4 - quality_min)}-{'★' * quality_max + '☆' * (4 - quality_max)})"
     )
+    if unlocked_mask is not None:
+        item = items[context.get_item(pickup_list, seed, unlocked_mask).item_id]
+        print(f"Result: {item.name} (id {item.item_id} {item.quality_str})")
+        return
     print("Candidates:")
     for item_id in item_ids:
         item = items[item_id]
         print(f"{item.name} (id {item.item_id} {item.quality_str})")
 
 
-def find_items_for_pickups(
-    platform: str, game_version: str, seed_string: str, pickup_list: List[int]
+def find_item_distribution(
+    platform: str,
+    game_version: str,
+    pickup_list: List[int],
+    output_format: str = "text",
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> None:
+    context = CraftingContext.get(platform, game_version)
+    distribution = get_outcome_distribution(context, pickup_list, unlocked_mask)
+    results = sorted(distribution.items(), key=lambda result: (-result[1], result[0]))
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            for item_id, probability in results:
+                output = item_to_dict(context.items[item_id])
+                output["probability"] = probability
+                writer.write(output)
+        return
+
+    print_pickup_list(pickup_list)
+    print("Outcomes over all seeds:")
+    for item_id, probability in results:
+        item = context.items[item_id]
+        print(f"{probability * 100:7.3f}% {item.name} (id {item.item_id} {item.quality_str})")
+
+
+def simulate_bag(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_stream: List[int],
+    output_format: str = "text",
+    unlocked_mask: int = ALL_UNLOCKED,
 ) -> None:
     seed = string_to_seed(seed_string)
-    total_recipe_count = int(
-        math.factorial(len(pickup_list) + 7)
-        / (math.factorial(len(pickup_list) - 1) * math.factorial(8))
+    context = CraftingContext.get(platform, game_version)
+    results = iter_bag_results(context, seed, pickup_stream, unlocked_mask)
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            for position, (pickups, item_id, quality_sum) in enumerate(results, 8):
+                output = recipe_to_dict(context.items[item_id], pickups, quality_sum)
+                output["position"] = position
+                writer.write(output)
+        return
+
+    print(f"SEED: {seed_string}")
+    print()
+    for position, (_, item_id, quality_sum) in enumerate(results, 8):
+        item = context.items[item_id]
+        print(f"After pickup {position} ({PICKUP_LIST[pickup_stream[position - 1]].pickup_name}): {item.name} (id {item.item_id} {item.quality_str})")
+
+
+def find_recipe_swaps(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    output_format: str = "text",
+    inventory: Optional[Dict[int, int]] = None,
+    item_ids: Optional[Iterable[int]] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> None:
+    seed = string_to_seed(seed_string)
+    context = CraftingContext.get(platform, game_version)
+    targets = None if item_ids is None else set(item_ids)
+    swaps = (
+        swap
+        for swap in iter_recipe_swaps(context, seed, pickup_list, None, inventory, unlocked_mask)
+        if targets is None or swap.item_id in targets
     )
-    print(f"Calculating {total_recipe_count} recipes...")
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            for swap in swaps:
+                output = recipe_to_dict(context.items[swap.item_id], swap.pickups, swap.quality_sum)
+                output["removed_id"] = swap.removed_id
+                output["added_id"] = swap.added_id
+                writer.write(output)
+        return
 
-    get_result_b = update_wrapper(partial(get_result, platform, game_version), get_result)
+    print(f"SEED: {seed_string}")
+    print()
+    print_pickup_list(pickup_list, " ->")
+    item = context.items[context.get_item(pickup_list, seed, unlocked_mask).item_id]
+    print(f"{item.name} (id {item.item_id} {item.quality_str})")
+    print()
+    print("Swapping one pickup gives:")
+    for swap in swaps:
+        item = context.items[swap.item_id]
+        print(
+            f"-{PICKUP_LIST[swap.removed_id].pickup_name} +{PICKUP_LIST[swap.added_id].pickup_name}: "
+            f"{item.name} (id {item.item_id} {item.quality_str})"
+        )
 
-    craftable_set = set()
-    with ProcessPoolExecutor() as executor:
-        results = executor.map(
-            get_result_b,
-            itertools.combinations_with_replacement(pickup_list, 8),
-            itertools.repeat(seed),
-            chunksize=32,
+
+def print_search_plan(
+    platform: str,
+    game_version: str,
+    pickup_list: List[int],
+    output_format: str = "text",
+    inventory: Optional[Dict[int, int]] = None,
+    item_ids: Optional[Iterable[int]] = None,
+) -> None:
+    """Count the recipes a search would cover by quality band and weight table, without enumerating them."""
+    context = CraftingContext.get(platform, game_version)
+    limits = get_pickup_limits(pickup_list, inventory)
+    quality_counts = count_by_quality_sum(limits)
+    table_counts = count_by_table_key(context.quality_ranges, limits)
+    total = sum(quality_counts.values())
+
+    band_counts = []
+    for band, (score_min, quality_min, quality_max) in enumerate(context.quality_ranges):
+        score_max = context.quality_ranges[band + 1][0] - 1 if band + 1 < len(context.quality_ranges) else None
+        count = sum(
+            count
+            for quality_sum, count in quality_counts.items()
+            if quality_sum >= score_min and (score_max is None or quality_sum <= score_max)
         )
-        for result in results:
-            craftable_set.add(result[1][0])
+        band_counts.append((score_min, score_max, quality_min, quality_max, count))
+
+    matching = None
+    if item_ids is not None:
+        pruner = RecipePruner(context, item_ids, limits)
+        matching = sum(count for table_key, count in table_counts.items() if pruner.can_match_table(table_key))
+
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            output = {
+                "total": total,
+                "quality_bands": [
+                    {"score_min": score_min, "score_max": score_max, "quality_min": quality_min, "quality_max": quality_max, "count": count}
+                    for score_min, score_max, quality_min, quality_max, count in band_counts
+                ],
+                "weight_tables": len(table_counts),
+                "pool_signatures": len(count_by_pool_signature(table_counts)),
+            }
+            if matching is not None:
+                output["matching"] = matching
+            writer.write(output)
+        return
+
+    print(f"{total} recipes use the given pickup types.")
+    print()
+    for score_min, score_max, quality_min, quality_max, count in band_counts:
+        scores = f"{score_min}+" if score_max is None else f"{score_min}-{score_max}"
+        print(f"Quality sum {scores} ({'★' * quality_min + '☆' * (4 - quality_min)}-{'★' * quality_max + '☆' * (4 - quality_max)}): {count} recipes")
+    print()
+    print(
+        f"They share {len(table_counts)} weight tables, with {len(count_by_pool_signature(table_counts))} different pool weightings."
+    )
+    if matching is not None:
+        print(f"{matching} recipes can draw one of the {len(set(item_ids))} items; the rest can be skipped unless they are hardcoded recipes.")
+
+
+def print_recipe_count(pickup_list: List[int], inventory: Optional[Dict[int, int]] = None, shard: Optional[Shard] = None) -> None:
+    total = get_total_recipe_count(pickup_list, inventory, shard)
+    if shard is None:
+        print(f"Calculating {total} recipes...")
+    elif total is None:
+        print(f"Calculating shard {shard[0]}/{shard[1]} of the recipes...")
+    else:
+        print(f"Calculating {total} recipes (shard {shard[0]}/{shard[1]})...")
+
+
+def find_items_for_pickups(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    output_format: str = "text",
+    inventory: Optional[Dict[int, int]] = None,
+    item_ids: Optional[Iterable[int]] = None,
+    max_results: Optional[int] = None,
+    stable_after: Optional[int] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+    grouped: bool = False,
+    sample_time: Optional[float] = None,
+    shard: Optional[Shard] = None,
+) -> None:
+    if sample_time is not None:
+        sampler = estimate_craftable_items(platform, game_version, seed_string, pickup_list, sample_time, inventory, item_ids, unlocked_mask)
+        print_sampled_items(sampler, seed_string, pickup_list, item_ids, output_format, True)
+        return
+
+    items = ItemListEntry.load_item_list(platform, game_version)
+    stats = SearchStats()
+    matches = iter_items_for_pickups(
+        platform, game_version, seed_string, pickup_list, None, inventory, item_ids, max_results, stable_after, stats, unlocked_mask, grouped, shard
+    )
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            for item_id, pickups, quality_sum in matches:
+                writer.write(recipe_to_dict(items[item_id], pickups, quality_sum))
+        return
+
+    print_recipe_count(pickup_list, inventory, shard)
+    craftable_set = {match.item_id for match in matches}
 
     print(f"SEED: {seed_string}")
     print()
     print(
         f"The following {len(craftable_set)} items are craftable with the given pickup types:"
     )
-    print(f"[ {PICKUP_LIST[pickup_list[0]].pickup_name}")
-    for pickup_id in pickup_list[1:-1]:
-        print(f"  {PICKUP_LIST[pickup_id].pickup_name}")
-
-    print(f"  {PICKUP_LIST[pickup_list[-1]].pickup_name} ] ->")
-    items = ItemListEntry.load_item_list(platform, game_version)
+    print_pickup_list(pickup_list, " ->")
     for item_id in sorted(craftable_set):
         item = items[item_id]
         print(f"{item.name} (id {item.item_id} {item.quality_str})")
+    print()
+    print(stats)
 
 
-def find_recipes_for_item(
-    platform: str, game_version: str, seed_string: str, pickup_list: List[int], item_id: int
-) -> None:
-    seed = string_to_seed(seed_string)
-    total_recipe_count = int(
-        math.factorial(len(pickup_list) + 7)
-        / (math.factorial(len(pickup_list) - 1) * math.factorial(8))
+def print_item_recipes(item: ItemListEntry, item_recipes: List[Tuple[Sequence[int], str]], prefix: str = "") -> None:
+    print(
+        f"The following {prefix}recipes are viable for {item.name} (id {item.item_id} {item.quality_str}) with the given pickup types:"
     )
-    print(f"Calculating {total_recipe_count} recipes...")
-
-    get_result_b = update_wrapper(partial(get_result, platform, game_version), get_result)
-
-    item_recipes = []
-    with ProcessPoolExecutor() as executor:
-        results = executor.map(
-            get_result_b,
-            itertools.combinations_with_replacement(pickup_list, 8),
-            itertools.repeat(seed),
-            chunksize=32,
+    for recipe, details in item_recipes:
+        print(
+            f"[{', '.join([PICKUP_LIST[pid].pickup_name for pid in recipe])}] ({details})"
         )
-        for result in results:
-            if item_id == result[1][0]:
-                item_recipes.append(result)
 
+
+def find_recipes_for_items(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    item_ids: List[int],
+    output_format: str = "text",
+    inventory: Optional[Dict[int, int]] = None,
+    max_recipes: Optional[int] = None,
+    max_results: Optional[int] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+    grouped: bool = False,
+    shard: Optional[Shard] = None,
+) -> None:
     items = ItemListEntry.load_item_list(platform, game_version)
-    item = items[item_id]
+    stats = SearchStats()
+    matches = iter_recipes_for_items(
+        platform, game_version, seed_string, pickup_list, item_ids, None, inventory, max_recipes, max_results, stats, unlocked_mask, grouped, shard
+    )
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            for item_id, pickups, quality_sum in matches:
+                writer.write(recipe_to_dict(items[item_id], pickups, quality_sum))
+        return
+
+    print_recipe_count(pickup_list, inventory, shard)
+    item_recipes = defaultdict(list)
+    for match in matches:
+        item_recipes[match.item_id].append(match)
+
     print(f"SEED: {seed_string}")
+    for item_id in item_ids:
+        if len(item_ids) > 1 and not item_recipes[item_id]:
+            continue
+        print()
+        recipes = sorted(item_recipes[item_id], key=lambda match: match.quality_sum)
+        print_item_recipes(items[item_id], [(match.pickups, str(match.quality_sum)) for match in recipes])
     print()
-    print(
-        f"The following recipes are viable for {item.name} (id {item.item_id} {item.quality_str}) with the given pickup types:"
-    )
-    item_recipes.sort(key=lambda tup: tup[2])
-    for recipe, _, quality_sum in item_recipes:
-        print(
-            f"[{', '.join([PICKUP_LIST[pid].pickup_name for pid in recipe])}] ({quality_sum})"
-        )
+    print(stats)
+
+
+def find_recipes_for_item(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    item_id: int,
+    output_format: str = "text",
+    inventory: Optional[Dict[int, int]] = None,
+) -> None:
+    find_recipes_for_items(platform, game_version, seed_string, pickup_list, [item_id], output_format, inventory)
 
 
 def find_uncraftable_items(
-    platform: str, game_version: str, seed_string: str, pickup_list: List[int]
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    output_format: str = "text",
+    inventory: Optional[Dict[int, int]] = None,
+    item_ids: Optional[Iterable[int]] = None,
+    stable_after: Optional[int] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+    grouped: bool = False,
+    sample_time: Optional[float] = None,
+    shard: Optional[Shard] = None,
 ) -> None:
-    seed = string_to_seed(seed_string)
-    total_recipe_count = int(
-        math.factorial(len(pickup_list) + 7)
-        / (math.factorial(len(pickup_list) - 1) * math.factorial(8))
-    )
-    print(f"Calculating {total_recipe_count} recipes...")
+    if sample_time is not None:
+        sampler = estimate_craftable_items(platform, game_version, seed_string, pickup_list, sample_time, inventory, item_ids, unlocked_mask)
+        print_sampled_items(sampler, seed_string, pickup_list, item_ids, output_format, False)
+        return
 
     items = ItemListEntry.load_item_list(platform, game_version)
-    uncraftable_set = set(items)
-    with ProcessPoolExecutor() as executor:
-        results = executor.map(
-            get_result,
-            itertools.combinations_with_replacement(pickup_list, 8),
-            itertools.repeat(seed),
-            chunksize=32,
-        )
-        for result in results:
-            uncraftable_set.discard(result[1][0])
+    stats = SearchStats()
+    uncraftable_items = iter_uncraftable_items(
+        platform, game_version, seed_string, pickup_list, None, inventory, item_ids, stable_after, stats, unlocked_mask, grouped, shard
+    )
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            for item_id in uncraftable_items:
+                writer.write(item_to_dict(items[item_id]))
+        return
+
+    print_recipe_count(pickup_list, inventory, shard)
+    uncraftable_list = list(uncraftable_items)
 
     print(f"SEED: {seed_string}")
     print()
     print(
-        f"The following {len(uncraftable_set)} items are uncraftable with the given pickup types:"
+        f"The following {len(uncraftable_list)} items are uncraftable with the given pickup types:"
     )
-    print(f"[ {PICKUP_LIST[pickup_list[0]].pickup_name}")
-    for pickup_id in pickup_list[1:-1]:
-        print(f"  {PICKUP_LIST[pickup_id].pickup_name}")
-
-    print(f"  {PICKUP_LIST[pickup_list[-1]].pickup_name} ] -X->")
-    for item_id in sorted(uncraftable_set):
+    print_pickup_list(pickup_list, " -X->")
+    for item_id in uncraftable_list:
         item = items[item_id]
         print(f"{item.name} (id {item.item_id} {item.quality_str})")
+    print()
+    print(stats)
+
+
+def find_fixed_recipes(
+    platform: str,
+    game_version: str,
+    pickup_list: List[int],
+    output_format: str = "text",
+    inventory: Optional[Dict[int, int]] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> None:
+    items = ItemListEntry.load_item_list(platform, game_version)
+    matches = iter_fixed_recipes(platform, game_version, pickup_list, inventory, unlocked_mask)
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            for item_id, pickups, quality_sum in matches:
+                writer.write(recipe_to_dict(items[item_id], pickups, quality_sum))
+        return
+
+    print(f"Calculating {get_total_recipe_count(pickup_list, inventory)} recipes...")
+    item_recipes = defaultdict(list)
+    for match in matches:
+        item_recipes[match.item_id].append(match)
+
+    print(f"{sum(len(recipes) for recipes in item_recipes.values())} recipes craft the same item on every seed.")
+    for item_id in sorted(item_recipes):
+        print()
+        print_item_recipes(items[item_id], [(match.pickups, str(match.quality_sum)) for match in item_recipes[item_id]], "seed-independent ")
+
+
+def find_cheapest_recipes_for_items(
+    platform: str,
+    game_version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    item_ids: List[int],
+    k: int,
+    pickup_costs: Optional[Dict[int, float]] = None,
+    output_format: str = "text",
+    inventory: Optional[Dict[int, int]] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> None:
+    seed = string_to_seed(seed_string)
+    items = ItemListEntry.load_item_list(platform, game_version)
+    search = CheapestRecipeSearch(
+        CraftingContext.get(platform, game_version), seed, pickup_list, item_ids, pickup_costs, inventory, k, unlocked_mask
+    )
+    if output_format != "text":
+        with ResultWriter(output_format) as writer:
+            for item_id, pickups, quality_sum, cost in search:
+                output = recipe_to_dict(items[item_id], pickups, quality_sum)
+                output["cost"] = cost
+                writer.write(output)
+        return
+
+    print(f"Searching {get_total_recipe_count(pickup_list, inventory)} recipes for the {k} cheapest...")
+    item_recipes = defaultdict(list)
+    for match in search:
+        item_recipes[match.item_id].append(match)
+
+    print(f"SEED: {seed_string}")
+    for item_id in item_ids:
+        if len(item_ids) > 1 and not item_recipes[item_id]:
+            continue
+        print()
+        print_item_recipes(
+            items[item_id],
+            [(match.pickups, f"cost {match.cost:g}, quality {match.quality_sum}") for match in item_recipes[item_id]],
+            f"{len(item_recipes[item_id])} cheapest ",
+        )
+    print()
+    print(f"Evaluated {search.evaluated} recipes.")
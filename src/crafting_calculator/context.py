@@ -0,0 +1,507 @@
+import bisect
+import itertools
+import operator
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from .config import config
+from .isaac_rng import rng_next
+from .isaac_item_pools import ItemPool
+from .isaac_items import ItemListEntry
+from .isaac_pickups import PICKUP_LIST
+from .isaac_recipes import HardcodedRecipe
+from .utilities import get_quality_ranges, hardcoded_recipe_requires_unlock
+
+
+# Flags which are checked during the WEIGHTING step, the rest are checked during the GENERATING step.
+WEIGHT_FLAGS = [
+    "is_daily_run",
+    "is_greed_mode",
+    "is_in_challenge",
+    "has_lost_birthright",
+]
+GENERATE_FLAGS = ["is_keeper", "is_tlost", "has_sacred_orb", "has_trinket_no"]
+
+# The item returned when the bag fails to pick anything.
+BREAKFAST_ITEM_ID = 25
+
+# An unlocked-achievement bitmask with every achievement unlocked.
+ALL_UNLOCKED = -1
+
+
+class CraftResult(NamedTuple):
+    pickups: Sequence[int]
+    candidates: List[int]
+    quality_sum: int
+
+
+class CraftedItem(NamedTuple):
+    pickups: Sequence[int]
+    item_id: int
+    quality_sum: int
+
+
+def get_unlocked_mask(
+    unlocked_achievements: Union[None, int, Iterable[int]] = None
+) -> int:
+    """
+    Convert the unlocked achievement IDs from a save (or a bitmask, where bit N is set if achievement N is unlocked)
+    into a bitmask. `None` means every achievement is unlocked.
+    """
+    if unlocked_achievements is None:
+        return ALL_UNLOCKED
+    if isinstance(unlocked_achievements, int):
+        return unlocked_achievements
+    mask = 0
+    for achievement_id in unlocked_achievements:
+        mask |= 1 << achievement_id
+    return mask
+
+
+class WeightTable:
+    """The items a bag can produce for one quality band and pool weighting, as a cumulative weight table."""
+
+    def __init__(self, weights: Dict[int, int]):
+        self.item_ids = sorted(item_id for item_id in weights if weights[item_id] > 0)
+        self.weights = [weights[item_id] for item_id in self.item_ids]
+        self.cumulative_weights = list(itertools.accumulate(self.weights))
+        self.all_weight = self.cumulative_weights[-1] if self.cumulative_weights else 0
+
+    def draw(self, seed: int) -> Optional[int]:
+        # Number between 0 and total weight of all possible results
+        remains = float(seed) * 2.3283062e-10 * self.all_weight
+        if remains >= self.all_weight:
+            return None
+        # Find the first item in the list with a greater weight than the random number
+        return self.item_ids[bisect.bisect_right(self.cumulative_weights, remains)]
+
+
+def get_flags_key(flags: Optional[Dict[str, bool]] = None) -> Tuple[str, ...]:
+    """Reduce a flag dictionary (defaulting to the global config) to a hashable key of the enabled flags."""
+    if flags is None:
+        flags = config
+    return tuple(sorted(flag for flag, enabled in flags.items() if enabled))
+
+
+# 1.7.9 adds a new function to the game that checks if an item is available in the current pool.
+# This takes into whether the player is in Greed Mode, whether the player has The Lost's Birthright, etc.
+# and skips over items which are unavailable based on these conditions.
+def is_item_available(
+    item: ItemListEntry, weight: bool, flags: Optional[Dict[str, bool]] = None
+) -> bool:
+    if flags is None:
+        flags = config
+
+    if weight:
+        if flags.get("is_daily_run") and item.has_tag("nodaily"):
+            return False
+        if flags.get("is_greed_mode") and item.has_tag("nogreed"):
+            return False
+        if flags.get("is_in_challenge") and item.has_tag("nochallenge"):
+            return False
+        if flags.get("has_lost_birthright") and item.has_tag("nolostbr"):
+            return False
+    else:
+        if flags.get("is_keeper") and item.has_tag("nokeeper"):
+            return False
+        if flags.get("is_tlost") and not item.has_tag("offensive"):
+            return False
+        # TODO: Tainted Lost has 20% reroll chance on Quality 2 or less
+        if flags.get("has_sacred_orb") and item.quality <= 1:
+            return False
+        # TODO: Sacred Orb has 33% reroll chance on Quality 2
+        if flags.get("has_trinket_no") and item.is_active:
+            return False
+
+    return True
+
+
+def get_quality_band(quality_ranges: List[Tuple[int, int, int]], score: int) -> int:
+    """Index into the quality ranges used for a given score (scores below zero use the lowest band)."""
+    for band in range(len(quality_ranges) - 1, 0, -1):
+        if score >= quality_ranges[band][0]:
+            return band
+    return 0
+
+
+def get_pool_weights(pickup_count: List[int]) -> Tuple[Tuple[int, int], ...]:
+    return (
+        (0, 1),
+        (1, 2),
+        (2, 2),
+        (3, pickup_count[3] * 10),
+        (4, pickup_count[4] * 10),
+        (5, pickup_count[6] * 5),
+        (7, pickup_count[29] * 10),
+        (8, pickup_count[5] * 10),
+        (9, pickup_count[25] * 10),
+        (12, pickup_count[7] * 10),
+        (
+            26,
+            pickup_count[23] * 10
+            if (
+                pickup_count[15] + pickup_count[12] + pickup_count[8] + pickup_count[1]
+                == 0
+            )
+            else 0,
+        ),
+    )
+
+
+class DenseWeightTable:
+    """
+    Draws the same items as the `WeightTable` with the same pool weights, but keeps a cumulative weight for every
+    item in ID order, including those without weight. Cumulative weights for each pool can be summed into one
+    without sorting or merging item lists, which makes these quicker to build for tables which are only drawn from
+    a few times.
+    """
+
+    def __init__(self, item_order: List[int], cumulative_weights: List[int]):
+        self.item_order = item_order
+        self.cumulative_weights = cumulative_weights
+        self.all_weight = cumulative_weights[-1] if cumulative_weights else 0
+
+    def draw(self, seed: int) -> Optional[int]:
+        remains = float(seed) * 2.3283062e-10 * self.all_weight
+        if remains >= self.all_weight:
+            return None
+        # The first item with a greater cumulative weight than the random number always has a weight.
+        return self.item_order[bisect.bisect_right(self.cumulative_weights, remains)]
+
+
+class CraftingContext:
+    """
+    Everything needed to evaluate recipes for one game version and set of flags.
+    Game data is loaded once, and weight tables are cached, so a context can be shared between many lookups.
+    """
+
+    def __init__(
+        self, platform: str, game_version: str, flags: Optional[Dict[str, bool]] = None
+    ):
+        self.platform = platform
+        self.game_version = game_version
+        self.flags = {flag: flag in get_flags_key(flags) for flag in config}
+        self.items = ItemListEntry.load_item_list(platform, game_version)
+        self.item_pools = ItemPool.load_item_pools(platform, game_version)
+        self.hardcoded_recipes = HardcodedRecipe.load_hardcoded_recipes(
+            platform, game_version
+        )
+        self.hardcoded_recipe_requires_unlock = hardcoded_recipe_requires_unlock(
+            platform, game_version
+        )
+        self.quality_ranges = get_quality_ranges(platform, game_version)
+        self.weight_available = {
+            item_id: is_item_available(item, True, self.flags)
+            for item_id, item in self.items.items()
+        }
+        self.generate_available = {
+            item_id: is_item_available(item, False, self.flags)
+            for item_id, item in self.items.items()
+        }
+        # The bit each item's achievement sets in an unlocked-achievement bitmask, or 0 if it has no achievement.
+        self.achievement_bits = {
+            item_id: 0 if item.achievement_id is None else 1 << item.achievement_id
+            for item_id, item in self.items.items()
+        }
+        self.weight_tables: Dict[tuple, WeightTable] = {}
+        # Every item in ID order, and each pool's cumulative weights over them by quality band and pool weight,
+        # for `DenseWeightTable`.
+        self.item_order = sorted(self.items)
+        self.band_weights: Dict[Tuple[int, int, int], List[int]] = {}
+        self.distributions: Dict[tuple, Dict[int, float]] = {}
+
+    @staticmethod
+    def get(
+        platform: str, game_version: str, flags: Optional[Dict[str, bool]] = None
+    ) -> "CraftingContext":
+        return CraftingContext.load(platform, game_version, get_flags_key(flags))
+
+    @staticmethod
+    @lru_cache()
+    def load(
+        platform: str, game_version: str, flags_key: Tuple[str, ...]
+    ) -> "CraftingContext":
+        return CraftingContext(
+            platform, game_version, {flag: True for flag in flags_key}
+        )
+
+    @property
+    def flags_key(self) -> Tuple[str, ...]:
+        return get_flags_key(self.flags)
+
+    def count_pickups(self, pickup_array: Sequence[int]) -> Tuple[List[int], int]:
+        pickup_count = [0] * len(PICKUP_LIST)
+        quality_sum = 0
+        for pickup_id in pickup_array:
+            pickup_count[pickup_id] += 1
+            quality_sum += PICKUP_LIST[pickup_id].quality
+        return pickup_count, quality_sum
+
+    def get_table_key(self, pickup_count: List[int], quality_sum: int) -> tuple:
+        return (
+            get_quality_band(self.quality_ranges, quality_sum),
+            get_quality_band(self.quality_ranges, quality_sum - 5),
+            get_pool_weights(pickup_count),
+        )
+
+    def get_weight_table(self, table_key: tuple) -> WeightTable:
+        weight_table = self.weight_tables.get(table_key)
+        if weight_table is None:
+            weight_table = self.build_weight_table(table_key)
+            self.weight_tables[table_key] = weight_table
+        return weight_table
+
+    def build_weight_table(self, table_key: tuple) -> WeightTable:
+        band, lowered_band, pool_weights = table_key
+        weights = {}
+        for pool_id, pool_weight in pool_weights:
+            if pool_weight <= 0:
+                continue
+
+            item_pool = self.item_pools[pool_id]
+            _, quality_min, quality_max = self.quality_ranges[
+                lowered_band if item_pool.lowered_quality else band
+            ]
+
+            # We only add the items to the list if they are in the quality range
+            for quality in range(quality_min, quality_max + 1):
+                for item_id, item_weight in item_pool.quality_lists[quality]:
+                    # Some items are skipped in the WEIGHTING step.
+                    if self.weight_available[item_id]:
+                        weights[item_id] = (
+                            weights.get(item_id, 0) + pool_weight * item_weight
+                        )
+
+        return WeightTable(weights)
+
+    def get_cumulative_weights(
+        self, band: int, lowered_band: int, pool_weights: Tuple[Tuple[int, int], ...]
+    ) -> List[int]:
+        """
+        The cumulative weight up to each item in `item_order` of the weight table for a quality band and pool
+        weights, for a `DenseWeightTable`. Pools can be left out and added later by summing.
+        """
+        cumulative_weights = None
+        for pool_id, pool_weight in pool_weights:
+            if pool_weight <= 0:
+                continue
+            pool_cumulative_weights = self.get_band_cumulative_weights(
+                pool_id,
+                lowered_band if self.item_pools[pool_id].lowered_quality else band,
+                pool_weight,
+            )
+            if cumulative_weights is None:
+                cumulative_weights = pool_cumulative_weights
+            else:
+                cumulative_weights = list(
+                    map(operator.add, cumulative_weights, pool_cumulative_weights)
+                )
+        if cumulative_weights is None:
+            return [0] * len(self.item_order)
+        return cumulative_weights
+
+    def get_band_cumulative_weights(
+        self, pool_id: int, band: int, pool_weight: int
+    ) -> List[int]:
+        """
+        The cumulative weight a pool adds to weight tables in a quality band, up to each item in `item_order`.
+        These are cached, so they mustn't be modified.
+        """
+        cumulative_weights = self.band_weights.get((pool_id, band, pool_weight))
+        if cumulative_weights is None:
+            item_pool = self.item_pools[pool_id]
+            _, quality_min, quality_max = self.quality_ranges[band]
+            weights = dict.fromkeys(self.item_order, 0)
+            # We only add the items to the list if they are in the quality range
+            for quality in range(quality_min, quality_max + 1):
+                for item_id, item_weight in item_pool.quality_lists[quality]:
+                    # Some items are skipped in the WEIGHTING step.
+                    if self.weight_available[item_id]:
+                        weights[item_id] += pool_weight * item_weight
+            cumulative_weights = list(itertools.accumulate(weights.values()))
+            self.band_weights[(pool_id, band, pool_weight)] = cumulative_weights
+        return cumulative_weights
+
+    def get_pickup_seed(self, pickup_count: List[int], seed: int) -> int:
+        current_seed = seed
+        for pickup_id in range(len(pickup_count)):
+            for _ in range(pickup_count[pickup_id]):
+                current_seed = rng_next(current_seed, pickup_id)
+        return current_seed
+
+    def find_hardcoded_recipe(
+        self, pickup_array: Sequence[int]
+    ) -> Optional[HardcodedRecipe]:
+        return self.hardcoded_recipes.get(
+            HardcodedRecipe.convert_pickup_list_to_int64(pickup_array)
+        )
+
+    def get_result(self, pickup_array: Sequence[int], seed: int) -> CraftResult:
+        candidates = []
+        pickup_count, quality_sum = self.count_pickups(pickup_array)
+
+        hardcoded_recipe = self.find_hardcoded_recipe(pickup_array)
+        if hardcoded_recipe:
+            # v1.7.8 requires that hardcoded items are now unlocked. If there's an achievement id, search for more candidates
+            if self.hardcoded_recipe_requires_unlock:
+                candidates.append(hardcoded_recipe.item_id)
+            else:
+                return CraftResult(
+                    pickup_array, [hardcoded_recipe.item_id], quality_sum
+                )
+
+        weight_table = self.get_weight_table(
+            self.get_table_key(pickup_count, quality_sum)
+        )
+
+        # With at most one item to draw, every draw is the same, so the seed doesn't matter.
+        if len(weight_table.item_ids) <= 1:
+            for item_id in weight_table.item_ids:
+                if self.generate_available[item_id]:
+                    if self.items[item_id].achievement_id is None:
+                        candidates.append(item_id)
+                        return CraftResult(pickup_array, candidates, quality_sum)
+                    candidates.extend([item_id] * 20)
+            candidates.append(BREAKFAST_ITEM_ID)
+            return CraftResult(pickup_array, candidates, quality_sum)
+
+        current_seed = self.get_pickup_seed(pickup_count, seed)
+
+        for _ in range(20):
+            # Increment the RNG seed
+            current_seed = rng_next(current_seed, 6)
+            selected_item_id = weight_table.draw(current_seed)
+            if selected_item_id is None:
+                break
+
+            # Some items are skipped in the GENERATING step.
+            if not self.generate_available[selected_item_id]:
+                continue
+
+            # Add the item to the list.
+            candidates.append(selected_item_id)
+
+            # If the item is not available in the current pool, or is tied to an achievement that isn't unlocked, Bag of Crafting will skip it.
+            # So if the item is tied to an achievement, we have to continue finding matches until we find one that isn't.
+            if self.items[selected_item_id].achievement_id is None:
+                # This item is not tied to an achievement, so we can stop here.
+                return CraftResult(pickup_array, candidates, quality_sum)
+
+        # return breakfast if above fails
+        candidates.append(BREAKFAST_ITEM_ID)
+        return CraftResult(pickup_array, candidates, quality_sum)
+
+    def get_item(
+        self, pickup_array: Sequence[int], seed: int, unlocked_mask: int = ALL_UNLOCKED
+    ) -> CraftedItem:
+        """
+        Like `get_result`, but only returns the item the player gets with the achievements in `unlocked_mask` unlocked
+        (see `get_unlocked_mask`), skipping over locked candidates as they are drawn.
+        """
+        pickup_count, quality_sum = self.count_pickups(pickup_array)
+        return self.get_item_from_counts(
+            pickup_array, pickup_count, quality_sum, seed, unlocked_mask
+        )
+
+    def get_item_from_counts(
+        self,
+        pickup_array: Sequence[int],
+        pickup_count: List[int],
+        quality_sum: int,
+        seed: int,
+        unlocked_mask: int = ALL_UNLOCKED,
+    ) -> CraftedItem:
+        """`get_item` for callers which already keep track of the pickup counts and quality sum."""
+        hardcoded_recipe = self.find_hardcoded_recipe(pickup_array)
+        if hardcoded_recipe:
+            item_id = self.get_hardcoded_item(hardcoded_recipe, unlocked_mask)
+            if item_id is not None:
+                return CraftedItem(pickup_array, item_id, quality_sum)
+
+        weight_table = self.get_weight_table(
+            self.get_table_key(pickup_count, quality_sum)
+        )
+        if len(weight_table.item_ids) <= 1:
+            return CraftedItem(
+                pickup_array,
+                self.get_table_fixed_item(weight_table, unlocked_mask),
+                quality_sum,
+            )
+
+        item_id = self.draw_item(
+            weight_table, self.get_pickup_seed(pickup_count, seed), unlocked_mask
+        )
+        return CraftedItem(pickup_array, item_id, quality_sum)
+
+    def get_hardcoded_item(
+        self, hardcoded_recipe: HardcodedRecipe, unlocked_mask: int = ALL_UNLOCKED
+    ) -> Optional[int]:
+        """The item a hardcoded recipe crafts, or None if its item is locked and the bag draws from the weight table instead."""
+        achievement_bit = self.achievement_bits[hardcoded_recipe.item_id]
+        if (
+            not self.hardcoded_recipe_requires_unlock
+            or not achievement_bit
+            or unlocked_mask & achievement_bit
+        ):
+            return hardcoded_recipe.item_id
+        return None
+
+    def draw_item(
+        self,
+        weight_table: Union[WeightTable, DenseWeightTable],
+        current_seed: int,
+        unlocked_mask: int = ALL_UNLOCKED,
+    ) -> int:
+        """Draw from the weight table, starting from the seed after the pickups have been added, until an item is kept."""
+        generate_available = self.generate_available
+        achievement_bits = self.achievement_bits
+
+        for _ in range(20):
+            current_seed = rng_next(current_seed, 6)
+            selected_item_id = weight_table.draw(current_seed)
+            if selected_item_id is None:
+                break
+            if not generate_available[selected_item_id]:
+                continue
+            achievement_bit = achievement_bits[selected_item_id]
+            if not achievement_bit or unlocked_mask & achievement_bit:
+                return selected_item_id
+
+        return BREAKFAST_ITEM_ID
+
+    def get_table_fixed_item(
+        self, weight_table: WeightTable, unlocked_mask: int = ALL_UNLOCKED
+    ) -> Optional[int]:
+        """The item every draw from the weight table ends in, or None if it depends on the seed."""
+        if not weight_table.item_ids:
+            return BREAKFAST_ITEM_ID
+        if len(weight_table.item_ids) > 1:
+            return None
+        item_id = weight_table.item_ids[0]
+        achievement_bit = self.achievement_bits[item_id]
+        if self.generate_available[item_id] and (
+            not achievement_bit or unlocked_mask & achievement_bit
+        ):
+            return item_id
+        # The only item is always rerolled, so every draw fails.
+        return BREAKFAST_ITEM_ID
+
+    def get_fixed_item(
+        self, pickup_array: Sequence[int], unlocked_mask: int = ALL_UNLOCKED
+    ) -> Optional[int]:
+        """
+        The item a recipe crafts on every seed, or None if it depends on the seed. This is true of hardcoded recipes
+        (unless their item is locked), and of recipes whose weight table has at most one item.
+        """
+        hardcoded_recipe = self.find_hardcoded_recipe(pickup_array)
+        if (
+            hardcoded_recipe
+            and self.get_hardcoded_item(hardcoded_recipe, unlocked_mask) is not None
+        ):
+            return hardcoded_recipe.item_id
+
+        pickup_count, quality_sum = self.count_pickups(pickup_array)
+        return self.get_table_fixed_item(
+            self.get_weight_table(self.get_table_key(pickup_count, quality_sum)),
+            unlocked_mask,
+        )
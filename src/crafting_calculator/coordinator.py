@@ -0,0 +1,335 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from .archive import ARCHIVE_MAGIC, OutcomeArchive
+from .output import ResultWriter
+from .store import RecipeStore
+
+
+SHARD_PLACEHOLDER = "{shard}"
+OUTPUT_PLACEHOLDER = "{output}"
+
+# Seconds a claim is held without a heartbeat before another node may take the shard over.
+DEFAULT_LEASE = 900
+# Claims are renewed every quarter of the lease, so shorter leases would have nodes doing little else.
+MIN_LEASE = 1
+
+SQLITE_MAGIC = b"SQLite format 3\0"
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def get_worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ShardCoordinator:
+    """
+    Runs a command as a number of shards, claimed and run by any number of nodes which share a directory (e.g. over
+    NFS), without any other service. The directory holds:
+
+    - `job.json`: the command, as arguments to `calculate_bag` with `{shard}` (and optionally `{output}`) in them,
+      and the number of shards.
+    - `claims/I.K`: the K-th claim on shard I. Claims are created exclusively, so only one node gets each one, and
+      the node running the shard keeps touching it. Once a claim hasn't been touched for the lease, another node
+      may take the shard over by making the next claim.
+    - `outputs/I`: shard I's output (what it wrote to `{output}`, or to stdout), moved into place once it's done,
+      and `outputs/I.json`, which records how it was made.
+
+    Times are compared with the shared directory's clock, so nodes' clocks don't have to agree.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "job.json")) as f:
+            self.job = json.load(f)
+        self.argv: List[str] = self.job["argv"]
+        self.shard_count: int = self.job["shards"]
+
+    @staticmethod
+    def create(directory: str, argv: List[str], shard_count: int) -> "ShardCoordinator":
+        if shard_count < 1:
+            raise ValueError("There must be at least one shard.")
+        if not any(SHARD_PLACEHOLDER in arg for arg in argv):
+            raise ValueError(f"The command must pass {SHARD_PLACEHOLDER} to --shard.")
+        for subdirectory in ["claims", "outputs"]:
+            os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+        try:
+            with open(os.path.join(directory, "job.json"), "x") as f:
+                json.dump({"argv": argv, "shards": shard_count}, f)
+        except FileExistsError:
+            raise ValueError(f"{directory} already has a job.")
+        return ShardCoordinator(directory)
+
+    def get_output_path(self, index: int) -> str:
+        return os.path.join(self.directory, "outputs", str(index))
+
+    def get_manifest_path(self, index: int) -> str:
+        return self.get_output_path(index) + ".json"
+
+    def is_done(self, index: int) -> bool:
+        return os.path.exists(self.get_manifest_path(index))
+
+    def get_shared_time(self) -> float:
+        """The current time by the shared directory's clock."""
+        path = os.path.join(self.directory, "clock")
+        with open(path, "a"):
+            os.utime(path)
+        return os.stat(path).st_mtime
+
+    def get_claims(self) -> Dict[int, Tuple[int, str]]:
+        """The latest claim on each shard, as its number and path."""
+        claims = {}
+        for name in os.listdir(os.path.join(self.directory, "claims")):
+            index, _, attempt = name.partition(".")
+            if not (index.isdigit() and attempt.isdigit()):
+                continue
+            if int(index) not in claims or int(attempt) > claims[int(index)][0]:
+                claims[int(index)] = (
+                    int(attempt),
+                    os.path.join(self.directory, "claims", name),
+                )
+        return claims
+
+    def claim(
+        self, worker: str, lease: float = DEFAULT_LEASE, skip: Set[int] = frozenset()
+    ) -> Optional[Tuple[int, str]]:
+        """
+        Claim the first shard which isn't done and isn't held by a live claim, returning its index and claim path,
+        or None if there isn't one.
+        """
+        claims = self.get_claims()
+        now = self.get_shared_time()
+        for index in range(self.shard_count):
+            if index in skip or self.is_done(index):
+                continue
+            attempt = 0
+            if index in claims:
+                attempt, path = claims[index]
+                try:
+                    if now - os.stat(path).st_mtime < lease:
+                        continue
+                except FileNotFoundError:
+                    # The claim was released after a failure, so its number can be used again.
+                    attempt -= 1
+                attempt += 1
+            path = os.path.join(self.directory, "claims", f"{index}.{attempt}")
+            try:
+                with open(path, "x") as f:
+                    f.write(worker)
+            except FileExistsError:
+                # Another node got there first.
+                continue
+            return index, path
+        return None
+
+    def run_shard(
+        self, index: int, claim_path: str, worker: str, lease: float = DEFAULT_LEASE
+    ) -> bool:
+        """Run a claimed shard, touching its claim until it's done. Returns whether it succeeded."""
+        output_path = self.get_output_path(index)
+        temp_path = f"{output_path}.{worker}.tmp"
+        argv = [
+            arg.replace(SHARD_PLACEHOLDER, f"{index}/{self.shard_count}").replace(
+                OUTPUT_PLACEHOLDER, temp_path
+            )
+            for arg in self.argv
+        ]
+        writes_output = any(OUTPUT_PLACEHOLDER in arg for arg in self.argv)
+        start_time = time.monotonic()
+        with open(
+            f"{output_path}.{worker}.log" if writes_output else temp_path, "wb"
+        ) as stdout:
+            process = subprocess.Popen(
+                [sys.executable, "-m", "crafting_calculator", *argv], stdout=stdout
+            )
+            while True:
+                try:
+                    returncode = process.wait(timeout=lease / 4)
+                    break
+                except subprocess.TimeoutExpired:
+                    os.utime(claim_path)
+        if returncode != 0:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            os.remove(claim_path)
+            return False
+        os.replace(temp_path, output_path)
+        manifest = {
+            "shard": index,
+            "shards": self.shard_count,
+            "argv": self.argv,
+            "worker": worker,
+            "elapsed": round(time.monotonic() - start_time, 3),
+        }
+        write_json_atomic(self.get_manifest_path(index), manifest)
+        return True
+
+    def get_status(self, lease: float = DEFAULT_LEASE) -> Dict[str, int]:
+        claims = self.get_claims()
+        now = self.get_shared_time()
+        done = running = 0
+        for index in range(self.shard_count):
+            if self.is_done(index):
+                done += 1
+            elif (
+                index in claims
+                and os.path.exists(claims[index][1])
+                and now - os.stat(claims[index][1]).st_mtime < lease
+            ):
+                running += 1
+        return {
+            "shards": self.shard_count,
+            "done": done,
+            "running": running,
+            "pending": self.shard_count - done - running,
+        }
+
+
+def run_worker(
+    directory: str,
+    worker: Optional[str] = None,
+    lease: float = DEFAULT_LEASE,
+    log: Callable[[str], None] = print,
+) -> int:
+    """Claim and run shards until none are left. Returns the number this worker finished."""
+    if lease < MIN_LEASE:
+        raise ValueError(f"The lease must be at least {MIN_LEASE} second.")
+    coordinator = ShardCoordinator(directory)
+    worker = worker or get_worker_name()
+    # Shards which failed here are left for other nodes, rather than tried again straight away.
+    failed = set()
+    finished = 0
+    while True:
+        claim = coordinator.claim(worker, lease, failed)
+        if claim is None:
+            return finished
+        index, claim_path = claim
+        log(f"Running shard {index}/{coordinator.shard_count}...")
+        if coordinator.run_shard(index, claim_path, worker, lease):
+            finished += 1
+            log(f"Finished shard {index}/{coordinator.shard_count}.")
+        else:
+            failed.add(index)
+            log(f"Shard {index}/{coordinator.shard_count} failed.")
+
+
+def get_merge_mode(argv: List[str]) -> str:
+    """How the records written by each shard of a search are combined."""
+    if "--find-pickup-recipes" in argv:
+        # Each item's first recipe, which is in the earliest shard which found it.
+        return "first"
+    if "--find-uncraftable-items" in argv:
+        # Items no shard could craft.
+        return "intersect"
+    return "concat"
+
+
+def read_records(path: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """The records in a shard's json or ndjson output, and which of the two it is."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return "json", json.loads(text)
+    try:
+        return "ndjson", [
+            json.loads(line) for line in text.splitlines() if line.strip()
+        ]
+    except ValueError:
+        raise ValueError(
+            f"{path} isn't json or ndjson. Shard searches with --format json or ndjson to merge them."
+        )
+
+
+def merge_records(paths: List[str], mode: str) -> Tuple[str, Iterator[Dict[str, Any]]]:
+    shard_records = [read_records(path) for path in paths]
+    output_format = shard_records[0][0] if shard_records else "ndjson"
+    records = [record for _, records in shard_records for record in records]
+    if mode == "first":
+        seen = set()
+        records = [
+            record
+            for record in records
+            if not (record["item_id"] in seen or seen.add(record["item_id"]))
+        ]
+    elif mode == "intersect":
+        item_sets = [
+            {record["item_id"] for record in records} for _, records in shard_records
+        ]
+        common = set.intersection(*item_sets) if item_sets else set()
+        records = (
+            [record for record in shard_records[0][1] if record["item_id"] in common]
+            if shard_records
+            else []
+        )
+    return output_format, iter(records)
+
+
+def merge_shards(directory: str, output: str) -> int:
+    """
+    Combine every shard's output into one: stores and archives are merged into `output` (which may already exist),
+    and search results are written to it in shard order. Fails unless every shard is done, and was made by the
+    job's command. Returns the number of shards.
+    """
+    coordinator = ShardCoordinator(directory)
+    missing = [
+        index
+        for index in range(coordinator.shard_count)
+        if not coordinator.is_done(index)
+    ]
+    if missing:
+        raise ValueError(
+            f"{len(missing)} of {coordinator.shard_count} shards aren't done: {', '.join(map(str, missing))}."
+        )
+    paths = []
+    for index in range(coordinator.shard_count):
+        with open(coordinator.get_manifest_path(index)) as f:
+            manifest = json.load(f)
+        if (
+            manifest["argv"] != coordinator.argv
+            or manifest["shards"] != coordinator.shard_count
+            or manifest["shard"] != index
+        ):
+            raise ValueError(f"Shard {index}'s output was made by a different job.")
+        paths.append(coordinator.get_output_path(index))
+
+    kinds = set()
+    for path in paths:
+        with open(path, "rb") as f:
+            header = f.read(len(SQLITE_MAGIC))
+        kinds.add(
+            "store"
+            if header == SQLITE_MAGIC
+            else "archive"
+            if header.startswith(ARCHIVE_MAGIC)
+            else "records"
+        )
+    if len(kinds) > 1:
+        raise ValueError("The shards' outputs aren't all the same kind.")
+
+    kind = kinds.pop() if kinds else "records"
+    if kind == "store":
+        with RecipeStore(output) as store:
+            for path in paths:
+                store.merge(path)
+    elif kind == "archive":
+        with OutcomeArchive(output, writable=True) as archive:
+            for path in paths:
+                archive.merge(path)
+    else:
+        output_format, records = merge_records(paths, get_merge_mode(coordinator.argv))
+        with open(output, "w", encoding="utf-8") as f, ResultWriter(
+            output_format, f
+        ) as writer:
+            for record in records:
+                writer.write(record)
+    return len(paths)
@@ -0,0 +1,162 @@
+from collections import defaultdict
+from typing import Dict, Iterator, List, Tuple
+
+from .context import get_pool_weights, get_quality_band
+from .isaac_pickups import PICKUP_LIST
+from .multisets import RECIPE_SIZE
+from .predicates import POOL_26_GUARD_PICKUPS, POOL_PICKUPS
+
+
+# Multiset counts are worked out with generating functions: each pickup contributes the polynomial
+# 1 + x*y^q + x^2*y^2q + ... (up to its limit), where x counts pickups and y sums qualities, and the coefficient
+# of x^8*y^s in the product is the number of recipes with quality sum s. Polynomials are stored as nested dicts.
+
+
+def multiply_pickup(
+    ways: List[Dict], limit: int, quality: int, size: int, key=None
+) -> List[Dict]:
+    """Multiply the polynomials in `ways` (indexed by pickup count) by one pickup's polynomial."""
+    result = [defaultdict(int) for _ in range(size + 1)]
+    for n in range(size + 1):
+        for state, count in ways[n].items():
+            for copies in range(min(limit, size - n) + 1):
+                new_state = (
+                    (state[0] + copies * quality,) + state[1:]
+                    if key is None
+                    else key(state, copies)
+                )
+                result[n + copies][new_state] += count
+    return result
+
+
+def count_by_quality_sum(
+    limits: Dict[int, int], size: int = RECIPE_SIZE
+) -> Dict[int, int]:
+    """The number of recipes using at most `limits[pickup_id]` of each pickup, by quality sum."""
+    ways = [defaultdict(int) for _ in range(size + 1)]
+    ways[0][(0,)] = 1
+    for pickup_id, limit in limits.items():
+        ways = multiply_pickup(ways, limit, PICKUP_LIST[pickup_id].quality, size)
+    return {quality_sum: count for (quality_sum,), count in sorted(ways[size].items())}
+
+
+def count_by_quality_band(
+    quality_ranges: List[Tuple[int, int, int]],
+    limits: Dict[int, int],
+    size: int = RECIPE_SIZE,
+) -> List[int]:
+    """The number of recipes which fall into each quality band."""
+    counts = [0] * len(quality_ranges)
+    for quality_sum, count in count_by_quality_sum(limits, size).items():
+        counts[get_quality_band(quality_ranges, quality_sum)] += count
+    return counts
+
+
+def get_pool_polynomials(
+    limits: Dict[int, int], size: int = RECIPE_SIZE
+) -> Tuple[List[int], List[Dict], List[Dict]]:
+    """
+    Split the recipes into the pickups which give pools weight, by pickup count then (quality sum, exact counts),
+    and the rest, by pickup count then (quality sum, whether any of them stops pool 26 from having weight).
+    """
+    pool_pickups = sorted(
+        pickup_id for pickup_id in set(POOL_PICKUPS.values()) if pickup_id in limits
+    )
+
+    # Other pickups, by count, then (quality sum, has a guard pickup).
+    rest = [defaultdict(int) for _ in range(size + 1)]
+    rest[0][(0, False)] = 1
+    for pickup_id, limit in limits.items():
+        if pickup_id in pool_pickups:
+            continue
+        quality = PICKUP_LIST[pickup_id].quality
+        is_guard = pickup_id in POOL_26_GUARD_PICKUPS
+        rest = multiply_pickup(
+            rest,
+            limit,
+            quality,
+            size,
+            lambda state, copies: (
+                state[0] + copies * quality,
+                state[1] or (is_guard and copies > 0),
+            ),
+        )
+
+    # Pool pickups, by count, then their exact counts.
+    pools = [defaultdict(int) for _ in range(size + 1)]
+    pools[0][(0, ())] = 1
+    for pickup_id in pool_pickups:
+        quality = PICKUP_LIST[pickup_id].quality
+        pools = multiply_pickup(
+            pools,
+            limits[pickup_id],
+            quality,
+            size,
+            lambda state, copies: (state[0] + copies * quality, state[1] + (copies,)),
+        )
+
+    return pool_pickups, pools, rest
+
+
+def iter_table_key_counts(
+    quality_ranges: List[Tuple[int, int, int]],
+    limits: Dict[int, int],
+    size: int = RECIPE_SIZE,
+) -> Iterator[Tuple[tuple, Tuple[Tuple[int, int], ...], bool, int, int]]:
+    """
+    Yield `(table key, pool pickup counts, has a guard pickup, quality sum, number of recipes)` for every combination
+    of exact pool pickup counts, guard pickups and quality sum which some recipe has.
+
+    Only the pickups which give pools weight need their exact counts; the rest are summarised by their
+    quality sum and whether any of them stops pool 26 from having weight.
+    """
+    pool_pickups, pools, rest = get_pool_polynomials(limits, size)
+
+    bands = {}
+    for n in range(size + 1):
+        for (pool_quality_sum, pool_counts), pool_ways in pools[n].items():
+            pickup_count = [0] * len(PICKUP_LIST)
+            for pickup_id, copies in zip(pool_pickups, pool_counts):
+                pickup_count[pickup_id] = copies
+            signature = get_pool_weights(pickup_count)
+            # Any guard pickup has the same effect, so the first one stands in for all of them.
+            pickup_count[POOL_26_GUARD_PICKUPS[0]] += 1
+            guarded_signature = get_pool_weights(pickup_count)
+            pool_pickup_counts = tuple(zip(pool_pickups, pool_counts))
+
+            for (rest_quality_sum, has_guard), rest_ways in rest[size - n].items():
+                quality_sum = pool_quality_sum + rest_quality_sum
+                if quality_sum not in bands:
+                    bands[quality_sum] = (
+                        get_quality_band(quality_ranges, quality_sum),
+                        get_quality_band(quality_ranges, quality_sum - 5),
+                    )
+                band, lowered_band = bands[quality_sum]
+                table_key = (
+                    band,
+                    lowered_band,
+                    guarded_signature if has_guard else signature,
+                )
+                yield table_key, pool_pickup_counts, has_guard, quality_sum, pool_ways * rest_ways
+
+
+def count_by_table_key(
+    quality_ranges: List[Tuple[int, int, int]],
+    limits: Dict[int, int],
+    size: int = RECIPE_SIZE,
+) -> Dict[tuple, int]:
+    """The number of recipes which share each weight table, keyed like `CraftingContext.get_table_key`."""
+    counts = defaultdict(int)
+    for table_key, _, _, _, count in iter_table_key_counts(
+        quality_ranges, limits, size
+    ):
+        counts[table_key] += count
+    return dict(counts)
+
+
+def count_by_pool_signature(table_counts: Dict[tuple, int]) -> Dict[tuple, int]:
+    """The number of recipes with each pool weighting, from `count_by_table_key`."""
+    counts = defaultdict(int)
+    for (_, _, pool_weights), count in table_counts.items():
+        counts[pool_weights] += count
+    return dict(counts)
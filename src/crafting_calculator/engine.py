@@ -0,0 +1,185 @@
+import itertools
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .context import ALL_UNLOCKED, CraftedItem, CraftingContext
+
+
+DEFAULT_CHUNK_SIZE = 2048
+
+# How many recipes are evaluated between calls to a search's progress callback.
+DEFAULT_PROGRESS_INTERVAL = 4096
+
+
+class SearchStats:
+    """
+    How far a search got, and why it stopped if it stopped early. With a `progress_callback`, it's called with the
+    stats every `progress_interval` recipes; anything it raises stops the search.
+    """
+
+    def __init__(
+        self,
+        progress_callback: Optional[Callable[["SearchStats"], None]] = None,
+        progress_interval: int = DEFAULT_PROGRESS_INTERVAL,
+    ):
+        self.total = None
+        self.evaluated = 0
+        self.stop_reason = None
+        self.start_time = None
+        self.end_time = None
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.next_progress = progress_interval
+
+    def start(self, total: Optional[int] = None) -> None:
+        self.total = total
+        self.start_time = time.monotonic()
+
+    def stop(self, reason: Optional[str] = None) -> None:
+        self.stop_reason = reason
+        self.end_time = time.monotonic()
+
+    def advance(self) -> None:
+        """Count one more evaluated recipe."""
+        self.evaluated += 1
+        if self.evaluated >= self.next_progress and self.progress_callback is not None:
+            self.next_progress += self.progress_interval
+            self.progress_callback(self)
+
+    @property
+    def rate(self) -> float:
+        """Recipes evaluated per second."""
+        elapsed = self.elapsed
+        return self.evaluated / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds until every recipe has been evaluated at the current rate, if that can be estimated."""
+        if self.total is None or self.rate <= 0:
+            return None
+        return max(0, self.total - self.evaluated) / self.rate
+
+    @property
+    def stopped_early(self) -> bool:
+        return self.stop_reason is not None
+
+    @property
+    def elapsed(self) -> float:
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    def __str__(self) -> str:
+        total = "?" if self.total is None else self.total
+        output = (
+            f"Evaluated {self.evaluated} of {total} recipes in {self.elapsed:.2f} s"
+        )
+        if self.stopped_early:
+            output += f" (stopped early: {self.stop_reason})"
+        return output + "."
+
+
+def iter_chunks(
+    iterable: Iterable[Any], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[List[Any]]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_max_pending(executor: Executor) -> int:
+    # Keep every worker busy with one chunk queued behind it, without submitting the whole input up front.
+    return 2 * (getattr(executor, "_max_workers", None) or os.cpu_count() or 1)
+
+
+def map_ordered(
+    fn: Callable[..., Any],
+    args_iterable: Iterable[Tuple[Any, ...]],
+    executor: Optional[Executor] = None,
+    max_pending: Optional[int] = None,
+) -> Iterator[Any]:
+    """
+    Like `Executor.map`, but only keeps `max_pending` tasks in flight so memory stays bounded for huge inputs.
+    Results are yielded in submission order. Closing the generator cancels any tasks which haven't started.
+    """
+    owns_executor = executor is None
+    if owns_executor:
+        executor = ProcessPoolExecutor()
+    if max_pending is None:
+        max_pending = get_max_pending(executor)
+
+    pending = deque()
+    try:
+        for args in args_iterable:
+            pending.append(executor.submit(fn, *args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if owns_executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def evaluate_recipes(
+    platform: str,
+    game_version: str,
+    flags_key: Tuple[str, ...],
+    seed: int,
+    recipes: List[Sequence[int]],
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> List[CraftedItem]:
+    context = CraftingContext.load(platform, game_version, flags_key)
+    return [context.get_item(recipe, seed, unlocked_mask) for recipe in recipes]
+
+
+def evaluate_requests(
+    platform: str,
+    game_version: str,
+    flags_key: Tuple[str, ...],
+    requests: List[Tuple[int, Sequence[int]]],
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> List[CraftedItem]:
+    context = CraftingContext.load(platform, game_version, flags_key)
+    return [
+        context.get_item(pickups, seed, unlocked_mask) for seed, pickups in requests
+    ]
+
+
+def iter_recipe_results(
+    context: CraftingContext,
+    seed: int,
+    recipes: Iterable[Sequence[int]],
+    executor: Optional[Executor] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> Iterator[CraftedItem]:
+    """Evaluate every recipe for one seed across a process pool, yielding the crafted items in input order."""
+    chunk_results = map_ordered(
+        evaluate_recipes,
+        (
+            (
+                context.platform,
+                context.game_version,
+                context.flags_key,
+                seed,
+                chunk,
+                unlocked_mask,
+            )
+            for chunk in iter_chunks(recipes, chunk_size)
+        ),
+        executor,
+    )
+    try:
+        for results in chunk_results:
+            yield from results
+    finally:
+        chunk_results.close()
@@ -42,6 +42,13 @@ class ItemPool:
 
     @staticmethod
     def load_item_pools(platform: str, game_version: str) -> Dict[int, "ItemPool"]:
+        # Imported here, as the bundle module builds on this one.
+        from .bundle import get_bundle_version
+
+        bundle_version = get_bundle_version(platform, game_version)
+        if bundle_version is not None:
+            return bundle_version.load_item_pools()
+
         path = get_gamedata_path(platform, game_version, "itempools.xml")
         items = ItemListEntry.load_item_list(platform, game_version)
         output = {}
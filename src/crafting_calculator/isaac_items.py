@@ -25,6 +25,13 @@ class ItemListEntry:
     @staticmethod
     @lru_cache()
     def load_item_list(platform: str, game_version: str) -> Dict[int, "ItemListEntry"]:
+        # Imported here, as the bundle module builds on this one.
+        from .bundle import get_bundle_version
+
+        bundle_version = get_bundle_version(platform, game_version)
+        if bundle_version is not None:
+            return bundle_version.load_item_list()
+
         items_xml_path = get_gamedata_path(platform, game_version, "items.xml")
         stringtable_sta_path = get_gamedata_path(platform, game_version, "stringtable.sta")
         items_metadata_xml_path = get_gamedata_path(platform, game_version, "items_metadata.xml")
@@ -22,6 +22,14 @@ class HardcodedRecipe:
         self.pickups = [pickup_shorthand_to_id_mapping[ch] for ch in input_pickups]
         self.pickup_num = self.convert_pickup_list_to_int64(self.pickups)
 
+    @staticmethod
+    def from_pickups(item_id: int, pickups: List[int]) -> "HardcodedRecipe":
+        recipe = HardcodedRecipe.__new__(HardcodedRecipe)
+        recipe.item_id = item_id
+        recipe.pickups = pickups
+        recipe.pickup_num = HardcodedRecipe.convert_pickup_list_to_int64(pickups)
+        return recipe
+
     @staticmethod
     def convert_pickup_list_to_int64(pickups: List[int]) -> int:
         assert len(pickups) == 8
@@ -36,6 +44,13 @@ class HardcodedRecipe:
     @staticmethod
     @lru_cache()
     def load_hardcoded_recipes(platform: str, game_version: str) -> Dict[int, "HardcodedRecipe"]:
+        # Imported here, as the bundle module builds on this one.
+        from .bundle import get_bundle_version
+
+        bundle_version = get_bundle_version(platform, game_version)
+        if bundle_version is not None:
+            return bundle_version.load_hardcoded_recipes()
+
         recipes_xml_path = get_gamedata_path(platform, game_version, "recipes.xml")
         output = {}
 
@@ -0,0 +1,208 @@
+import asyncio
+import multiprocessing
+import queue
+import secrets
+import threading
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .engine import SearchStats
+
+
+DEFAULT_MAX_JOBS = 1
+
+# How many finished jobs are kept for their results to be fetched, dropping the oldest.
+MAX_FINISHED_JOBS = 256
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    A long running function, submitted to a `JobManager`. The function is called in a worker as
+    `fn(*args, channel, cancel_event)`, and sends `("progress", evaluated, total)` and `("results", [...])` messages
+    to the channel as it goes, so progress and partial results can be read while it runs. It should stop (e.g. by
+    raising `JobCancelled`) once `cancel_event` is set.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        client: str,
+        fn: Callable[..., Any],
+        args: Tuple[Any, ...],
+        channel: Any,
+        cancel_event: Any,
+    ):
+        self.job_id = job_id
+        self.client = client
+        self.fn = fn
+        self.args = args
+        self.channel = channel
+        self.cancel_event = cancel_event
+        self.status = "queued"
+        self.stats = SearchStats()
+        self.results: List[Any] = []
+        self.summary = None
+        self.error = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ["done", "cancelled", "failed"]
+
+    def update(self) -> None:
+        """Read the messages the worker has sent so far."""
+        while True:
+            try:
+                message = self.channel.get_nowait()
+            except queue.Empty:
+                return
+            if message[0] == "progress":
+                _, self.stats.evaluated, self.stats.total = message
+            elif message[0] == "results":
+                self.results.extend(message[1])
+
+    def to_dict(self) -> Dict[str, Any]:
+        self.update()
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "evaluated": self.stats.evaluated,
+            "total": self.stats.total,
+            "elapsed": round(self.stats.elapsed, 3),
+            "rate": round(self.stats.rate, 1),
+            "eta": None
+            if self.finished or self.stats.eta is None
+            else round(self.stats.eta, 1),
+            "results_available": len(self.results),
+            "summary": self.summary,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs jobs in a shared executor, at most `max_running` at a time, so the rest of the executor is left free for
+    quicker requests. Queued jobs are started in turn from each client which has any waiting, rather than in the
+    order they were submitted, so one client submitting many jobs doesn't hold up everybody else's.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        max_running: int = DEFAULT_MAX_JOBS,
+        max_finished: int = MAX_FINISHED_JOBS,
+    ):
+        self.executor = executor
+        self.max_running = max(1, max_running)
+        self.max_finished = max_finished
+        self.jobs: Dict[str, Job] = {}
+        # Each client's queued jobs, and when each client last had a job started.
+        self.queues: Dict[str, Deque[Job]] = {}
+        self.last_started: Dict[str, int] = {}
+        self.started = 0
+        self.finished: Deque[str] = deque()
+        self.running = 0
+        self.tasks = set()
+        # Progress has to be sent between processes when jobs run in a process pool.
+        self.manager = (
+            multiprocessing.Manager()
+            if isinstance(executor, ProcessPoolExecutor)
+            else None
+        )
+
+    def submit(
+        self, fn: Callable[..., Any], args: Tuple[Any, ...], client: str = ""
+    ) -> Job:
+        """Queue a job, starting it straight away if there's room. Must be called from the event loop."""
+        if self.manager is not None:
+            channel, cancel_event = self.manager.Queue(), self.manager.Event()
+        else:
+            channel, cancel_event = queue.Queue(), threading.Event()
+        job = Job(secrets.token_hex(8), client, fn, args, channel, cancel_event)
+        self.jobs[job.job_id] = job
+        self.queues.setdefault(client, deque()).append(job)
+        self.start_next()
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """The job with the given ID. Raises KeyError if there isn't one (or it was finished long ago)."""
+        return self.jobs[job_id]
+
+    def list_jobs(self) -> List[Job]:
+        return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a job. A running job stops once its worker next reports progress."""
+        job = self.get(job_id)
+        if job.status == "queued":
+            client_queue = self.queues[job.client]
+            client_queue.remove(job)
+            if not client_queue:
+                del self.queues[job.client]
+            self.finish(job, "cancelled")
+        elif job.status == "running":
+            job.cancel_event.set()
+            job.status = "cancelling"
+        return job
+
+    def start_next(self) -> None:
+        while self.running < self.max_running and self.queues:
+            # The client which has waited longest since its last job was started goes next.
+            client = min(
+                self.queues, key=lambda client: self.last_started.get(client, -1)
+            )
+            client_queue = self.queues[client]
+            job = client_queue.popleft()
+            if not client_queue:
+                del self.queues[client]
+            self.last_started[client] = self.started
+            self.started += 1
+            self.running += 1
+            task = asyncio.get_running_loop().create_task(self.run(job))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def run(self, job: Job) -> None:
+        job.status = "running"
+        job.stats.start()
+        try:
+            job.summary = await asyncio.get_running_loop().run_in_executor(
+                self.executor, job.fn, *job.args, job.channel, job.cancel_event
+            )
+        except JobCancelled:
+            status = "cancelled"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            status = "failed"
+        else:
+            status = "cancelled" if job.cancel_event.is_set() else "done"
+        finally:
+            self.running -= 1
+        job.update()
+        self.finish(job, status)
+        self.start_next()
+
+    def finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.stats.stop(None if status == "done" else status)
+        self.finished.append(job.job_id)
+        while len(self.finished) > self.max_finished:
+            self.jobs.pop(self.finished.popleft(), None)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "running": self.running,
+            "queued": sum(len(client_queue) for client_queue in self.queues.values()),
+            "finished": len(self.finished),
+        }
+
+    def close(self) -> None:
+        for job in self.jobs.values():
+            if not job.finished:
+                job.cancel_event.set()
+        if self.manager is not None:
+            self.manager.shutdown()
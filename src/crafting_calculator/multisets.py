@@ -0,0 +1,100 @@
+import itertools
+import math
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+RECIPE_SIZE = 8
+
+# Called with a sorted prefix, the position in the walk order the rest of the recipe starts from, and how many
+# pickups are still to be added. Returns True to skip every recipe in that subtree.
+Pruner = Callable[[Tuple[int, ...], int, int], bool]
+
+
+def get_pickup_limits(
+    pickup_list: List[int], inventory: Optional[Dict[int, int]] = None
+) -> Dict[int, int]:
+    """The most of each pickup a recipe may use: the inventory count if given, otherwise a full bag."""
+    if inventory is None:
+        return {pickup_id: RECIPE_SIZE for pickup_id in pickup_list}
+    return {
+        pickup_id: min(count, RECIPE_SIZE)
+        for pickup_id, count in inventory.items()
+        if count > 0
+    }
+
+
+def get_walk_order(limits: Dict[int, int]) -> List[int]:
+    return sorted(pickup_id for pickup_id in limits if limits[pickup_id] > 0)
+
+
+def iter_bounded_multisets(
+    limits: Dict[int, int], size: int = RECIPE_SIZE, prune: Optional[Pruner] = None
+) -> Iterator[Tuple[int, ...]]:
+    """
+    Yield every sorted multiset of `size` pickups using at most `limits[pickup_id]` of each pickup,
+    in the same order as `itertools.combinations_with_replacement`, skipping subtrees rejected by `prune`.
+    """
+    pickups = get_walk_order(limits)
+    caps = [min(limits[pickup_id], size) for pickup_id in pickups]
+    # The most pickups which can still be added from each position onwards, to skip infeasible branches.
+    suffix_caps = list(itertools.accumulate(reversed(caps)))[::-1] + [0]
+
+    def walk(
+        index: int, remaining: int, prefix: Tuple[int, ...]
+    ) -> Iterator[Tuple[int, ...]]:
+        if suffix_caps[index] < remaining:
+            return
+        if prune is not None and prune(prefix, index, remaining):
+            return
+        if remaining == 0:
+            yield prefix
+            return
+        # Using more of an earlier pickup sorts first.
+        for count in range(min(caps[index], remaining), -1, -1):
+            yield from walk(
+                index + 1, remaining - count, prefix + (pickups[index],) * count
+            )
+
+    return walk(0, size, ())
+
+
+def iter_recipes(
+    pickup_list: List[int],
+    inventory: Optional[Dict[int, int]] = None,
+    prune: Optional[Pruner] = None,
+) -> Iterator[Tuple[int, ...]]:
+    if inventory is None and prune is None:
+        return itertools.combinations_with_replacement(sorted(pickup_list), RECIPE_SIZE)
+    return iter_bounded_multisets(
+        get_pickup_limits(pickup_list, inventory), prune=prune
+    )
+
+
+def count_bounded_multisets(limits: Dict[int, int], size: int = RECIPE_SIZE) -> int:
+    # ways[n] is the number of multisets of size n using the pickups seen so far.
+    ways = [1] + [0] * size
+    for limit in limits.values():
+        limit = max(0, min(limit, size))
+        ways = [
+            sum(ways[n - count] for count in range(min(limit, n) + 1))
+            for n in range(size + 1)
+        ]
+    return ways[size]
+
+
+def get_recipe_rank(
+    recipe: Sequence[int], max_pickup_id: int, size: int = RECIPE_SIZE
+) -> int:
+    """
+    The position of a recipe in `itertools.combinations_with_replacement(range(1, max_pickup_id + 1), size)`, so
+    every recipe has a fixed number whatever pickups it was enumerated from.
+    """
+    rank = 0
+    previous = 1
+    for index, pickup_id in enumerate(sorted(recipe)):
+        remaining = size - index - 1
+        # Every recipe with a smaller pickup in this position, and the same ones before it, sorts first.
+        for smaller in range(previous, pickup_id):
+            rank += math.comb(max_pickup_id - smaller + remaining, remaining)
+        previous = pickup_id
+    return rank
@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from .context import ALL_UNLOCKED, CraftingContext
+from .isaac_pickups import PICKUP_LIST
+from .multisets import RECIPE_SIZE
+
+
+class RecipeSwap(NamedTuple):
+    removed_id: int
+    added_id: int
+    pickups: Sequence[int]
+    item_id: int
+    quality_sum: int
+
+
+def iter_recipe_swaps(
+    context: CraftingContext,
+    seed: int,
+    base_pickups: Sequence[int],
+    pickup_list: Optional[Iterable[int]] = None,
+    inventory: Optional[Dict[int, int]] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> Iterator[RecipeSwap]:
+    """
+    Yield every recipe one swap away from `base_pickups`, replacing one of its pickups with another from `pickup_list`
+    (every pickup by default), with what it crafts. With an inventory, only swaps which the inventory can make are yielded.
+
+    Swapping out either copy of a pickup gives the same recipe, so each is only yielded once, in the order
+    of the pickup removed and then the pickup added. The pickup counts and quality sum are updated in place for
+    each swap rather than recounted.
+    """
+    if len(base_pickups) != RECIPE_SIZE:
+        raise ValueError(f"You must provide {RECIPE_SIZE} pickup IDs.")
+    if pickup_list is None:
+        pickup_list = [pickup.pickup_id for pickup in PICKUP_LIST if pickup is not None]
+    added_ids = sorted(set(pickup_list))
+
+    pickup_count, quality_sum = context.count_pickups(base_pickups)
+    base_pickups = sorted(base_pickups)
+    for removed_id in sorted(set(base_pickups)):
+        removed_index = base_pickups.index(removed_id)
+        rest = base_pickups[:removed_index] + base_pickups[removed_index + 1 :]
+        pickup_count[removed_id] -= 1
+        removed_quality_sum = quality_sum - PICKUP_LIST[removed_id].quality
+
+        for added_id in added_ids:
+            if added_id == removed_id:
+                continue
+            if (
+                inventory is not None
+                and inventory.get(added_id, 0) <= pickup_count[added_id]
+            ):
+                continue
+            pickups = sorted(rest + [added_id])
+            pickup_count[added_id] += 1
+            _, item_id, swapped_quality_sum = context.get_item_from_counts(
+                pickups,
+                pickup_count,
+                removed_quality_sum + PICKUP_LIST[added_id].quality,
+                seed,
+                unlocked_mask,
+            )
+            pickup_count[added_id] -= 1
+            yield RecipeSwap(
+                removed_id, added_id, pickups, item_id, swapped_quality_sum
+            )
+
+        pickup_count[removed_id] += 1
+
+
+def get_recipe_swaps(
+    context: CraftingContext,
+    seed: int,
+    base_pickups: Sequence[int],
+    pickup_list: Optional[Iterable[int]] = None,
+    inventory: Optional[Dict[int, int]] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> List[RecipeSwap]:
+    return list(
+        iter_recipe_swaps(
+            context, seed, base_pickups, pickup_list, inventory, unlocked_mask
+        )
+    )
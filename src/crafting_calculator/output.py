@@ -0,0 +1,53 @@
+import json
+import sys
+from typing import Any, Dict, Optional, Sequence, TextIO
+
+from .isaac_items import ItemListEntry
+
+
+OUTPUT_FORMATS = ["text", "json", "ndjson"]
+
+
+class ResultWriter:
+    """
+    Writes machine-readable results as they are produced.
+    `ndjson` writes one object per line, `json` writes a single array, element by element.
+    """
+
+    def __init__(self, output_format: str, file: Optional[TextIO] = None):
+        assert output_format in ["json", "ndjson"]
+        self.output_format = output_format
+        self.file = file if file is not None else sys.stdout
+        self.count = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self.output_format == "ndjson":
+            self.file.write(json.dumps(record) + "\n")
+        else:
+            self.file.write(("[\n" if self.count == 0 else ",\n") + json.dumps(record))
+        self.count += 1
+        self.file.flush()
+
+    def close(self) -> None:
+        if self.output_format == "json":
+            self.file.write("[]\n" if self.count == 0 else "\n]\n")
+            self.file.flush()
+
+    def __enter__(self) -> "ResultWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def item_to_dict(item: ItemListEntry) -> Dict[str, Any]:
+    return {"item_id": item.item_id, "name": item.name, "quality": item.quality}
+
+
+def recipe_to_dict(
+    item: ItemListEntry, pickups: Sequence[int], quality_sum: int
+) -> Dict[str, Any]:
+    output = item_to_dict(item)
+    output["pickups"] = list(pickups)
+    output["quality_sum"] = quality_sum
+    return output
@@ -0,0 +1,347 @@
+import operator
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .context import (
+    ALL_UNLOCKED,
+    CraftedItem,
+    CraftingContext,
+    DenseWeightTable,
+    get_pool_weights,
+    get_quality_band,
+)
+from .counting import iter_table_key_counts
+from .engine import map_ordered
+from .isaac_pickups import PICKUP_LIST
+from .isaac_rng import rng_next
+from .multisets import RECIPE_SIZE, get_pickup_limits, get_walk_order
+from .predicates import POOL_26_GUARD_PICKUPS, POOL_PICKUPS, RecipePruner
+
+
+# Pool 26's pickup only gives weight without a guard pickup, so it's left free to vary within a group, along with
+# the guard pickups. Every recipe with the same weight table then lands in the same group.
+POOL_26_PICKUP = POOL_PICKUPS[26]
+GROUP_PICKUPS = sorted(
+    pickup_id for pickup_id in set(POOL_PICKUPS.values()) if pickup_id != POOL_26_PICKUP
+)
+
+
+class RecipeGroup(NamedTuple):
+    """
+    Every recipe with the same counts of the pickups which give pools weight (other than pool 26's), and the weight
+    tables they draw from.
+    """
+
+    pool_counts: Tuple[Tuple[int, int], ...]
+    table_keys: Tuple[tuple, ...]
+    count: int
+
+
+def get_group_counts(pickup_array: Iterable[int]) -> Tuple[Tuple[int, int], ...]:
+    """The group a recipe belongs to, as its count of each of `GROUP_PICKUPS`."""
+    pickup_array = list(pickup_array)
+    return tuple(
+        (pickup_id, pickup_array.count(pickup_id)) for pickup_id in GROUP_PICKUPS
+    )
+
+
+def plan_recipe_groups(
+    context: CraftingContext, limits: Dict[int, int]
+) -> List[RecipeGroup]:
+    """
+    Split the recipes using at most `limits[pickup_id]` of each pickup into groups, without enumerating them.
+    No two groups draw from the same weight table. Groups are sorted by pool counts.
+    """
+    groups = {}
+    for table_key, pool_pickup_counts, _, _, count in iter_table_key_counts(
+        context.quality_ranges, limits
+    ):
+        pool_counts = dict(pool_pickup_counts)
+        group_counts = tuple(
+            (pickup_id, pool_counts.get(pickup_id, 0)) for pickup_id in GROUP_PICKUPS
+        )
+        table_keys, group_count = groups.get(group_counts, (set(), 0))
+        table_keys.add(table_key)
+        groups[group_counts] = (table_keys, group_count + count)
+    return [
+        RecipeGroup(group_counts, tuple(sorted(table_keys)), count)
+        for group_counts, (table_keys, count) in sorted(groups.items())
+    ]
+
+
+class GroupWalker:
+    """
+    Lists the recipes in a group, using at most `limits[pickup_id]` of each pickup.
+
+    The walk adds pickups in ID order, which is the order the game advances the RNG in, so the seed after adding
+    the pickups and the hardcoded recipe key are carried down the walk instead of being recalculated for every
+    recipe, along with the quality sum and what decides pool 26's weight.
+    """
+
+    def __init__(self, limits: Dict[int, int]):
+        self.pickups = get_walk_order(limits)
+        self.limits = [
+            min(limits[pickup_id], RECIPE_SIZE) for pickup_id in self.pickups
+        ]
+        self.qualities = [PICKUP_LIST[pickup_id].quality for pickup_id in self.pickups]
+        self.is_guard = [
+            pickup_id in POOL_26_GUARD_PICKUPS for pickup_id in self.pickups
+        ]
+        self.pool_26_copies = [
+            int(pickup_id == POOL_26_PICKUP) for pickup_id in self.pickups
+        ]
+
+    def get_group_recipes(
+        self, group: RecipeGroup, seed: int
+    ) -> List[Tuple[Tuple[int, ...], int, int, int, bool, int]]:
+        """
+        List `(recipe, seed after adding the pickups, hardcoded recipe key, quality sum, has a guard pickup,
+        pool 26 pickup count)` for every recipe in a group.
+        """
+        pool_counts = dict(group.pool_counts)
+        pickups = self.pickups
+        size = len(pickups)
+        qualities = self.qualities
+        is_guard = self.is_guard
+        pool_26_copies = self.pool_26_copies
+
+        # The fewest and most of each pickup the group's recipes can use, and how many pickups must (and can) be
+        # added from each position onwards.
+        choices = [
+            (pool_counts[pickup_id], pool_counts[pickup_id])
+            if pickup_id in pool_counts
+            else (0, limit)
+            for pickup_id, limit in zip(pickups, self.limits)
+        ]
+        forced_count = [0] * (size + 1)
+        free_count = [0] * (size + 1)
+        for index in range(size - 1, -1, -1):
+            forced_count[index] = forced_count[index + 1] + choices[index][0]
+            free_count[index] = free_count[index + 1] + choices[index][1]
+
+        recipes = []
+
+        def walk(
+            index: int,
+            remaining: int,
+            prefix: Tuple[int, ...],
+            quality_sum: int,
+            current_seed: int,
+            key: int,
+            has_guard: bool,
+            pool_26_count: int,
+        ) -> None:
+            # Choose the next pickup to add, skipping over any which aren't used.
+            for next_index in range(index, size):
+                low, high = choices[next_index]
+                if high > remaining:
+                    high = remaining
+                if high > 0:
+                    pickup_id = pickups[next_index]
+                    quality = qualities[next_index]
+                    child_has_guard = has_guard or is_guard[next_index]
+                    forced = forced_count[next_index + 1]
+                    free = free_count[next_index + 1]
+                    seeds = None
+                    # Using more of an earlier pickup sorts first.
+                    for count in range(high, (low or 1) - 1, -1):
+                        rest = remaining - count
+                        if not forced <= rest <= free:
+                            continue
+                        if seeds is None:
+                            # The seed and key after adding each number of copies, up to the most which are used.
+                            seeds = [current_seed]
+                            keys = [key]
+                            for copies in range(1, count + 1):
+                                seeds.append(rng_next(seeds[-1], pickup_id))
+                                keys.append(
+                                    keys[-1]
+                                    | pickup_id << 8 * (len(prefix) + copies - 1)
+                                )
+                        if rest == 0:
+                            recipes.append(
+                                (
+                                    prefix + (pickup_id,) * count,
+                                    seeds[count],
+                                    keys[count],
+                                    quality_sum + count * quality,
+                                    child_has_guard,
+                                    pool_26_count + count * pool_26_copies[next_index],
+                                )
+                            )
+                        else:
+                            walk(
+                                next_index + 1,
+                                rest,
+                                prefix + (pickup_id,) * count,
+                                quality_sum + count * quality,
+                                seeds[count],
+                                keys[count],
+                                child_has_guard,
+                                pool_26_count + count * pool_26_copies[next_index],
+                            )
+                # A pickup with an exact count can't be skipped.
+                if low > 0:
+                    return
+
+        if forced_count[0] <= RECIPE_SIZE <= free_count[0]:
+            walk(0, RECIPE_SIZE, (), 0, seed, 0, False, 0)
+        return recipes
+
+
+@lru_cache(maxsize=8)
+def get_group_walker(limits: Tuple[Tuple[int, int], ...]) -> GroupWalker:
+    return GroupWalker(dict(limits))
+
+
+def evaluate_group(
+    platform: str,
+    game_version: str,
+    flags_key: Tuple[str, ...],
+    seed: int,
+    limits: Dict[int, int],
+    group: RecipeGroup,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> List[CraftedItem]:
+    """
+    Evaluate the recipes in a group. No other group uses the same weight tables, so each is built once, as a
+    `DenseWeightTable`, and not cached. Every pool but pool 26 has the same weight throughout the group, so their
+    weights are only summed once per pair of quality bands. Recipes whose weight table isn't in `group.table_keys`
+    are skipped unless they're hardcoded.
+    """
+    context = CraftingContext.load(platform, game_version, flags_key)
+    hardcoded_recipes = context.hardcoded_recipes
+    walker = get_group_walker(tuple(sorted(limits.items())))
+    table_keys = set(group.table_keys)
+
+    pickup_count = [0] * len(PICKUP_LIST)
+    for pickup_id, copies in group.pool_counts:
+        pickup_count[pickup_id] = copies
+
+    # The weight every pool but pool 26 adds, by quality bands. These are the same for the whole group.
+    base_weights = {}
+    # Weight tables by (quality sum, has a guard pickup, pool 26 pickup count), or None if the table is skipped.
+    tables = {}
+    results = []
+    for (
+        recipe,
+        pickup_seed,
+        recipe_key,
+        quality_sum,
+        has_guard,
+        pool_26_count,
+    ) in walker.get_group_recipes(group, seed):
+        hardcoded_recipe = hardcoded_recipes.get(recipe_key)
+        if hardcoded_recipe:
+            item_id = context.get_hardcoded_item(hardcoded_recipe, unlocked_mask)
+            if item_id is not None:
+                results.append(CraftedItem(recipe, item_id, quality_sum))
+                continue
+
+        table_state = (quality_sum, has_guard, pool_26_count)
+        if table_state not in tables:
+            pickup_count[POOL_26_GUARD_PICKUPS[0]] = int(has_guard)
+            pickup_count[POOL_26_PICKUP] = pool_26_count
+            bands = (
+                get_quality_band(context.quality_ranges, quality_sum),
+                get_quality_band(context.quality_ranges, quality_sum - 5),
+            )
+            pool_weights = get_pool_weights(pickup_count)
+            weight_table = None
+            if bands + (pool_weights,) in table_keys:
+                if bands not in base_weights:
+                    base_weights[bands] = context.get_cumulative_weights(
+                        *bands, tuple(pool for pool in pool_weights if pool[0] != 26)
+                    )
+                cumulative_weights = base_weights[bands]
+                pool_26_weights = tuple(
+                    pool for pool in pool_weights if pool[0] == 26 and pool[1] > 0
+                )
+                if pool_26_weights:
+                    cumulative_weights = list(
+                        map(
+                            operator.add,
+                            cumulative_weights,
+                            context.get_cumulative_weights(*bands, pool_26_weights),
+                        )
+                    )
+                weight_table = DenseWeightTable(context.item_order, cumulative_weights)
+            tables[table_state] = weight_table
+
+        weight_table = tables[table_state]
+        if weight_table is not None:
+            results.append(
+                CraftedItem(
+                    recipe,
+                    context.draw_item(weight_table, pickup_seed, unlocked_mask),
+                    quality_sum,
+                )
+            )
+    return results
+
+
+def filter_groups(
+    context: CraftingContext,
+    groups: Iterable[RecipeGroup],
+    item_ids: Iterable[int],
+    limits: Dict[int, int],
+) -> List[RecipeGroup]:
+    """
+    Keep only the weight tables which can draw any of the items, dropping groups left with none unless they hold a
+    hardcoded recipe for one.
+    """
+    pruner = RecipePruner(context, item_ids, limits)
+    hardcoded_groups = {get_group_counts(recipe) for recipe in pruner.hardcoded_recipes}
+    filtered = []
+    for group in groups:
+        table_keys = tuple(
+            table_key
+            for table_key in group.table_keys
+            if pruner.can_match_table(table_key)
+        )
+        if table_keys or group.pool_counts in hardcoded_groups:
+            filtered.append(group._replace(table_keys=table_keys))
+    return filtered
+
+
+def iter_grouped_results(
+    context: CraftingContext,
+    seed: int,
+    pickup_list: List[int],
+    inventory: Optional[Dict[int, int]] = None,
+    executor: Optional[Executor] = None,
+    item_ids: Optional[Iterable[int]] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> Iterator[CraftedItem]:
+    """
+    Evaluate every recipe from the given pickup types one group at a time, sending each group to a single worker
+    so each weight table is only built once. Recipes are yielded group by group, rather than in enumeration order.
+    With `item_ids`, groups which can't craft any of those items are skipped.
+    """
+    limits = get_pickup_limits(pickup_list, inventory)
+    groups = plan_recipe_groups(context, limits)
+    if item_ids is not None:
+        groups = filter_groups(context, groups, item_ids, limits)
+
+    group_results = map_ordered(
+        evaluate_group,
+        (
+            (
+                context.platform,
+                context.game_version,
+                context.flags_key,
+                seed,
+                limits,
+                group,
+                unlocked_mask,
+            )
+            for group in groups
+        ),
+        executor,
+    )
+    try:
+        for results in group_results:
+            yield from results
+    finally:
+        group_results.close()
@@ -0,0 +1,281 @@
+import operator
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .context import BREAKFAST_ITEM_ID, CraftingContext, get_quality_band
+from .isaac_items import ItemListEntry
+from .isaac_pickups import PICKUP_LIST
+from .multisets import get_walk_order
+
+
+# The pickups which give a pool weight, by pool ID. Pools 0, 1 and 2 always have weight.
+POOL_PICKUPS = {3: 3, 4: 4, 5: 6, 7: 29, 8: 5, 9: 25, 12: 7, 26: 23}
+# Any of these pickups stops the pool 26 pickup from giving weight.
+POOL_26_GUARD_PICKUPS = [1, 8, 12, 15]
+
+COMPARISONS = {
+    "<=": operator.le,
+    ">=": operator.ge,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "=": operator.eq,
+}
+
+
+class ItemPredicate:
+    """
+    A condition on an item, parsed from expressions like `quality>=3`, `tag=offensive`, `pool=angel`, `active` or `passive`.
+    """
+
+    def __init__(
+        self, expression: str, test: Callable[[ItemListEntry, Set[str]], bool]
+    ):
+        self.expression = expression
+        self.test = test
+
+    def matches(self, item: ItemListEntry, pool_names: Set[str]) -> bool:
+        return self.test(item, pool_names)
+
+    @staticmethod
+    def parse(expression: str) -> "ItemPredicate":
+        if expression in ["active", "passive"]:
+            is_active = expression == "active"
+            return ItemPredicate(
+                expression, lambda item, pools: item.is_active == is_active
+            )
+
+        match = re.fullmatch(r"(quality|tag|pool)(<=|>=|!=|<|>|=)(\w+)", expression)
+        if match is None:
+            raise ValueError(
+                f"Unknown condition {expression!r}, expected quality<op>N, tag=NAME, pool=NAME, active or passive."
+            )
+
+        field, comparison, value = match.groups()
+        compare = COMPARISONS[comparison]
+        if field == "quality":
+            if not value.isdigit():
+                raise ValueError(f"Expected a quality in {expression!r}.")
+            return ItemPredicate(
+                expression, lambda item, pools: compare(item.quality, int(value))
+            )
+        if comparison not in ["=", "!="]:
+            raise ValueError(
+                f"Only = and != can be used with {field} in {expression!r}."
+            )
+        if field == "tag":
+            return ItemPredicate(
+                expression, lambda item, pools: compare(item.has_tag(value), True)
+            )
+        return ItemPredicate(
+            expression, lambda item, pools: compare(value in pools, True)
+        )
+
+
+def get_item_pool_names(context: CraftingContext) -> Dict[int, Set[str]]:
+    pool_names = {item_id: set() for item_id in context.items}
+    for item_pool in context.item_pools.values():
+        for item_id, _ in item_pool.get_all_items():
+            pool_names[item_id].add(item_pool.pool_name)
+    return pool_names
+
+
+def filter_items(
+    context: CraftingContext,
+    predicates: Iterable[ItemPredicate],
+    item_ids: Optional[Iterable[int]] = None,
+) -> List[int]:
+    """The IDs of the items (out of `item_ids`, or every item) which match all of the predicates."""
+    predicates = list(predicates)
+    pool_names = get_item_pool_names(context)
+    if item_ids is None:
+        item_ids = context.items
+    return sorted(
+        item_id
+        for item_id in item_ids
+        if all(
+            predicate.matches(context.items[item_id], pool_names[item_id])
+            for predicate in predicates
+        )
+    )
+
+
+class RecipePruner:
+    """
+    Decides which subtrees of the multiset tree can't craft any of a set of items, so they can be skipped
+    without evaluating RNG.
+
+    A subtree is every recipe starting with a sorted prefix and continuing with pickups from a position in the
+    walk order onwards. Its quality sum is bounded by the cheapest and most expensive ways to fill the bag,
+    which bounds the quality bands it can draw from, and a pool can only have weight if its pickup is already
+    in the prefix or can still be added. Hardcoded recipes for the items are checked separately.
+    """
+
+    def __init__(
+        self, context: CraftingContext, item_ids: Iterable[int], limits: Dict[int, int]
+    ):
+        self.context = context
+        self.item_ids = set(item_ids)
+        self.pickups = get_walk_order(limits)
+        self.suffix_quality = [
+            (
+                min(
+                    [
+                        PICKUP_LIST[pickup_id].quality
+                        for pickup_id in self.pickups[index:]
+                    ],
+                    default=0,
+                ),
+                max(
+                    [
+                        PICKUP_LIST[pickup_id].quality
+                        for pickup_id in self.pickups[index:]
+                    ],
+                    default=0,
+                ),
+            )
+            for index in range(len(self.pickups) + 1)
+        ]
+        self.pruned = 0
+
+        # For each pool, which qualities have at least one drawable item we're looking for.
+        self.matching_qualities = {}
+        for pool_id, item_pool in context.item_pools.items():
+            self.matching_qualities[pool_id] = {
+                quality
+                for quality, item_list in item_pool.quality_lists.items()
+                for item_id, item_weight in item_list
+                if item_id in self.item_ids
+                and item_weight > 0
+                and context.weight_available[item_id]
+            }
+
+        # Breakfast is the fallback when nothing is drawn, which depends on more than the weight table, so it can't be pruned.
+        self.breakfast_possible = BREAKFAST_ITEM_ID in self.item_ids
+
+        self.hardcoded_recipes = [
+            tuple(sorted(recipe.pickups))
+            for recipe in context.hardcoded_recipes.values()
+            if recipe.item_id in self.item_ids
+            and all(pickup_id in limits for pickup_id in recipe.pickups)
+        ]
+
+    def get_qualities(self, score_min: int, score_max: int) -> Set[int]:
+        quality_ranges = self.context.quality_ranges
+        band_min = get_quality_band(quality_ranges, score_min)
+        band_max = get_quality_band(quality_ranges, score_max)
+        qualities = set()
+        for band in range(band_min, band_max + 1):
+            _, quality_min, quality_max = quality_ranges[band]
+            qualities.update(range(quality_min, quality_max + 1))
+        return qualities
+
+    def has_hardcoded_recipe(self, prefix: Tuple[int, ...], index: int) -> bool:
+        rest = self.pickups[index:]
+        for recipe in self.hardcoded_recipes:
+            if recipe[: len(prefix)] == prefix and all(
+                pickup_id in rest for pickup_id in recipe[len(prefix) :]
+            ):
+                return True
+        return False
+
+    def can_match(self, prefix: Tuple[int, ...], index: int, remaining: int) -> bool:
+        if self.breakfast_possible or self.has_hardcoded_recipe(prefix, index):
+            return True
+        quality_min, quality_max = self.suffix_quality[index]
+        return self.can_draw(
+            prefix, self.pickups[index:], remaining, quality_min, quality_max
+        )
+
+    def can_complete(
+        self, prefix: Sequence[int], rest: Sequence[int], remaining: int
+    ) -> bool:
+        """
+        Like `can_match`, for the recipes made by adding `remaining` pickups from `rest` to `prefix`, where the
+        pickups aren't walked in order.
+        """
+        if self.breakfast_possible:
+            return True
+        prefix_counts = Counter(prefix)
+        for recipe in self.hardcoded_recipes:
+            missing = Counter(recipe)
+            missing.subtract(prefix_counts)
+            if min(missing.values()) >= 0 and all(
+                pickup_id in rest for pickup_id in missing.elements()
+            ):
+                return True
+        qualities = [PICKUP_LIST[pickup_id].quality for pickup_id in rest]
+        return self.can_draw(
+            prefix,
+            rest,
+            remaining,
+            min(qualities, default=0),
+            max(qualities, default=0),
+        )
+
+    def can_draw(
+        self,
+        prefix: Sequence[int],
+        rest: Sequence[int],
+        remaining: int,
+        quality_min: int,
+        quality_max: int,
+    ) -> bool:
+        # Whether a weight table reachable by adding `remaining` pickups of quality_min
+        # to quality_max to the prefix can draw one of the targets.
+        quality_sum = sum(PICKUP_LIST[pickup_id].quality for pickup_id in prefix)
+        qualities = self.get_qualities(
+            quality_sum + remaining * quality_min, quality_sum + remaining * quality_max
+        )
+        lowered_qualities = self.get_qualities(
+            quality_sum + remaining * quality_min - 5,
+            quality_sum + remaining * quality_max - 5,
+        )
+
+        pools = [0, 1, 2]
+        for pool_id, pickup_id in POOL_PICKUPS.items():
+            if pickup_id in prefix or (remaining > 0 and pickup_id in rest):
+                if pool_id == 26 and any(
+                    guard in prefix for guard in POOL_26_GUARD_PICKUPS
+                ):
+                    continue
+                pools.append(pool_id)
+
+        for pool_id in pools:
+            if pool_id not in self.context.item_pools:
+                continue
+            pool_qualities = (
+                lowered_qualities
+                if self.context.item_pools[pool_id].lowered_quality
+                else qualities
+            )
+            if self.matching_qualities[pool_id] & pool_qualities:
+                return True
+        return False
+
+    def can_match_table(self, table_key: tuple) -> bool:
+        """Whether a weight table (keyed like `CraftingContext.get_table_key`) can draw any of the items."""
+        if self.breakfast_possible:
+            return True
+        band, lowered_band, pool_weights = table_key
+        for pool_id, pool_weight in pool_weights:
+            if pool_weight <= 0 or pool_id not in self.context.item_pools:
+                continue
+            _, quality_min, quality_max = self.context.quality_ranges[
+                lowered_band
+                if self.context.item_pools[pool_id].lowered_quality
+                else band
+            ]
+            if any(
+                quality_min <= quality <= quality_max
+                for quality in self.matching_qualities[pool_id]
+            ):
+                return True
+        return False
+
+    def __call__(self, prefix: Tuple[int, ...], index: int, remaining: int) -> bool:
+        if self.can_match(prefix, index, remaining):
+            return False
+        self.pruned += 1
+        return True
@@ -0,0 +1,95 @@
+from typing import Dict, Iterable, Sequence, Union
+
+from .context import BREAKFAST_ITEM_ID, CraftingContext, get_unlocked_mask
+from .isaac_items import ItemListEntry
+
+
+# The bag gives up and returns breakfast after this many draws.
+MAX_DRAWS = 20
+
+# Chance of an item being rerolled in the GENERATING step, on top of the items which are never available.
+TAINTED_LOST_REROLL_CHANCE = 0.2  # Quality 2 or less
+SACRED_ORB_REROLL_CHANCE = 1 / 3  # Quality 2
+
+
+def get_acceptance_chance(
+    context: CraftingContext, item: ItemListEntry, unlocked_mask: int
+) -> float:
+    """The chance a drawn item is kept rather than rerolled."""
+    if not context.generate_available[item.item_id]:
+        return 0.0
+    achievement_bit = context.achievement_bits[item.item_id]
+    if achievement_bit and not unlocked_mask & achievement_bit:
+        return 0.0
+
+    chance = 1.0
+    if context.flags["is_tlost"] and item.quality <= 2:
+        chance *= 1 - TAINTED_LOST_REROLL_CHANCE
+    if context.flags["has_sacred_orb"] and item.quality == 2:
+        chance *= 1 - SACRED_ORB_REROLL_CHANCE
+    return chance
+
+
+def get_table_distribution(
+    context: CraftingContext, table_key: tuple, unlocked_mask: int
+) -> Dict[int, float]:
+    cache_key = (table_key, unlocked_mask)
+    distribution = context.distributions.get(cache_key)
+    if distribution is not None:
+        return distribution
+
+    weight_table = context.get_weight_table(table_key)
+    accepted = {}
+    if weight_table.all_weight > 0:
+        for item_id, weight in zip(weight_table.item_ids, weight_table.weights):
+            chance = get_acceptance_chance(
+                context, context.items[item_id], unlocked_mask
+            )
+            if chance > 0:
+                accepted[item_id] = weight / weight_table.all_weight * chance
+
+    # Each draw keeps an item with probability `accept_chance`, and every draw is independent of the last,
+    # so the item kept is distributed like a single accepted draw, unless all of the draws are rerolled.
+    accept_chance = sum(accepted.values())
+    fail_chance = (1 - accept_chance) ** MAX_DRAWS
+    distribution = {}
+    if accept_chance > 0:
+        scale = (1 - fail_chance) / accept_chance
+        distribution = {item_id: chance * scale for item_id, chance in accepted.items()}
+    if fail_chance > 0:
+        distribution[BREAKFAST_ITEM_ID] = (
+            distribution.get(BREAKFAST_ITEM_ID, 0.0) + fail_chance
+        )
+
+    context.distributions[cache_key] = distribution
+    return distribution
+
+
+def get_outcome_distribution(
+    context: CraftingContext,
+    pickup_array: Sequence[int],
+    unlocked_achievements: Union[None, int, Iterable[int]] = None,
+) -> Dict[int, float]:
+    """
+    The exact probability of each item being crafted from a recipe, over all seeds, worked out from the weight table.
+
+    `unlocked_achievements` is the unlocked achievement IDs or bitmask, as for `get_unlocked_mask`. If it is not given,
+    every achievement is treated as unlocked. Unlike `get_item`, this also models the chance of Tainted Lost and
+    Sacred Orb rerolling low quality items.
+    """
+    unlocked_mask = get_unlocked_mask(unlocked_achievements)
+
+    hardcoded_recipe = context.find_hardcoded_recipe(pickup_array)
+    if hardcoded_recipe:
+        achievement_bit = context.achievement_bits[hardcoded_recipe.item_id]
+        if (
+            not context.hardcoded_recipe_requires_unlock
+            or not achievement_bit
+            or unlocked_mask & achievement_bit
+        ):
+            return {hardcoded_recipe.item_id: 1.0}
+
+    pickup_count, quality_sum = context.count_pickups(pickup_array)
+    return get_table_distribution(
+        context, context.get_table_key(pickup_count, quality_sum), unlocked_mask
+    )
@@ -0,0 +1,382 @@
+import heapq
+import itertools
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .context import ALL_UNLOCKED, BREAKFAST_ITEM_ID, CraftedItem, CraftingContext
+from .counting import iter_table_key_counts
+from .isaac_pickups import PICKUP_LIST
+from .multisets import RECIPE_SIZE, get_pickup_limits, get_walk_order
+from .predicates import POOL_26_GUARD_PICKUPS, POOL_PICKUPS, RecipePruner
+from .probability import MAX_DRAWS, get_acceptance_chance
+
+
+# How many recipes to evaluate between checks of the time limit.
+SAMPLE_BATCH_SIZE = 256
+
+
+class Stratum:
+    """
+    The recipes with the same counts of the pickups which give pools weight, the same quality bands, and which
+    either all have or all lack a guard pickup, which are sampled in a random order without repeats. These all
+    share one weight table.
+    """
+
+    def __init__(
+        self,
+        table_key: tuple,
+        pool_counts: Tuple[Tuple[int, int], ...],
+        has_guard: bool,
+        count: int,
+        rng: random.Random,
+    ):
+        self.table_key = table_key
+        self.pool_counts = pool_counts
+        self.has_guard = has_guard
+        self.count = count
+        self.sampled = 0
+        # Ranks are visited in the order offset, offset + step, offset + 2 * step, ... (mod count), which covers
+        # every rank once as the step is coprime to the count.
+        self.offset = rng.randrange(self.count)
+        self.step = 1
+        if self.count > 2:
+            self.step = rng.randrange(1, self.count)
+            while math.gcd(self.step, self.count) != 1:
+                self.step = rng.randrange(1, self.count)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.sampled >= self.count
+
+    def next_rank(self) -> int:
+        rank = (self.offset + self.sampled * self.step) % self.count
+        self.sampled += 1
+        return rank
+
+
+class CraftableSetSampler:
+    """
+    Estimates which items can be crafted from the given pickup types by evaluating a stratified sample of the
+    recipes, rather than all of them.
+
+    Recipes are split into strata by weight table (see `Stratum`), and each stratum is sampled in proportion to its
+    size, so every weight table is represented early on. Recipes are picked by unranking random ranks within
+    a stratum, without repeats, so sampling for long enough evaluates every recipe and the result becomes exact.
+    Hardcoded recipes are always evaluated up front, since a sample would rarely hit them.
+    """
+
+    def __init__(
+        self,
+        context: CraftingContext,
+        seed: int,
+        pickup_list: List[int],
+        inventory: Optional[Dict[int, int]] = None,
+        item_ids: Optional[Iterable[int]] = None,
+        unlocked_mask: int = ALL_UNLOCKED,
+        random_seed: Optional[int] = None,
+    ):
+        self.context = context
+        self.seed = seed
+        self.unlocked_mask = unlocked_mask
+        self.limits = get_pickup_limits(pickup_list, inventory)
+        self.item_ids = None if item_ids is None else set(item_ids)
+        self.found: Dict[int, CraftedItem] = {}
+        self.evaluated = 0
+        self.band_items = {}
+        rng = random.Random(random_seed)
+
+        self.free_pickups = [
+            pickup_id
+            for pickup_id in get_walk_order(self.limits)
+            if pickup_id not in POOL_PICKUPS.values()
+        ]
+        self.free_ways = self.get_free_ways(True)
+        self.unguarded_ways = self.get_free_ways(False)
+
+        pruner = (
+            None
+            if self.item_ids is None
+            else RecipePruner(context, self.item_ids, self.limits)
+        )
+        # Only the pool pickups and guard pickups decide the pool weights, so each table key is only reached by
+        # recipes which agree on those and whose quality sums fall in its bands.
+        strata = defaultdict(int)
+        for (
+            table_key,
+            pool_pickup_counts,
+            has_guard,
+            _,
+            count,
+        ) in iter_table_key_counts(context.quality_ranges, self.limits):
+            if pruner is not None and not pruner.can_match_table(table_key):
+                continue
+            strata[(table_key, pool_pickup_counts, has_guard)] += count
+        self.strata = [
+            Stratum(table_key, pool_counts, has_guard, count, rng)
+            for (table_key, pool_counts, has_guard), count in sorted(strata.items())
+        ]
+        self.total = sum(stratum.count for stratum in self.strata)
+        # Strata by the fraction of them which will have been sampled after their next recipe, smallest first.
+        self.queue = [
+            (1 / stratum.count, index) for index, stratum in enumerate(self.strata)
+        ]
+        heapq.heapify(self.queue)
+
+        for hardcoded_recipe in context.hardcoded_recipes.values():
+            pickups = sorted(hardcoded_recipe.pickups)
+            if all(
+                pickups.count(pickup_id) <= self.limits.get(pickup_id, 0)
+                for pickup_id in pickups
+            ):
+                self.add_result(context.get_item(pickups, seed, unlocked_mask))
+
+    def get_free_ways(self, allow_guards: bool) -> List[List[List[int]]]:
+        # free_ways[index][n][q] is the number of multisets of n of the free pickups from `index` onwards with a
+        # quality sum below q, so the number in a range of quality sums is a difference of two entries.
+        size = len(self.free_pickups)
+        max_quality = RECIPE_SIZE * max(
+            [PICKUP_LIST[pickup_id].quality for pickup_id in self.free_pickups],
+            default=0,
+        )
+        ways = [[1] + [0] * max_quality] + [
+            [0] * (max_quality + 1) for _ in range(RECIPE_SIZE)
+        ]
+        free_ways = [None] * (size + 1)
+        free_ways[size] = [
+            list(itertools.accumulate(ways_n, initial=0)) for ways_n in ways
+        ]
+        for index in range(size - 1, -1, -1):
+            pickup_id = self.free_pickups[index]
+            quality = PICKUP_LIST[pickup_id].quality
+            limit = self.get_free_limit(pickup_id, allow_guards)
+            rest = ways
+            ways = [[0] * (max_quality + 1) for _ in range(RECIPE_SIZE + 1)]
+            for n in range(RECIPE_SIZE + 1):
+                for count in range(min(limit, n) + 1):
+                    for quality_sum, rest_ways in enumerate(rest[n - count]):
+                        if rest_ways:
+                            ways[n][quality_sum + count * quality] += rest_ways
+            free_ways[index] = [
+                list(itertools.accumulate(ways_n, initial=0)) for ways_n in ways
+            ]
+        return free_ways
+
+    def get_free_limit(self, pickup_id: int, allow_guards: bool) -> int:
+        if not allow_guards and pickup_id in POOL_26_GUARD_PICKUPS:
+            return 0
+        return self.limits[pickup_id]
+
+    def count_free(
+        self,
+        free_ways: List[List[List[int]]],
+        index: int,
+        size: int,
+        quality_min: int,
+        quality_max: int,
+    ) -> int:
+        prefix = free_ways[index][size]
+        quality_min = max(quality_min, 0)
+        quality_max = min(quality_max, len(prefix) - 2)
+        if quality_max < quality_min:
+            return 0
+        return prefix[quality_max + 1] - prefix[quality_min]
+
+    def count_completions(
+        self,
+        stratum: Stratum,
+        guarded: bool,
+        index: int,
+        size: int,
+        quality_min: int,
+        quality_max: int,
+    ) -> int:
+        # The ways to finish a recipe in the stratum with free pickups from `index` onwards, given whether a guard
+        # pickup has been used already.
+        if not stratum.has_guard:
+            return self.count_free(
+                self.unguarded_ways, index, size, quality_min, quality_max
+            )
+        count = self.count_free(self.free_ways, index, size, quality_min, quality_max)
+        if not guarded:
+            count -= self.count_free(
+                self.unguarded_ways, index, size, quality_min, quality_max
+            )
+        return count
+
+    def unrank(self, stratum: Stratum, rank: int) -> Tuple[int, ...]:
+        """The recipe with the given rank in the stratum, counting in the same order as `iter_recipes`."""
+        quality_ranges = self.context.quality_ranges
+        pool_pickups = [
+            pickup_id for pickup_id, count in stratum.pool_counts for _ in range(count)
+        ]
+        pool_quality = sum(PICKUP_LIST[pickup_id].quality for pickup_id in pool_pickups)
+        # The quality sum has to fall in the band, and 5 less than it in the lowered band.
+        quality_min = -math.inf
+        quality_max = math.inf
+        for band, offset in zip(stratum.table_key[:2], (0, 5)):
+            if band > 0:
+                quality_min = max(quality_min, quality_ranges[band][0] + offset)
+            if band + 1 < len(quality_ranges):
+                quality_max = min(quality_max, quality_ranges[band + 1][0] - 1 + offset)
+        quality_min -= pool_quality
+        quality_max -= pool_quality
+
+        free = []
+        remaining = RECIPE_SIZE - len(pool_pickups)
+        guarded = False
+        for index, pickup_id in enumerate(self.free_pickups):
+            quality = PICKUP_LIST[pickup_id].quality
+            limit = self.get_free_limit(pickup_id, stratum.has_guard)
+            is_guard = pickup_id in POOL_26_GUARD_PICKUPS
+            for count in range(min(limit, remaining), -1, -1):
+                ways = self.count_completions(
+                    stratum,
+                    guarded or (is_guard and count > 0),
+                    index + 1,
+                    remaining - count,
+                    quality_min - count * quality,
+                    quality_max - count * quality,
+                )
+                if rank < ways:
+                    break
+                rank -= ways
+            free.extend([pickup_id] * count)
+            guarded = guarded or (is_guard and count > 0)
+            remaining -= count
+            quality_min -= count * quality
+            quality_max -= count * quality
+        return tuple(sorted(pool_pickups + free))
+
+    def add_result(self, result: CraftedItem) -> None:
+        if result.item_id not in self.found and (
+            self.item_ids is None or result.item_id in self.item_ids
+        ):
+            self.found[result.item_id] = result
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.queue
+
+    def sample(self, count: int) -> int:
+        """Evaluate up to `count` more recipes, returning how many were evaluated."""
+        evaluated = 0
+        while evaluated < count and self.queue:
+            _, index = heapq.heappop(self.queue)
+            stratum = self.strata[index]
+            recipe = self.unrank(stratum, stratum.next_rank())
+            self.add_result(
+                self.context.get_item(recipe, self.seed, self.unlocked_mask)
+            )
+            if not stratum.exhausted:
+                heapq.heappush(
+                    self.queue, ((stratum.sampled + 1) / stratum.count, index)
+                )
+            evaluated += 1
+        self.evaluated += evaluated
+        return evaluated
+
+    def run(self, time_limit: float) -> None:
+        """Keep sampling for `time_limit` seconds, or until every recipe has been evaluated. Can be called again to refine the result."""
+        end_time = time.monotonic() + time_limit
+        while self.queue and time.monotonic() < end_time:
+            self.sample(SAMPLE_BATCH_SIZE)
+
+    def get_miss_chances(self, item_ids: Iterable[int]) -> Dict[int, float]:
+        """
+        The estimated chance that each item (which hasn't been found) is crafted by one of the recipes which haven't
+        been sampled yet.
+
+        Each unsampled recipe crafts an item with about the chance worked out by `get_outcome_distribution` for
+        its weight table, treating the seed as random, and recipes are treated as independent. Found items, and
+        every item once sampling is exhausted, have a miss chance of 0.
+        """
+        missing = {item_id for item_id in item_ids if item_id not in self.found}
+        log_hit_chances = {item_id: 0.0 for item_id in missing}
+        for stratum in self.strata:
+            if stratum.exhausted or not missing:
+                continue
+            unsampled = stratum.count - stratum.sampled
+            for item_id, chance in self.get_table_chances(
+                stratum.table_key, missing
+            ).items():
+                if chance >= 1:
+                    log_hit_chances[item_id] = -math.inf
+                else:
+                    log_hit_chances[item_id] += unsampled * math.log1p(-chance)
+        return {
+            item_id: 0.0
+            if item_id not in missing
+            else max(0.0, -math.expm1(log_hit_chances[item_id]))
+            for item_id in item_ids
+        }
+
+    def get_table_chances(self, table_key: tuple, item_ids: set) -> Dict[int, float]:
+        # Like `get_table_distribution`, but summed from each pool's items without building the weight table.
+        band, lowered_band, pool_weights = table_key
+        item_weights = defaultdict(int)
+        all_weight = 0
+        accepted_weight = 0.0
+        for pool_id, pool_weight in pool_weights:
+            if pool_weight <= 0:
+                continue
+            items, pool_all_weight, pool_accepted_weight = self.get_band_items(
+                pool_id,
+                lowered_band
+                if self.context.item_pools[pool_id].lowered_quality
+                else band,
+            )
+            all_weight += pool_weight * pool_all_weight
+            accepted_weight += pool_weight * pool_accepted_weight
+            for item_id, item_weight in items:
+                if item_id in item_ids:
+                    item_weights[item_id] += pool_weight * item_weight
+        if accepted_weight <= 0:
+            return {BREAKFAST_ITEM_ID: 1.0} if BREAKFAST_ITEM_ID in item_ids else {}
+
+        accept_chance = accepted_weight / all_weight
+        fail_chance = (1 - accept_chance) ** MAX_DRAWS
+        scale = (1 - fail_chance) / accept_chance
+        chances = {
+            item_id: item_weight
+            / all_weight
+            * get_acceptance_chance(
+                self.context, self.context.items[item_id], self.unlocked_mask
+            )
+            * scale
+            for item_id, item_weight in item_weights.items()
+        }
+        if BREAKFAST_ITEM_ID in item_ids:
+            chances[BREAKFAST_ITEM_ID] = (
+                chances.get(BREAKFAST_ITEM_ID, 0.0) + fail_chance
+            )
+        return chances
+
+    def get_band_items(
+        self, pool_id: int, band: int
+    ) -> Tuple[List[Tuple[int, int]], int, float]:
+        # A pool's items in a quality band, with their total weight, and total weight times the chance of being kept.
+        cache_key = (pool_id, band)
+        if cache_key not in self.band_items:
+            item_pool = self.context.item_pools[pool_id]
+            _, quality_min, quality_max = self.context.quality_ranges[band]
+            items = [
+                (item_id, item_weight)
+                for quality in range(quality_min, quality_max + 1)
+                for item_id, item_weight in item_pool.quality_lists[quality]
+                if self.context.weight_available[item_id]
+            ]
+            self.band_items[cache_key] = (
+                items,
+                sum(item_weight for _, item_weight in items),
+                sum(
+                    item_weight
+                    * get_acceptance_chance(
+                        self.context, self.context.items[item_id], self.unlocked_mask
+                    )
+                    for item_id, item_weight in items
+                ),
+            )
+        return self.band_items[cache_key]
@@ -0,0 +1,169 @@
+import heapq
+import itertools
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .context import ALL_UNLOCKED, CraftingContext
+from .isaac_pickups import PICKUP_LIST
+from .multisets import get_pickup_limits
+from .predicates import RecipePruner
+
+
+class CostedRecipe(NamedTuple):
+    item_id: int
+    pickups: Sequence[int]
+    quality_sum: int
+    cost: float
+
+
+def get_default_pickup_costs() -> Dict[int, float]:
+    # Without a cost model, the cheapest recipes are the ones with the lowest quality sum.
+    return {
+        pickup.pickup_id: pickup.quality for pickup in PICKUP_LIST if pickup is not None
+    }
+
+
+class CheapestRecipeSearch:
+    """
+    Best-first search over the multiset tree for the cheapest recipes crafting any of the given items.
+
+    Each node covers every recipe which starts with a prefix of pickups (ordered by cost) and continues with
+    pickups from a given index onwards, and is keyed by the cheapest cost any of those recipes could have.
+    Complete recipes come off the heap in order of cost, so the first `k` matches for an item are its `k` cheapest,
+    and nothing more has to be evaluated once every item has them. Nodes which can't craft any of the items are
+    dropped without being expanded, so an uncraftable item doesn't walk the whole tree.
+    """
+
+    def __init__(
+        self,
+        context: CraftingContext,
+        seed: int,
+        pickup_list: List[int],
+        item_ids: Iterable[int],
+        pickup_costs: Optional[Dict[int, float]] = None,
+        inventory: Optional[Dict[int, int]] = None,
+        k: Optional[int] = None,
+        unlocked_mask: int = ALL_UNLOCKED,
+    ):
+        if pickup_costs is None:
+            pickup_costs = get_default_pickup_costs()
+        limits = get_pickup_limits(pickup_list, inventory)
+        costs = {pickup_id: pickup_costs.get(pickup_id, 0) for pickup_id in limits}
+        if any(cost < 0 for cost in costs.values()):
+            raise ValueError("Pickup costs must not be negative.")
+
+        self.context = context
+        self.seed = seed
+        self.item_ids = set(item_ids)
+        self.k = k
+        self.unlocked_mask = unlocked_mask
+        self.pickups = sorted(
+            costs, key=lambda pickup_id: (costs[pickup_id], pickup_id)
+        )
+        self.costs = [costs[pickup_id] for pickup_id in self.pickups]
+        self.limits = [limits[pickup_id] for pickup_id in self.pickups]
+        self.pruner = RecipePruner(context, self.item_ids, limits)
+        self.evaluated = 0
+
+    def get_lower_bound(self, cost: float, prefix_length: int, index: int) -> float:
+        # Pickups are sorted by cost, so the cheapest way to fill the bag is with the pickup at `index`.
+        # This ignores the inventory, which can only make recipes more expensive.
+        return cost + (8 - prefix_length) * self.costs[index]
+
+    def can_add(self, prefix: Tuple[int, ...], index: int) -> bool:
+        # The prefix is sorted, so any copies of the pickup at `index` are at the end of it.
+        count = 0
+        for i in reversed(prefix):
+            if i != index:
+                break
+            count += 1
+        return count < self.limits[index]
+
+    def __iter__(self) -> Iterator[CostedRecipe]:
+        remaining = set(self.item_ids)
+        recipe_counts = defaultdict(int)
+        if not self.pickups or self.k == 0:
+            return
+        counter = itertools.count()
+        heap = [(self.get_lower_bound(0, 0, 0), next(counter), 0, (), 0)]
+        while heap and remaining:
+            _, _, cost, prefix, index = heapq.heappop(heap)
+
+            if len(prefix) == 8:
+                self.evaluated += 1
+                recipe = sorted(self.pickups[i] for i in prefix)
+                _, item_id, quality_sum = self.context.get_item(
+                    recipe, self.seed, self.unlocked_mask
+                )
+                if item_id in remaining:
+                    recipe_counts[item_id] += 1
+                    yield CostedRecipe(item_id, recipe, quality_sum, cost)
+                    if self.k is not None and recipe_counts[item_id] >= self.k:
+                        remaining.discard(item_id)
+                continue
+
+            if not self.pruner.can_complete(
+                [self.pickups[i] for i in prefix],
+                self.pickups[index:],
+                8 - len(prefix),
+            ):
+                self.pruner.pruned += 1
+                continue
+
+            # Descend into recipes which use the pickup at `index` next...
+            if self.can_add(prefix, index):
+                child_cost = cost + self.costs[index]
+                child_prefix = prefix + (index,)
+                if len(child_prefix) == 8:
+                    heapq.heappush(
+                        heap,
+                        (child_cost, next(counter), child_cost, child_prefix, index),
+                    )
+                else:
+                    heapq.heappush(
+                        heap,
+                        (
+                            self.get_lower_bound(child_cost, len(child_prefix), index),
+                            next(counter),
+                            child_cost,
+                            child_prefix,
+                            index,
+                        ),
+                    )
+            # ...and separately into recipes which skip it.
+            if index + 1 < len(self.pickups):
+                heapq.heappush(
+                    heap,
+                    (
+                        self.get_lower_bound(cost, len(prefix), index + 1),
+                        next(counter),
+                        cost,
+                        prefix,
+                        index + 1,
+                    ),
+                )
+
+
+def find_cheapest_recipes(
+    context: CraftingContext,
+    seed: int,
+    pickup_list: List[int],
+    item_id: int,
+    k: int,
+    pickup_costs: Optional[Dict[int, float]] = None,
+    inventory: Optional[Dict[int, int]] = None,
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> List[CostedRecipe]:
+    """Return up to `k` of the cheapest recipes which craft the item, cheapest first."""
+    return list(
+        CheapestRecipeSearch(
+            context,
+            seed,
+            pickup_list,
+            [item_id],
+            pickup_costs,
+            inventory,
+            k,
+            unlocked_mask,
+        )
+    )
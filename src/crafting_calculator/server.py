@@ -0,0 +1,790 @@
+import asyncio
+import itertools
+import json
+import math
+import threading
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .batch import BatchRequest, parse_request_fields
+from .cache import DEFAULT_CACHE_SIZE, ResultCache, get_request_key
+from .calculator import (
+    get_item_targets,
+    iter_items_for_pickups,
+    iter_recipes_for_items,
+    iter_uncraftable_items,
+)
+from .config import config
+from .context import CraftingContext
+from .engine import SearchStats, evaluate_recipes, iter_chunks
+from .jobs import DEFAULT_MAX_JOBS, JobCancelled, JobManager
+from .isaac_pickups import PICKUP_LIST
+from .isaac_rng import string_to_seed
+from .multisets import RECIPE_SIZE
+from .output import item_to_dict, recipe_to_dict
+from .predicates import ItemPredicate, filter_items
+from .utilities import parse_game_version_string
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+# Requests with bigger bodies are rejected rather than read into memory.
+MAX_BODY_SIZE = 1 << 20
+
+# The queries which enumerate recipes, and so are run in the process pool.
+QUERY_COMMANDS = ["find-pickup-recipes", "find-item-recipes", "find-uncraftable-items"]
+
+# How many recipes `/enumerate` sends for each item, like the web frontend's worker (docs/workwork.js).
+MAX_RECIPES_PER_ITEM = 20
+
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+# How many chunks of recipes a stream keeps in flight, and how much output it buffers before waiting for the client.
+STREAM_MAX_PENDING = 2
+STREAM_BUFFER_SIZE = 1 << 16
+
+# Held while a query runs, as queries set the process-wide config to their flags.
+QUERY_LOCK = threading.Lock()
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class StreamingResponse:
+    """A response which is sent in chunks as `messages` yields them, as NDJSON or server-sent events."""
+
+    def __init__(self, messages: AsyncIterator[Any], stream_format: str = "ndjson"):
+        self.messages = messages
+        self.stream_format = stream_format
+
+    @property
+    def content_type(self) -> str:
+        return STREAM_FORMATS[self.stream_format]
+
+    def encode(self, message: Any) -> bytes:
+        if self.stream_format == "sse":
+            return f"data: {json.dumps(message)}\n\n".encode("utf-8")
+        return (json.dumps(message) + "\n").encode("utf-8")
+
+
+def get_int_option(data: Dict[str, Any], name: str) -> Optional[int]:
+    value = data.get(name)
+    if value is not None and (
+        not isinstance(value, int) or isinstance(value, bool) or value < 0
+    ):
+        raise ValueError(f"{name} must be a non-negative integer.")
+    return value
+
+
+def parse_query(command: str, data: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Validate a query body, e.g. `{"seed": "28RYNMMM", "pickups": [1, 2, 8, 12], "items": [45, "quality:4"]}`, into the
+    arguments for `run_query`. Besides the fields `batch` accepts, queries take `pickups` or `inventory` (pickup ID
+    to count), and optionally `items` (required for find-item-recipes), `where`, `max_recipes`, `stop_after`,
+    `stop_when_stable` and `grouped`, which work like the command line options.
+    """
+    _, game_version, flags_key, unlocked_mask = parse_request_fields(data)
+
+    inventory = data.get("inventory")
+    if inventory is not None:
+        if not isinstance(inventory, dict):
+            raise ValueError("Inventory must be a JSON object of pickup ID to count.")
+        try:
+            inventory = {
+                int(pickup_id): count for pickup_id, count in inventory.items()
+            }
+        except (TypeError, ValueError):
+            raise ValueError("Inventory must be a JSON object of pickup ID to count.")
+        for count in inventory.values():
+            if not isinstance(count, int) or isinstance(count, bool) or count < 0:
+                raise ValueError(f"Invalid pickup count {count!r}.")
+    pickups = data.get("pickups", None if inventory is None else sorted(inventory))
+    if not isinstance(pickups, list) or not pickups:
+        raise ValueError("You must provide pickup IDs.")
+    for pickup_id in list(pickups) + list(inventory or []):
+        if (
+            not isinstance(pickup_id, int)
+            or isinstance(pickup_id, bool)
+            or not 0 < pickup_id < len(PICKUP_LIST)
+        ):
+            raise ValueError(f"Invalid pickup ID {pickup_id!r}.")
+
+    items = data.get("items")
+    if command == "find-item-recipes" and not items:
+        raise ValueError("You must provide items to find recipes for.")
+    if items is not None and not isinstance(items, list):
+        raise ValueError("Items must be a list of item IDs, quality:N or tag:NAME.")
+    where = data.get("where")
+    if where is not None and not (
+        isinstance(where, list)
+        and all(isinstance(condition, str) for condition in where)
+    ):
+        raise ValueError("Where must be a list of conditions.")
+
+    options = {
+        name: get_int_option(data, name)
+        for name in ["max_recipes", "stop_after", "stop_when_stable"]
+    }
+    options["grouped"] = bool(data.get("grouped", False))
+    return (
+        command,
+        game_version,
+        flags_key,
+        str(data.get("seed")),
+        sorted(set(pickups)),
+        inventory,
+        items,
+        where,
+        options,
+        unlocked_mask,
+    )
+
+
+def parse_enumeration(
+    data: Dict[str, Any]
+) -> Tuple[int, str, Tuple[str, ...], int, List[int], str]:
+    """
+    Validate an `/enumerate` request, which takes the same fields as the web frontend's worker: `seed`,
+    `components` (the pickup IDs to combine, as a list or comma separated) and `version` (the frontend's
+    location hash, e.g. `#pc/v1.7.9b`, or `game_version`), and optionally `flags`, `unlocked` and
+    `format` (ndjson or sse). Returns the seed, game version, flags key, unlocked bitmask, components and format.
+    """
+    data = dict(data)
+    if "version" in data and "game_version" not in data:
+        data["game_version"] = str(data["version"]).lstrip("#")
+    seed, game_version, flags_key, unlocked_mask = parse_request_fields(data)
+
+    components = data.get("components")
+    if isinstance(components, str):
+        try:
+            components = [
+                int(pickup_id) for pickup_id in components.split(",") if pickup_id
+            ]
+        except ValueError:
+            raise ValueError("Components must be a list of pickup IDs.")
+    if not isinstance(components, list) or not components:
+        raise ValueError("You must provide components.")
+    for pickup_id in components:
+        if (
+            not isinstance(pickup_id, int)
+            or isinstance(pickup_id, bool)
+            or not 0 < pickup_id < len(PICKUP_LIST)
+        ):
+            raise ValueError(f"Invalid pickup ID {pickup_id!r}.")
+    if len(set(components)) != len(components):
+        raise ValueError("Components must not repeat.")
+
+    stream_format = data.get("format", "ndjson")
+    if stream_format not in STREAM_FORMATS:
+        raise ValueError(f"Format must be one of {', '.join(STREAM_FORMATS)}.")
+    return seed, game_version, flags_key, unlocked_mask, components, stream_format
+
+
+def get_query_key(args: Tuple[Any, ...]) -> str:
+    """A hash of the arguments to `run_query`, which is the same for queries which only differ in how they're written."""
+    (
+        command,
+        game_version,
+        flags_key,
+        seed_string,
+        pickup_list,
+        inventory,
+        items,
+        where,
+        options,
+        unlocked_mask,
+    ) = args
+    return get_request_key(
+        [
+            command,
+            game_version,
+            list(flags_key),
+            string_to_seed(seed_string),
+            pickup_list,
+            None if inventory is None else sorted(inventory.items()),
+            None if items is None else sorted(str(item) for item in items),
+            None if where is None else sorted(where),
+            options,
+            unlocked_mask,
+        ]
+    )
+
+
+def iter_query_results(
+    command: str,
+    game_version: str,
+    flags_key: Tuple[str, ...],
+    seed_string: str,
+    pickup_list: List[int],
+    inventory: Optional[Dict[int, int]],
+    items: Optional[List[Any]],
+    where: Optional[List[str]],
+    options: Dict[str, Any],
+    unlocked_mask: int,
+    stats: SearchStats,
+) -> Iterator[Dict[str, Any]]:
+    """Run one of the `find_*` queries in one of the server's workers, yielding its results as they are found."""
+    platform, version = parse_game_version_string(game_version)
+    # The queries read the flags from the global config, so queries run on threads of the same process take turns.
+    with QUERY_LOCK:
+        previous_config = dict(config)
+        config.update({flag: flag in flags_key for flag in config})
+        try:
+            yield from iter_query_results_with_config(
+                command,
+                platform,
+                version,
+                seed_string,
+                pickup_list,
+                inventory,
+                items,
+                where,
+                options,
+                unlocked_mask,
+                stats,
+            )
+        finally:
+            config.update(previous_config)
+
+
+def iter_query_results_with_config(
+    command: str,
+    platform: str,
+    version: str,
+    seed_string: str,
+    pickup_list: List[int],
+    inventory: Optional[Dict[int, int]],
+    items: Optional[List[Any]],
+    where: Optional[List[str]],
+    options: Dict[str, Any],
+    unlocked_mask: int,
+    stats: SearchStats,
+) -> Iterator[Dict[str, Any]]:
+    """The results of a query (see `iter_query_results`), once the global config is set to its flags."""
+    context = CraftingContext.get(platform, version)
+
+    item_ids = None
+    if items:
+        item_ids = get_item_targets(platform, version, items)
+    if where:
+        item_ids = filter_items(
+            context, [ItemPredicate.parse(condition) for condition in where], item_ids
+        )
+
+    # The worker is already one of the server's processes, so the recipes are evaluated here rather than in another pool.
+    with ThreadPoolExecutor(1) as executor:
+        if command == "find-uncraftable-items":
+            uncraftable_items = iter_uncraftable_items(
+                platform,
+                version,
+                seed_string,
+                pickup_list,
+                executor,
+                inventory,
+                item_ids,
+                options["stop_when_stable"],
+                stats,
+                unlocked_mask,
+                options["grouped"],
+            )
+            for item_id in uncraftable_items:
+                yield item_to_dict(context.items[item_id])
+        else:
+            if command == "find-pickup-recipes":
+                matches = iter_items_for_pickups(
+                    platform,
+                    version,
+                    seed_string,
+                    pickup_list,
+                    executor,
+                    inventory,
+                    item_ids,
+                    options["stop_after"],
+                    options["stop_when_stable"],
+                    stats,
+                    unlocked_mask,
+                    options["grouped"],
+                )
+            else:
+                matches = iter_recipes_for_items(
+                    platform,
+                    version,
+                    seed_string,
+                    pickup_list,
+                    item_ids,
+                    executor,
+                    inventory,
+                    options["max_recipes"],
+                    options["stop_after"],
+                    stats,
+                    unlocked_mask,
+                    options["grouped"],
+                )
+            for item_id, pickups, quality_sum in matches:
+                yield recipe_to_dict(context.items[item_id], pickups, quality_sum)
+
+
+def get_stats_dict(stats: SearchStats) -> Dict[str, Any]:
+    return {
+        "evaluated": stats.evaluated,
+        "total": stats.total,
+        "stop_reason": stats.stop_reason,
+    }
+
+
+def run_query(*args: Any) -> Dict[str, Any]:
+    """Run one of the `find_*` queries (see `iter_query_results`), returning its results and search stats."""
+    stats = SearchStats()
+    results = list(iter_query_results(*args, stats))
+    return {"results": results, **get_stats_dict(stats)}
+
+
+def run_query_job(*args: Any) -> Dict[str, Any]:
+    """
+    Run a query as a `Job`, sending its progress and results to the job's channel every `DEFAULT_PROGRESS_INTERVAL`
+    recipes, and stopping once the job is cancelled. Returns the search stats.
+    """
+    *args, channel, cancel_event = args
+    pending = []
+
+    def send_progress(stats: SearchStats) -> None:
+        if pending:
+            channel.put(("results", pending[:]))
+            pending.clear()
+        channel.put(("progress", stats.evaluated, stats.total))
+        if cancel_event.is_set():
+            raise JobCancelled()
+
+    stats = SearchStats(send_progress)
+    try:
+        for result in iter_query_results(*args, stats):
+            pending.append(result)
+    except JobCancelled:
+        stats.stop("cancelled")
+    stats.progress_callback = None
+    if pending:
+        channel.put(("results", pending))
+    channel.put(("progress", stats.evaluated, stats.total))
+    return get_stats_dict(stats)
+
+
+def get_content_length(headers: Dict[str, str]) -> Optional[int]:
+    """The request's body length, or None if its Content-Length header isn't a non-negative integer."""
+    value = headers.get("content-length", "0")
+    if not (value.isascii() and value.isdigit()):
+        return None
+    return int(value)
+
+
+def get_response_head(
+    status: HTTPStatus, content_type: str, keep_alive: bool, length_header: str
+) -> bytes:
+    return (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"{length_header}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "Access-Control-Allow-Origin: *\r\n"
+        "Access-Control-Allow-Methods: GET, POST, DELETE, OPTIONS\r\n"
+        "Access-Control-Allow-Headers: Content-Type\r\n"
+        "\r\n"
+    ).encode("latin-1")
+
+
+class CraftingServer:
+    """
+    An HTTP/JSON server for crafting queries, which keeps a context loaded for each game version and set of flags.
+
+    `POST /craft` takes a single recipe lookup, in the same format as a `batch` line, and is answered on the event
+    loop from the warm context. `POST /find-pickup-recipes`, `/find-item-recipes` and `/find-uncraftable-items` take a
+    query (see `parse_query`) and enumerate recipes in a process pool, so they don't hold up lookups. With a `cache`,
+    query results are cached, and identical queries which arrive together share one computation. `GET /health`
+    reports whether the server is up, and `GET /stats` reports the cache and job counters.
+
+    Queries which take too long to wait for can be submitted as jobs instead, with `POST /jobs/<query>` (e.g.
+    `/jobs/find-uncraftable-items`), which returns a job ID straight away. `GET /jobs/<id>` then reports the job's
+    progress, `GET /jobs/<id>/results?offset=N` returns the results found so far (from the Nth), and
+    `DELETE /jobs/<id>` cancels it. Jobs are queued fairly by the body's `client` field (or the client's address)
+    and only `jobs.max_running` of them run at once.
+
+    `/enumerate` streams every recipe from a set of components for the web frontend, grouped by item like its
+    worker (see `iter_enumeration`), as chunked NDJSON or server-sent events.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        cache: Optional[ResultCache] = None,
+        jobs: Optional[JobManager] = None,
+    ):
+        self.executor = executor
+        self.cache = cache
+        self.jobs = JobManager(executor) if jobs is None else jobs
+        self.warm_contexts = set()
+
+    async def get_context(
+        self, game_version: str, flags_key: Tuple[str, ...]
+    ) -> CraftingContext:
+        platform, version = parse_game_version_string(game_version)
+        if (platform, version, flags_key) not in self.warm_contexts:
+            # Loading game data takes a while, so do it off the event loop the first time.
+            await asyncio.get_running_loop().run_in_executor(
+                None, CraftingContext.load, platform, version, flags_key
+            )
+            self.warm_contexts.add((platform, version, flags_key))
+        return CraftingContext.load(platform, version, flags_key)
+
+    async def preload(self, game_versions: Iterable[str]) -> None:
+        for game_version in game_versions:
+            await self.get_context(game_version, ())
+
+    async def craft(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        request = BatchRequest.from_dict(0, data)
+        context = await self.get_context(request.game_version, request.flags_key)
+        _, item_id, quality_sum = context.get_item(
+            request.pickups, request.seed, request.unlocked_mask
+        )
+        output = recipe_to_dict(context.items[item_id], request.pickups, quality_sum)
+        if request.request_id is not None:
+            output["id"] = request.request_id
+        return output
+
+    async def query(self, command: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        args = parse_query(command, data)
+
+        async def compute() -> Dict[str, Any]:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, run_query, *args
+            )
+
+        if self.cache is None:
+            return await compute()
+        return await self.cache.get_or_compute(get_query_key(args), compute)
+
+    async def iter_enumeration(
+        self,
+        seed: int,
+        game_version: str,
+        flags_key: Tuple[str, ...],
+        unlocked_mask: int,
+        components: List[int],
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Evaluate every recipe from the components, in the same order as the web frontend's worker, yielding
+        `{"total": recipe count}`, then `{"x": item ID, "y": [recipes]}` with the new recipes for each item as each
+        chunk is evaluated (up to `MAX_RECIPES_PER_ITEM` per item in all), then `{"total": ..., "time": ms}`.
+        """
+        context = await self.get_context(game_version, flags_key)
+        loop = asyncio.get_running_loop()
+        start_time = time.monotonic()
+        total = math.comb(len(components) + RECIPE_SIZE - 1, RECIPE_SIZE)
+        yield {"total": total}
+
+        chunks = iter_chunks(
+            itertools.combinations_with_replacement(components, RECIPE_SIZE)
+        )
+        pending = deque()
+        recipe_counts = {}
+        try:
+            while True:
+                # Keep a few chunks in flight, so the stream keeps up without taking over the whole pool.
+                while len(pending) < STREAM_MAX_PENDING:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending.append(
+                        loop.run_in_executor(
+                            self.executor,
+                            evaluate_recipes,
+                            context.platform,
+                            context.game_version,
+                            flags_key,
+                            seed,
+                            chunk,
+                            unlocked_mask,
+                        )
+                    )
+                if not pending:
+                    break
+
+                new_recipes = {}
+                for recipe, item_id, _ in await pending.popleft():
+                    count = recipe_counts.get(item_id, 0)
+                    if count < MAX_RECIPES_PER_ITEM:
+                        recipe_counts[item_id] = count + 1
+                        new_recipes.setdefault(item_id, []).append(list(recipe))
+                for item_id, recipes in new_recipes.items():
+                    yield {"x": item_id, "y": recipes}
+        finally:
+            for future in pending:
+                future.cancel()
+        yield {"total": total, "time": round((time.monotonic() - start_time) * 1000, 1)}
+
+    def submit_job(
+        self, command: str, data: Dict[str, Any], client: str
+    ) -> Dict[str, Any]:
+        args = parse_query(command, data)
+        client = data.get("client", client)
+        if not isinstance(client, str):
+            raise ValueError("Client must be a string.")
+        return self.jobs.submit(run_query_job, args, client).to_dict()
+
+    def route_job(self, method: str, path: str, params: Dict[str, str]) -> Any:
+        job_id, _, action = path[len("/jobs/") :].partition("/")
+        if action not in ["", "results"]:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown path {path!r}.")
+        try:
+            job = self.jobs.get(job_id)
+        except KeyError:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown job {job_id!r}.")
+
+        if action == "results":
+            if method != "GET":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET.")
+            try:
+                offset = max(0, int(params.get("offset", 0)))
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Offset must be an integer.")
+            output = job.to_dict()
+            output["results"] = job.results[offset:]
+            return output
+        if method == "DELETE":
+            return self.jobs.cancel(job_id).to_dict()
+        if method != "GET":
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET or DELETE.")
+        return job.to_dict()
+
+    async def route(
+        self,
+        method: str,
+        path: str,
+        body: bytes,
+        params: Optional[Dict[str, str]] = None,
+        client: str = "",
+    ) -> Any:
+        if path == "/health":
+            if method != "GET":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET.")
+            return {"status": "ok"}
+        if path == "/stats":
+            if method != "GET":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET.")
+            return {
+                "cache": None if self.cache is None else self.cache.get_stats(),
+                "jobs": self.jobs.get_stats(),
+            }
+        if path == "/jobs":
+            if method != "GET":
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET.")
+            return {"jobs": [job.to_dict() for job in self.jobs.list_jobs()]}
+
+        if path == "/enumerate":
+            if method not in ["GET", "POST"]:
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET or POST.")
+            try:
+                data = (
+                    json.loads(body or b"{}")
+                    if method == "POST"
+                    else dict(params or {})
+                )
+                if not isinstance(data, dict):
+                    raise ValueError("Request must be a JSON object.")
+                *args, stream_format = parse_enumeration(data)
+            except ValueError as e:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+            return StreamingResponse(self.iter_enumeration(*args), stream_format)
+
+        is_job = path.startswith("/jobs/")
+        if is_job and path[len("/jobs/") :] not in QUERY_COMMANDS:
+            return self.route_job(method, path, params or {})
+        command = path[len("/jobs/") :] if is_job else path.lstrip("/")
+        if command not in QUERY_COMMANDS and (is_job or command != "craft"):
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown path {path!r}.")
+        if method != "POST":
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST.")
+        try:
+            data = json.loads(body or b"{}")
+            if not isinstance(data, dict):
+                raise ValueError("Request must be a JSON object.")
+            if is_job:
+                return self.submit_job(command, data, client)
+            if command == "craft":
+                return await self.craft(data)
+            return await self.query(command, data)
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+
+    async def write_stream(
+        self,
+        writer: asyncio.StreamWriter,
+        response: StreamingResponse,
+        keep_alive: bool,
+    ) -> None:
+        """Send a streaming response with chunked encoding, one chunk per batch of messages which are ready together."""
+        writer.write(
+            get_response_head(
+                HTTPStatus.OK,
+                response.content_type,
+                keep_alive,
+                "Transfer-Encoding: chunked",
+            )
+        )
+        messages = response.messages
+        try:
+            while True:
+                try:
+                    payload = response.encode(await messages.__anext__())
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    # The status has already been sent, so errors are reported in the stream.
+                    payload = response.encode({"error": f"{type(e).__name__}: {e}"})
+                    writer.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+                    break
+                writer.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+                if writer.is_closing():
+                    # The client has gone, and writes to it are dropped, so stop calculating the rest of the stream.
+                    return
+                # Only wait for the client when the socket's buffer fills up, so small messages go out together.
+                if writer.transport.get_write_buffer_size() > STREAM_BUFFER_SIZE:
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            await messages.aclose()
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Answer HTTP/1.1 requests on a connection until the client closes it."""
+        peer = writer.get_extra_info("peername")
+        client = str(peer[0]) if isinstance(peer, tuple) else ""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    parts = request_line.decode("latin-1").split()
+                    if len(parts) != 3:
+                        raise HTTPError(
+                            HTTPStatus.BAD_REQUEST, "Malformed request line."
+                        )
+                    method, path, _ = parts
+                    content_length = get_content_length(headers)
+                    if content_length is None:
+                        # Without a length, there's no telling where the next request starts.
+                        keep_alive = False
+                        raise HTTPError(
+                            HTTPStatus.BAD_REQUEST, "Malformed Content-Length header."
+                        )
+                    if content_length > MAX_BODY_SIZE:
+                        keep_alive = False
+                        raise HTTPError(
+                            HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            "Request body is too large.",
+                        )
+                    body = (
+                        await reader.readexactly(content_length)
+                        if content_length > 0
+                        else b""
+                    )
+                    path, _, query_string = path.partition("?")
+                    params = dict(urllib.parse.parse_qsl(query_string))
+                    if method == "OPTIONS":
+                        # A CORS preflight, from a page served elsewhere (e.g. the web frontend).
+                        status, response = HTTPStatus.NO_CONTENT, None
+                    else:
+                        status, response = HTTPStatus.OK, await self.route(
+                            method, path, body, params, client
+                        )
+                except HTTPError as e:
+                    status, response = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, response = HTTPStatus.INTERNAL_SERVER_ERROR, {
+                        "error": f"{type(e).__name__}: {e}"
+                    }
+
+                if isinstance(response, StreamingResponse):
+                    await self.write_stream(writer, response, keep_alive)
+                else:
+                    payload = (
+                        b""
+                        if response is None
+                        else json.dumps(response).encode("utf-8")
+                    )
+                    writer.write(
+                        get_response_head(
+                            status,
+                            "application/json",
+                            keep_alive,
+                            f"Content-Length: {len(payload)}",
+                        )
+                        + payload
+                    )
+                    await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    workers: Optional[int] = None,
+    preload: Iterable[str] = (),
+    cache_size: int = DEFAULT_CACHE_SIZE,
+    cache_directory: Optional[str] = None,
+    max_jobs: int = DEFAULT_MAX_JOBS,
+) -> None:
+    """
+    Serve crafting queries until interrupted, with `workers` processes for queries which enumerate recipes, of
+    which at most `max_jobs` run jobs at a time. The last `cache_size` query results are cached in memory (none
+    if 0), and in `cache_directory` if it's given.
+    """
+
+    async def main() -> None:
+        with ProcessPoolExecutor(workers) as executor:
+            cache = (
+                ResultCache(cache_size, cache_directory)
+                if cache_size > 0 or cache_directory is not None
+                else None
+            )
+            jobs = JobManager(executor, max_jobs)
+            server = CraftingServer(executor, cache, jobs)
+            try:
+                await server.preload(preload)
+                print(f"Serving crafting queries on http://{host}:{port}")
+                await server.serve(host, port)
+            finally:
+                jobs.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,61 @@
+import itertools
+import math
+from typing import Iterable, Iterator, List, Sequence, Tuple, TypeVar
+
+from .multisets import RECIPE_SIZE, get_recipe_rank
+
+T = TypeVar("T")
+
+# A shard as (index, count), with 0 <= index < count.
+Shard = Tuple[int, int]
+
+
+def parse_shard(value: str) -> Shard:
+    """Parse a shard written as `I/N`, the I-th (counting from 0) of N shards."""
+    index, _, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Expected a shard like 0/4, got {value!r}.")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(
+            f"Shard {value!r} is out of range: it must be I/N with 0 <= I < N."
+        )
+    return index, count
+
+
+def get_shard_range(total: int, shard: Shard) -> Tuple[int, int]:
+    """The start and end of a shard's part of `total` things, split into nearly equal contiguous parts."""
+    index, count = shard
+    return total * index // count, total * (index + 1) // count
+
+
+def get_shard_items(items: Sequence[T], shard: Shard) -> List[T]:
+    start, stop = get_shard_range(len(items), shard)
+    return list(items[start:stop])
+
+
+def iter_shard_recipes(
+    recipes: Iterable[Sequence[int]],
+    pickup_list: List[int],
+    shard: Shard,
+    unfiltered: bool = False,
+) -> Iterator[Sequence[int]]:
+    """
+    The recipes in a shard, split by their position in the enumeration of every recipe from `pickup_list`, so the
+    shards cover every recipe between them and each keeps enumeration order. With `unfiltered`, `recipes` must be
+    that whole enumeration, and the shard's part of it is skipped to without ranking each recipe.
+    """
+    pickups = sorted(set(pickup_list))
+    total = math.comb(len(pickups) + RECIPE_SIZE - 1, RECIPE_SIZE)
+    start, stop = get_shard_range(total, shard)
+    if unfiltered:
+        return itertools.islice(recipes, start, stop)
+    indexes = {pickup_id: index + 1 for index, pickup_id in enumerate(pickups)}
+    return (
+        recipe
+        for recipe in recipes
+        if start
+        <= get_recipe_rank([indexes[pickup_id] for pickup_id in recipe], len(pickups))
+        < stop
+    )
@@ -0,0 +1,100 @@
+from collections import deque
+from typing import Iterable, Iterator, Optional
+
+from .context import ALL_UNLOCKED, CraftedItem, CraftingContext
+from .isaac_pickups import PICKUP_LIST
+from .multisets import RECIPE_SIZE
+
+
+# How many crafted items to remember by bag contents, as long streams tend to revisit the same bags.
+MAX_CACHED_RESULTS = 65536
+
+# The bag's contents are also kept as a base 9 number with one digit per pickup count, which is cheap to update and hash.
+COUNT_DIGITS = [(RECIPE_SIZE + 1) ** pickup_id for pickup_id in range(len(PICKUP_LIST))]
+
+
+class BagSimulator:
+    """
+    A bag which holds the last 8 pickups added to it, as in game.
+    Pickup counts and the quality sum are updated as pickups are added and evicted, so each craft only has to
+    look up the cached weight table and run the RNG, rather than recount the bag. The item crafted only depends on
+    the bag's contents, so it is also remembered for bags which come round again.
+    """
+
+    def __init__(
+        self, context: CraftingContext, seed: int, unlocked_mask: int = ALL_UNLOCKED
+    ):
+        self.context = context
+        self.seed = seed
+        self.unlocked_mask = unlocked_mask
+        self.pickups = deque()
+        self.pickup_count = [0] * len(PICKUP_LIST)
+        self.quality_sum = 0
+        self.counts_key = 0
+        self.result: Optional[CraftedItem] = None
+        self.cached_items = {}
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.pickups) == RECIPE_SIZE
+
+    def add(self, pickup_id: int) -> Optional[CraftedItem]:
+        """Add a pickup, evicting the oldest one if the bag is full. Returns what the bag would craft, once it is full."""
+        if PICKUP_LIST[pickup_id] is None:
+            raise ValueError(f"Invalid pickup ID {pickup_id!r}.")
+
+        evicted_id = None
+        if len(self.pickups) == RECIPE_SIZE:
+            evicted_id = self.pickups.popleft()
+            self.pickup_count[evicted_id] -= 1
+            self.quality_sum -= PICKUP_LIST[evicted_id].quality
+            self.counts_key -= COUNT_DIGITS[evicted_id]
+        self.pickups.append(pickup_id)
+        self.pickup_count[pickup_id] += 1
+        self.quality_sum += PICKUP_LIST[pickup_id].quality
+        self.counts_key += COUNT_DIGITS[pickup_id]
+
+        if len(self.pickups) < RECIPE_SIZE:
+            return None
+        # Swapping a pickup for another of the same type doesn't change what the bag crafts.
+        if evicted_id == pickup_id and self.result is not None:
+            self.result = self.result._replace(pickups=tuple(self.pickups))
+            return self.result
+
+        pickups = tuple(self.pickups)
+        item_id = self.cached_items.get(self.counts_key)
+        if item_id is None:
+            item_id = self.context.get_item_from_counts(
+                pickups,
+                self.pickup_count,
+                self.quality_sum,
+                self.seed,
+                self.unlocked_mask,
+            ).item_id
+            if len(self.cached_items) >= MAX_CACHED_RESULTS:
+                self.cached_items.clear()
+            self.cached_items[self.counts_key] = item_id
+        self.result = CraftedItem(pickups, item_id, self.quality_sum)
+        return self.result
+
+    def clear(self) -> None:
+        """Empty the bag, as crafting does."""
+        self.pickups.clear()
+        self.pickup_count = [0] * len(PICKUP_LIST)
+        self.quality_sum = 0
+        self.counts_key = 0
+        self.result = None
+
+
+def iter_bag_results(
+    context: CraftingContext,
+    seed: int,
+    pickup_stream: Iterable[int],
+    unlocked_mask: int = ALL_UNLOCKED,
+) -> Iterator[CraftedItem]:
+    """Replay a stream of pickups through the bag, yielding what it would craft after each pickup once it is full."""
+    bag = BagSimulator(context, seed, unlocked_mask)
+    for pickup_id in pickup_stream:
+        result = bag.add(pickup_id)
+        if result is not None:
+            yield result
@@ -0,0 +1,376 @@
+import heapq
+import sqlite3
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .calculator import iter_results_for_pickups
+from .context import ALL_UNLOCKED, CraftedItem
+from .engine import SearchStats, iter_chunks
+from .isaac_pickups import PICKUP_LIST
+from .isaac_rng import string_to_seed
+from .multisets import get_recipe_rank
+from .search import get_default_pickup_costs
+from .utilities import parse_game_version_string
+
+
+# The number of recipes written per transaction.
+STORE_BATCH_SIZE = 65536
+
+MAX_PICKUP_ID = len(PICKUP_LIST) - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    version_id INTEGER PRIMARY KEY,
+    game_version TEXT NOT NULL,
+    flags TEXT NOT NULL,
+    unlocked_mask INTEGER NOT NULL,
+    UNIQUE (game_version, flags, unlocked_mask)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    version_id INTEGER NOT NULL REFERENCES versions,
+    seed INTEGER NOT NULL,
+    seed_string TEXT NOT NULL,
+    pickup_mask INTEGER NOT NULL,
+    recipe_count INTEGER NOT NULL,
+    PRIMARY KEY (version_id, seed, pickup_mask)
+);
+CREATE TABLE IF NOT EXISTS recipes (
+    version_id INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    pickups BLOB NOT NULL,
+    pickup_mask INTEGER NOT NULL,
+    quality_sum INTEGER NOT NULL,
+    PRIMARY KEY (version_id, seed, rank)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS recipes_seed_item ON recipes (version_id, seed, item_id);
+"""
+
+
+class StoredRecipe(NamedTuple):
+    seed: str
+    item_id: int
+    pickups: Sequence[int]
+    quality_sum: int
+    cost: float
+
+
+def get_pickup_mask(pickups: Iterable[int]) -> int:
+    mask = 0
+    for pickup_id in pickups:
+        mask |= 1 << pickup_id
+    return mask
+
+
+def normalize_seed(seed_string: str) -> Tuple[int, str]:
+    """The seed as a number, and written the way the game shows it without the space."""
+    try:
+        seed = string_to_seed(seed_string)
+    except AssertionError:
+        raise ValueError(f"Invalid seed {seed_string!r}.")
+    return seed, seed_string.replace(" ", "").upper()
+
+
+class RecipeStore:
+    """
+    Enumeration results for many seeds and game versions, kept in an SQLite database to be queried later without
+    recalculating them.
+
+    Recipes are numbered by their position in the enumeration of every pickup type (see `get_recipe_rank`), so a
+    recipe found by two runs with overlapping pickups is only stored once, and a seed's recipes can be read back in
+    enumeration order. They're indexed by (seed, rank), and by (seed, item) to find an item's recipes on a seed.
+    A run is only recorded once all of its recipes have been written, so an interrupted run is done again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # WAL lets the store be queried while another process is writing to it.
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "RecipeStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get_version_id(
+        self,
+        game_version: str,
+        flags_key: Tuple[str, ...] = (),
+        unlocked_mask: int = ALL_UNLOCKED,
+        create: bool = False,
+    ) -> Optional[int]:
+        flags = ",".join(flags_key)
+        row = self.connection.execute(
+            "SELECT version_id FROM versions WHERE game_version = ? AND flags = ? AND unlocked_mask = ?",
+            (game_version, flags, unlocked_mask),
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        if not create:
+            return None
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO versions (game_version, flags, unlocked_mask) VALUES (?, ?, ?)",
+                (game_version, flags, unlocked_mask),
+            )
+        return cursor.lastrowid
+
+    def has_run(
+        self,
+        game_version: str,
+        seed_string: str,
+        pickup_list: Iterable[int],
+        flags_key: Tuple[str, ...] = (),
+        unlocked_mask: int = ALL_UNLOCKED,
+    ) -> bool:
+        """Whether every recipe from these pickup types (or a superset of them) has been stored for the seed."""
+        version_id = self.get_version_id(game_version, flags_key, unlocked_mask)
+        if version_id is None:
+            return False
+        pickup_mask = get_pickup_mask(pickup_list)
+        row = self.connection.execute(
+            "SELECT 1 FROM runs WHERE version_id = ? AND seed = ? AND (pickup_mask & ?) = ?",
+            (version_id, normalize_seed(seed_string)[0], pickup_mask, pickup_mask),
+        ).fetchone()
+        return row is not None
+
+    def add_results(
+        self,
+        game_version: str,
+        seed_string: str,
+        pickup_list: Iterable[int],
+        results: Iterable[CraftedItem],
+        flags_key: Tuple[str, ...] = (),
+        unlocked_mask: int = ALL_UNLOCKED,
+        batch_size: int = STORE_BATCH_SIZE,
+    ) -> int:
+        """
+        Write every recipe enumerated from `pickup_list` for a seed, `batch_size` recipes per transaction, then record
+        the run. Returns the number of recipes.
+        """
+        version_id = self.get_version_id(
+            game_version, flags_key, unlocked_mask, create=True
+        )
+        seed, seed_string = normalize_seed(seed_string)
+        count = 0
+        for chunk in iter_chunks(results, batch_size):
+            rows = [
+                (
+                    version_id,
+                    seed,
+                    get_recipe_rank(pickups, MAX_PICKUP_ID),
+                    item_id,
+                    bytes(pickups),
+                    get_pickup_mask(pickups),
+                    quality_sum,
+                )
+                for pickups, item_id, quality_sum in chunk
+            ]
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO recipes VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+            count += len(rows)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)",
+                (version_id, seed, seed_string, get_pickup_mask(pickup_list), count),
+            )
+        return count
+
+    def merge(self, path: str) -> int:
+        """Copy every run and recipe from another store into this one. Returns the number of runs copied."""
+        self.connection.execute("ATTACH DATABASE ? AS other", (path,))
+        try:
+            runs = 0
+            for other_id, game_version, flags, unlocked_mask in self.connection.execute(
+                "SELECT * FROM other.versions"
+            ).fetchall():
+                version_id = self.get_version_id(
+                    game_version,
+                    tuple(flags.split(",")) if flags else (),
+                    unlocked_mask,
+                    create=True,
+                )
+                with self.connection:
+                    self.connection.execute(
+                        """
+                        INSERT OR IGNORE INTO recipes
+                        SELECT ?, seed, rank, item_id, pickups, pickup_mask, quality_sum FROM other.recipes WHERE version_id = ?
+                        """,
+                        (version_id, other_id),
+                    )
+                    runs += self.connection.execute(
+                        "INSERT OR REPLACE INTO runs SELECT ?, seed, seed_string, pickup_mask, recipe_count FROM other.runs WHERE version_id = ?",
+                        (version_id, other_id),
+                    ).rowcount
+        finally:
+            self.connection.execute("DETACH DATABASE other")
+        return runs
+
+    def get_seeds(
+        self,
+        game_version: str,
+        flags_key: Tuple[str, ...] = (),
+        unlocked_mask: int = ALL_UNLOCKED,
+    ) -> List[str]:
+        version_id = self.get_version_id(game_version, flags_key, unlocked_mask)
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT DISTINCT seed_string FROM runs WHERE version_id = ? ORDER BY seed_string",
+                (version_id,),
+            )
+        ]
+
+    def find_seeds_for_item(
+        self,
+        game_version: str,
+        item_id: int,
+        pickup_list: Optional[Iterable[int]] = None,
+        flags_key: Tuple[str, ...] = (),
+        unlocked_mask: int = ALL_UNLOCKED,
+    ) -> List[str]:
+        """
+        The stored seeds on which the item can be crafted (using only the pickup types in `pickup_list`, if given).
+        Only stored recipes are considered, so a seed is only certain not to craft the item if it has a run which
+        covers every pickup type in `pickup_list`.
+        """
+        version_id = self.get_version_id(game_version, flags_key, unlocked_mask)
+        excluded_mask = 0 if pickup_list is None else ~get_pickup_mask(pickup_list)
+        # One lookup on the (seed, item) index per stored seed.
+        rows = self.connection.execute(
+            """
+            SELECT seed_string FROM (SELECT DISTINCT seed, seed_string FROM runs WHERE version_id = ?) AS seeds
+            WHERE EXISTS (
+                SELECT 1 FROM recipes
+                WHERE version_id = ? AND seed = seeds.seed AND item_id = ? AND (pickup_mask & ?) = 0
+            )
+            ORDER BY seed_string
+            """,
+            (version_id, version_id, item_id, excluded_mask),
+        )
+        return [row[0] for row in rows]
+
+    def find_cheapest_recipes(
+        self,
+        game_version: str,
+        seed_string: str,
+        item_id: int,
+        k: int = 1,
+        pickup_costs: Optional[Dict[int, float]] = None,
+        pickup_list: Optional[Iterable[int]] = None,
+        flags_key: Tuple[str, ...] = (),
+        unlocked_mask: int = ALL_UNLOCKED,
+    ) -> List[StoredRecipe]:
+        """
+        The `k` cheapest stored recipes for the item on a seed, by `pickup_costs` (which defaults to each pickup's
+        quality), using only the pickup types in `pickup_list` if given. Ties are broken by enumeration order.
+        """
+        if pickup_costs is None:
+            pickup_costs = get_default_pickup_costs()
+        version_id = self.get_version_id(game_version, flags_key, unlocked_mask)
+        seed, seed_string = normalize_seed(seed_string)
+        excluded_mask = 0 if pickup_list is None else ~get_pickup_mask(pickup_list)
+        rows = self.connection.execute(
+            """
+            SELECT rank, pickups, quality_sum FROM recipes
+            WHERE version_id = ? AND seed = ? AND item_id = ? AND (pickup_mask & ?) = 0
+            """,
+            (version_id, seed, item_id, excluded_mask),
+        )
+        cheapest = heapq.nsmallest(
+            k,
+            (
+                (
+                    sum(pickup_costs[pickup_id] for pickup_id in pickups),
+                    rank,
+                    pickups,
+                    quality_sum,
+                )
+                for rank, pickups, quality_sum in rows
+            ),
+        )
+        return [
+            StoredRecipe(seed_string, item_id, list(pickups), quality_sum, cost)
+            for cost, _, pickups, quality_sum in cheapest
+        ]
+
+    def iter_recipes(
+        self,
+        game_version: str,
+        seed_string: str,
+        start: int = 0,
+        flags_key: Tuple[str, ...] = (),
+        unlocked_mask: int = ALL_UNLOCKED,
+    ) -> Iterator[CraftedItem]:
+        """A seed's stored recipes in enumeration order, starting from the recipe numbered `start`."""
+        version_id = self.get_version_id(game_version, flags_key, unlocked_mask)
+        rows = self.connection.execute(
+            "SELECT pickups, item_id, quality_sum FROM recipes WHERE version_id = ? AND seed = ? AND rank >= ? ORDER BY rank",
+            (version_id, normalize_seed(seed_string)[0], start),
+        )
+        for pickups, item_id, quality_sum in rows:
+            yield CraftedItem(list(pickups), item_id, quality_sum)
+
+
+def store_results(
+    store: RecipeStore,
+    game_version: str,
+    seed_strings: Iterable[str],
+    pickup_list: List[int],
+    flags_key: Tuple[str, ...] = (),
+    unlocked_mask: int = ALL_UNLOCKED,
+    executor: Optional[Executor] = None,
+    grouped: bool = False,
+    force: bool = False,
+) -> Iterator[Tuple[str, Optional[SearchStats]]]:
+    """
+    Enumerate every recipe from the given pickup types on each seed and write them to the store, skipping seeds
+    which already have them unless `force` is set. Yields each seed with its stats, or None if it was skipped.
+    The results have to be computed with the same flags as `flags_key`, i.e. the global config.
+    """
+    platform, version = parse_game_version_string(game_version)
+    owns_executor = executor is None
+    if owns_executor:
+        executor = ProcessPoolExecutor()
+    try:
+        for seed_string in seed_strings:
+            if not force and store.has_run(
+                game_version, seed_string, pickup_list, flags_key, unlocked_mask
+            ):
+                yield seed_string, None
+                continue
+            seed = normalize_seed(seed_string)[0]
+            stats = SearchStats()
+            stats.start()
+            results = iter_results_for_pickups(
+                platform,
+                version,
+                seed,
+                pickup_list,
+                executor,
+                unlocked_mask=unlocked_mask,
+                grouped=grouped,
+            )
+            stats.evaluated = store.add_results(
+                game_version,
+                seed_string,
+                pickup_list,
+                results,
+                flags_key,
+                unlocked_mask,
+            )
+            stats.stop()
+            yield seed_string, stats
+    finally:
+        if owns_executor:
+            executor.shutdown()
@@ -0,0 +1,125 @@
+import os
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from crafting_calculator.archive import (
+    ARCHIVE_HEADER,
+    OutcomeArchive,
+    archive_results,
+    decode_block,
+    encode_block,
+)
+from crafting_calculator.calculator import iter_results_for_pickups
+from crafting_calculator.isaac_rng import string_to_seed
+
+
+PICKUPS = [1, 2, 8, 12, 15]
+
+
+class TestArchive:
+    @pytest.mark.parametrize(
+        "item_ids", [[], [45] * 1000, [1, 1, 2, 2, 2, 3] * 100, list(range(700))]
+    )
+    def test_blocks(self, item_ids):
+        assert decode_block(encode_block(item_ids)) == item_ids
+
+    def test_append_and_lookup(self, tmp_path):
+        path = str(tmp_path / "outcomes.archive")
+        expected = {
+            seed_string: list(
+                iter_results_for_pickups(
+                    "pc", "v1.7.9b", string_to_seed(seed_string), PICKUPS
+                )
+            )
+            for seed_string in ["28RYNMMM", "7BVMYW7D"]
+        }
+        with ThreadPoolExecutor(2) as executor:
+            with OutcomeArchive(path, writable=True) as archive:
+                list(
+                    archive_results(
+                        archive,
+                        "pc/v1.7.9b",
+                        ["28RYNMMM"],
+                        PICKUPS,
+                        executor=executor,
+                        block_size=100,
+                    )
+                )
+            size = os.path.getsize(path)
+            with open(path, "rb") as f:
+                first_entry = f.read()
+            # Appending a seed leaves the rest of the archive as it was, besides the committed length in the header.
+            with OutcomeArchive(path, writable=True) as archive:
+                stored = dict(
+                    archive_results(
+                        archive,
+                        "pc/v1.7.9b",
+                        ["28RYNMMM", "7BVM YW7D"],
+                        PICKUPS,
+                        executor=executor,
+                        block_size=100,
+                    )
+                )
+                assert stored["28RYNMMM"] is None
+                # Seeds already archived with more pickups are skipped too.
+                assert dict(
+                    archive_results(
+                        archive, "pc/v1.7.9b", ["7BVMYW7D"], [1, 2], executor=executor
+                    )
+                ) == {"7BVMYW7D": None}
+            with open(path, "rb") as f:
+                assert (
+                    f.read(size)[ARCHIVE_HEADER.size :]
+                    == first_entry[ARCHIVE_HEADER.size :]
+                )
+
+        with OutcomeArchive(path) as archive:
+            for seed_string, results in expected.items():
+                entry = archive.get_entry("pc/v1.7.9b", seed_string)
+                assert list(entry.iter_outcomes()) == [
+                    result.item_id for result in results
+                ]
+                for result in results[::37]:
+                    assert (
+                        archive.get_item(
+                            "pc/v1.7.9b", seed_string, list(reversed(result.pickups))
+                        )
+                        == result.item_id
+                    )
+            with pytest.raises(KeyError):
+                archive.get_item("pc/v1.7.9b", "28RYNMMM", [1, 1, 1, 1, 1, 1, 1, 3])
+            with pytest.raises(KeyError):
+                archive.get_entry("pc/v1.7.8a", "28RYNMMM")
+
+    def test_interrupted_append(self, tmp_path):
+        path = str(tmp_path / "outcomes.archive")
+        results = list(
+            iter_results_for_pickups(
+                "pc", "v1.7.9b", string_to_seed("28RYNMMM"), PICKUPS
+            )
+        )
+        with OutcomeArchive(path, writable=True) as archive:
+            archive.add_results(
+                "pc/v1.7.9b", "28RYNMMM", PICKUPS, results, block_size=100
+            )
+        size = os.path.getsize(path)
+        # As if the process was killed part way through appending another seed.
+        with open(path, "ab") as f:
+            f.write(os.urandom(1000))
+
+        with OutcomeArchive(path) as archive:
+            assert list(
+                archive.get_entry("pc/v1.7.9b", "28RYNMMM").iter_outcomes()
+            ) == [result.item_id for result in results]
+        with OutcomeArchive(path, writable=True) as archive:
+            assert os.path.getsize(path) == size
+            archive.add_results(
+                "pc/v1.7.9b", "7BVMYW7D", PICKUPS, results, block_size=100
+            )
+        with OutcomeArchive(path) as archive:
+            assert sorted(
+                entries[0].seed_string for entries in archive.entries.values()
+            ) == ["28RYNMMM", "7BVMYW7D"]
+
+
+if __name__ == "__main__":
+    pytest.main()
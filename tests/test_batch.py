@@ -0,0 +1,110 @@
+import itertools
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from crafting_calculator.batch import iter_batch_results
+from crafting_calculator.calculator import get_result
+from crafting_calculator.context import CraftingContext, get_unlocked_mask
+from crafting_calculator.isaac_rng import string_to_seed
+
+
+class TestBatch:
+    def test_results_match_single_lookups_in_order(self):
+        requests = [
+            {
+                "id": 0,
+                "seed": "28RYNMMM",
+                "pickups": [6, 21, 27, 11, 27, 22, 23, 20],
+                "game_version": "pc/v1.7.8a",
+            },
+            {
+                "id": 1,
+                "seed": "7BVMYW7D",
+                "pickups": [1, 1, 2, 2, 8, 9, 9, 12],
+                "game_version": "switch/v1.5",
+            },
+            {
+                "id": 2,
+                "seed": "28RY NMMM",
+                "pickups": [1, 2, 3, 4, 5, 6, 7, 8],
+                "flags": {"is_greed_mode": True},
+            },
+            {
+                "id": 3,
+                "seed": "28RYNMMM",
+                "pickups": [6, 21, 27, 11, 27, 22, 23, 20],
+                "game_version": "pc/v1.7.8a",
+            },
+        ]
+        lines = [json.dumps(request) for request in requests]
+        with ThreadPoolExecutor(2) as executor:
+            results = list(iter_batch_results(lines, executor, batch_size=3))
+
+        assert [result["id"] for result in results] == [0, 1, 2, 3]
+        for request, result in zip(requests[:2], results):
+            platform, game_version = request["game_version"].split("/")
+            _, candidates, quality_sum = get_result(
+                platform,
+                game_version,
+                request["pickups"],
+                string_to_seed(request["seed"]),
+            )
+            assert result["item_id"] == candidates[0]
+            assert result["quality_sum"] == quality_sum
+        assert results[0]["item_id"] == results[3]["item_id"]
+
+    def test_unlocked_achievements(self):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        seed = string_to_seed("28RYNMMM")
+        for recipe in itertools.combinations_with_replacement([1, 2, 8, 12], 8):
+            candidates = context.get_result(recipe, seed).candidates
+            if len(candidates) > 1 and context.find_hardcoded_recipe(recipe) is None:
+                break
+        locked = [context.items[item_id].achievement_id for item_id in candidates[:-1]]
+        unlocked = [
+            achievement_id
+            for achievement_id in range(700)
+            if achievement_id not in locked
+        ]
+        lines = [
+            json.dumps(
+                {"seed": "28RYNMMM", "pickups": list(recipe), "unlocked": unlocked}
+            ),
+            json.dumps(
+                {
+                    "seed": "28RYNMMM",
+                    "pickups": list(recipe),
+                    "unlocked": get_unlocked_mask(unlocked),
+                }
+            ),
+            json.dumps({"seed": "28RYNMMM", "pickups": list(recipe)}),
+        ]
+        with ThreadPoolExecutor(1) as executor:
+            results = list(iter_batch_results(lines, executor))
+
+        assert [result["item_id"] for result in results] == [
+            candidates[-1],
+            candidates[-1],
+            candidates[0],
+        ]
+
+    def test_invalid_lines_are_reported(self):
+        lines = [
+            '{"seed": "28RYNMMM", "pickups": [1, 2]}',
+            "",
+            "not json",
+            '{"seed": "28RYNMMM", "pickups": [1, 1, 1, 1, 1, 1, 1, 1]}',
+            '{"seed": "28RYNMMM", "pickups": [1, 1, 1, 1, 1, 1, 1, true]}',
+            '{"seed": "28RYNMMM", "pickups": [1, 1, 1, 1, 1, 1, 1, 1], "flags": {"is_greed_mode": "false"}}',
+        ]
+        with ThreadPoolExecutor(1) as executor:
+            results = list(iter_batch_results(lines, executor))
+
+        assert [result["line"] for result in results] == [1, 3, 4, 5, 6]
+        assert "error" in results[0] and "error" in results[1]
+        assert "item_id" in results[2]
+        assert "error" in results[3] and "error" in results[4]
+
+
+if __name__ == "__main__":
+    pytest.main()
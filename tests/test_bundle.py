@@ -0,0 +1,102 @@
+import pytest
+from crafting_calculator.bundle import (
+    BUNDLE_PATH_VARIABLE,
+    BundleVersion,
+    GamedataBundle,
+    build_bundle,
+    get_bundle_version,
+    open_bundle,
+)
+from crafting_calculator.context import CraftingContext
+from crafting_calculator.isaac_item_pools import ItemPool
+from crafting_calculator.isaac_items import ItemListEntry
+from crafting_calculator.isaac_recipes import HardcodedRecipe
+from crafting_calculator.isaac_rng import string_to_seed
+
+
+@pytest.fixture
+def clear_caches():
+    # Game data is cached once loaded, so start with nothing loaded, and don't leave data from a test's bundle behind.
+    caches = [
+        ItemListEntry.load_item_list,
+        HardcodedRecipe.load_hardcoded_recipes,
+        CraftingContext.load,
+        open_bundle,
+    ]
+    for cache in caches:
+        cache.cache_clear()
+    yield
+    for cache in caches:
+        cache.cache_clear()
+
+
+class TestBundle:
+    def test_round_trip(self, tmp_path, monkeypatch, clear_caches):
+        monkeypatch.setenv(BUNDLE_PATH_VARIABLE, "")
+        path = str(tmp_path / "gamedata.bundle")
+        build_bundle(path, ["pc/v1.7.9b", "switch/v1.5"])
+        bundle = GamedataBundle(path)
+
+        for platform, game_version in [("pc", "v1.7.9b"), ("switch", "v1.5")]:
+            version = bundle.get_version(platform, game_version)
+            items = ItemListEntry.load_item_list(platform, game_version)
+            assert {
+                item_id: vars(item)
+                for item_id, item in version.load_item_list().items()
+            } == {item_id: vars(item) for item_id, item in items.items()}
+            item_pools = ItemPool.load_item_pools(platform, game_version)
+            assert {
+                pool_id: (pool.pool_name, dict(pool.quality_lists))
+                for pool_id, pool in version.load_item_pools().items()
+            } == {
+                pool_id: (pool.pool_name, dict(pool.quality_lists))
+                for pool_id, pool in item_pools.items()
+            }
+            recipes = HardcodedRecipe.load_hardcoded_recipes(platform, game_version)
+            assert {
+                key: vars(recipe)
+                for key, recipe in version.load_hardcoded_recipes().items()
+            } == {key: vars(recipe) for key, recipe in recipes.items()}
+        assert list(bundle.get_version("pc", "v1.7.9b").get_table("item_ids")) == list(
+            ItemListEntry.load_item_list("pc", "v1.7.9b")
+        )
+        assert bundle.get_version("pc", "v1.7.8a") is None
+
+    def test_loading(self, tmp_path, monkeypatch, clear_caches):
+        path = str(tmp_path / "gamedata.bundle")
+        monkeypatch.setenv(BUNDLE_PATH_VARIABLE, "")
+        build_bundle(path, ["pc/v1.7.9b"])
+        recipe = [6, 21, 27, 11, 27, 22, 23, 20]
+        expected = CraftingContext("pc", "v1.7.9b").get_item(
+            recipe, string_to_seed("28RYNMMM")
+        )
+        ItemListEntry.load_item_list.cache_clear()
+        HardcodedRecipe.load_hardcoded_recipes.cache_clear()
+
+        calls = []
+        for name in ["load_item_list", "load_item_pools", "load_hardcoded_recipes"]:
+            load = getattr(BundleVersion, name)
+            monkeypatch.setattr(
+                BundleVersion,
+                name,
+                lambda self, name=name, load=load: calls.append(name) or load(self),
+            )
+        monkeypatch.setenv(BUNDLE_PATH_VARIABLE, path)
+        assert get_bundle_version("pc", "v1.7.9b") is not None
+
+        # A context built from the bundle crafts the same items.
+        context = CraftingContext("pc", "v1.7.9b")
+        assert sorted(set(calls)) == [
+            "load_hardcoded_recipes",
+            "load_item_list",
+            "load_item_pools",
+        ]
+        assert context.get_item(recipe, string_to_seed("28RYNMMM")) == expected
+
+        # Versions whose game data has changed since the bundle was built are read from the XML files.
+        monkeypatch.setattr(get_bundle_version("pc", "v1.7.9b"), "source_stamp", [])
+        assert get_bundle_version("pc", "v1.7.9b") is None
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from crafting_calculator.cache import ResultCache, get_request_key
+
+
+class TestResultCache:
+    def test_request_key(self):
+        assert get_request_key({"a": 1, "b": [2, 3]}) == get_request_key(
+            {"b": [2, 3], "a": 1}
+        )
+        assert get_request_key({"a": 1}) != get_request_key({"a": 2})
+
+    def test_eviction(self, tmp_path):
+        cache = ResultCache(2, str(tmp_path))
+        for key in ["a", "b", "c"]:
+            cache.put(key, {"key": key})
+        assert list(cache.entries) == ["b", "c"]
+        # Evicted entries are read back from disk.
+        assert asyncio.run(cache.get_or_compute("a", None)) == {"key": "a"}
+        assert cache.get_stats()["disk_hits"] == 1
+        assert list(cache.entries) == ["c", "a"]
+
+    def test_coalescing(self):
+        cache = ResultCache()
+        calls = []
+
+        async def compute():
+            calls.append(None)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        async def main():
+            results = await asyncio.gather(
+                *[cache.get_or_compute("key", compute) for _ in range(3)]
+            )
+            return results + [await cache.get_or_compute("key", compute)]
+
+        assert asyncio.run(main()) == [1, 1, 1, 1]
+        stats = cache.get_stats()
+        assert (
+            stats["misses"],
+            stats["coalesced"],
+            stats["hits"],
+            stats["in_flight"],
+        ) == (1, 2, 1, 0)
+
+    def test_cancelled_request(self):
+        cache = ResultCache()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        async def main():
+            first = asyncio.ensure_future(cache.get_or_compute("key", compute))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(cache.get_or_compute("key", compute))
+            await asyncio.sleep(0.01)
+            # Cancelling the request which started the computation leaves it running for the other.
+            first.cancel()
+            return await second
+
+        assert asyncio.run(main()) == "result"
+        assert cache.get_stats()["coalesced"] == 1 and list(cache.entries) == ["key"]
+
+    def test_errors_not_cached(self):
+        cache = ResultCache()
+
+        async def fail():
+            raise ValueError("Failed.")
+
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                asyncio.run(cache.get_or_compute("key", fail))
+        assert cache.get_stats()["misses"] == 2
+
+
+if __name__ == "__main__":
+    pytest.main()
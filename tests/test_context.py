@@ -0,0 +1,51 @@
+import itertools
+import pytest
+from crafting_calculator.context import BREAKFAST_ITEM_ID, CraftingContext
+from crafting_calculator.isaac_rng import string_to_seed
+
+
+SEED = string_to_seed("28RYNMMM")
+PICKUPS = [1, 2, 5, 8, 10, 12]
+
+
+def iter_drawn_items(context):
+    # The items drawn from the weight table for every recipe, leaving out hardcoded recipes and breakfast.
+    for recipe in itertools.combinations_with_replacement(PICKUPS, 8):
+        candidates = context.get_result(recipe, SEED).candidates
+        if context.find_hardcoded_recipe(recipe) is not None:
+            candidates = candidates[1:]
+        yield from (item_id for item_id in candidates if item_id != BREAKFAST_ITEM_ID)
+
+
+class TestCraftingContext:
+    @pytest.mark.parametrize(
+        "flag,is_allowed",
+        [
+            ("is_tlost", lambda item: item.has_tag("offensive")),
+            ("has_sacred_orb", lambda item: item.quality > 1),
+            ("has_trinket_no", lambda item: not item.is_active),
+        ],
+    )
+    def test_generating_flags(self, flag, is_allowed):
+        # The GENERATING check has to look at the item which was drawn, and Sacred Orb and NO! apply on their own.
+        context = CraftingContext.get("pc", "v1.7.9b")
+        flagged_context = CraftingContext.get("pc", "v1.7.9b", {flag: True})
+        assert not all(
+            is_allowed(context.items[item_id]) for item_id in iter_drawn_items(context)
+        )
+        assert all(
+            is_allowed(flagged_context.items[item_id])
+            for item_id in iter_drawn_items(flagged_context)
+        )
+
+    def test_highest_item_id(self):
+        # The weight table is sized by the items present, so the last item can be drawn.
+        context = CraftingContext.get("pc", "v1.7.9b")
+        recipe = (5, 5, 5, 5, 10, 22, 22, 22)
+        table_key = context.get_table_key(*context.count_pickups(recipe))
+        assert max(context.items) in context.get_weight_table(table_key).item_ids
+        assert context.get_result(recipe, SEED).candidates == [527, max(context.items)]
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,79 @@
+import itertools
+import pytest
+from collections import Counter
+from crafting_calculator.context import CraftingContext
+from crafting_calculator.counting import (
+    count_by_quality_band,
+    count_by_quality_sum,
+    count_by_table_key,
+)
+from crafting_calculator.isaac_pickups import PICKUP_LIST
+from crafting_calculator.multisets import (
+    count_bounded_multisets,
+    get_recipe_rank,
+    iter_bounded_multisets,
+    iter_recipes,
+)
+
+
+class TestMultisets:
+    @pytest.mark.parametrize(
+        "limits",
+        [
+            {1: 8, 2: 8, 8: 8},
+            {12: 3, 2: 1, 8: 12},
+            {1: 2, 2: 2, 3: 2, 4: 2, 5: 1},
+            {1: 3, 2: 3},
+        ],
+    )
+    def test_bounded_multisets(self, limits):
+        expected = [
+            recipe
+            for recipe in itertools.combinations_with_replacement(sorted(limits), 8)
+            if all(
+                count <= limits[pickup_id]
+                for pickup_id, count in Counter(recipe).items()
+            )
+        ]
+        assert list(iter_bounded_multisets(limits)) == expected
+        assert count_bounded_multisets(limits) == len(expected)
+
+    def test_unbounded_recipes(self):
+        assert list(iter_recipes([12, 1, 8])) == list(
+            itertools.combinations_with_replacement([1, 8, 12], 8)
+        )
+
+    def test_recipe_rank(self):
+        recipes = itertools.combinations_with_replacement(range(1, 6), 8)
+        assert [get_recipe_rank(recipe, 5) for recipe in recipes] == list(
+            range(count_bounded_multisets({i: 8 for i in range(1, 6)}))
+        )
+        assert (
+            get_recipe_rank([29] * 8, 29)
+            == count_bounded_multisets({i: 8 for i in range(1, 30)}) - 1
+        )
+
+    @pytest.mark.parametrize(
+        "limits",
+        [{1: 8, 3: 8, 5: 8, 8: 8, 23: 8, 29: 8}, {1: 3, 3: 2, 6: 1, 15: 2, 23: 8}],
+    )
+    def test_counts_match_enumeration(self, limits):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        recipes = list(iter_bounded_multisets(limits))
+        quality_sums = Counter(
+            sum(PICKUP_LIST[pickup_id].quality for pickup_id in recipe)
+            for recipe in recipes
+        )
+        table_keys = Counter(
+            context.get_table_key(*context.count_pickups(recipe)) for recipe in recipes
+        )
+
+        assert count_by_quality_sum(limits) == dict(quality_sums)
+        assert count_by_table_key(context.quality_ranges, limits) == dict(table_keys)
+        assert sum(count_by_quality_band(context.quality_ranges, limits)) == len(
+            recipes
+        )
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,51 @@
+import collections
+import pytest
+from crafting_calculator.context import BREAKFAST_ITEM_ID, CraftingContext
+from crafting_calculator.isaac_rng import rng_next
+from crafting_calculator.probability import get_outcome_distribution
+
+
+PICKUPS = [6, 21, 27, 11, 27, 22, 23, 20]
+
+
+class TestProbability:
+    def test_distribution_sums_to_one(self):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        distribution = get_outcome_distribution(context, PICKUPS)
+        assert sum(distribution.values()) == pytest.approx(1.0)
+
+    def test_distribution_matches_seeds(self):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        distribution = get_outcome_distribution(context, PICKUPS)
+        seed = 0x12345678
+        counts = collections.Counter()
+        for _ in range(20000):
+            seed = rng_next(seed, 0)
+            counts[context.get_result(PICKUPS, seed).candidates[0]] += 1
+        for item_id in set(counts) | set(distribution):
+            assert counts[item_id] / 20000 == pytest.approx(
+                distribution.get(item_id, 0), abs=0.02
+            )
+
+    def test_hardcoded_recipe(self):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        recipe = next(iter(context.hardcoded_recipes.values()))
+        assert get_outcome_distribution(context, recipe.pickups) == {
+            recipe.item_id: 1.0
+        }
+
+    def test_locked_achievements(self):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        distribution = get_outcome_distribution(
+            context, PICKUPS, unlocked_achievements=[]
+        )
+        assert sum(distribution.values()) == pytest.approx(1.0)
+        for item_id in distribution:
+            assert (
+                item_id == BREAKFAST_ITEM_ID
+                or context.items[item_id].achievement_id is None
+            )
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,337 @@
+import itertools
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from crafting_calculator.isaac_rng import string_to_seed
+from crafting_calculator.calculator import (
+    get_result,
+    iter_items_for_pickups,
+    iter_recipes_for_item,
+    iter_recipes_for_items,
+    get_item_targets,
+    iter_uncraftable_items,
+    iter_fixed_recipes,
+)
+from crafting_calculator.isaac_items import ItemListEntry
+from crafting_calculator.context import BREAKFAST_ITEM_ID, CraftingContext, WeightTable
+from crafting_calculator.search import CheapestRecipeSearch, find_cheapest_recipes
+from crafting_calculator.engine import SearchStats
+from crafting_calculator.multisets import get_pickup_limits, iter_recipes
+from crafting_calculator.planner import iter_grouped_results, plan_recipe_groups
+from crafting_calculator.sampling import CraftableSetSampler
+from crafting_calculator.predicates import ItemPredicate, RecipePruner, filter_items
+
+
+SEED_STRING = "28RYNMMM"
+PICKUPS = [1, 2, 8, 12]
+
+
+def brute_force_results():
+    seed = string_to_seed(SEED_STRING)
+    return [
+        get_result("pc", "v1.7.9b", recipe, seed)
+        for recipe in itertools.combinations_with_replacement(PICKUPS, 8)
+    ]
+
+
+@pytest.fixture(scope="module")
+def executor():
+    with ThreadPoolExecutor(2) as executor:
+        yield executor
+
+
+class TestQueries:
+    def test_items_for_pickups(self, executor):
+        expected = {result[1][0] for result in brute_force_results()}
+        matches = list(
+            iter_items_for_pickups("pc", "v1.7.9b", SEED_STRING, PICKUPS, executor)
+        )
+        assert {match.item_id for match in matches} == expected
+        assert len(matches) == len(expected)
+
+    def test_recipes_for_item(self, executor):
+        expected = [
+            tuple(result[0]) for result in brute_force_results() if result[1][0] == 45
+        ]
+        matches = iter_recipes_for_item(
+            "pc", "v1.7.9b", SEED_STRING, PICKUPS, 45, executor
+        )
+        assert [tuple(match.pickups) for match in matches] == expected
+
+    def test_recipes_for_items(self, executor):
+        targets = [45, 297, 416]
+        matches = list(
+            iter_recipes_for_items(
+                "pc", "v1.7.9b", SEED_STRING, PICKUPS, targets, executor
+            )
+        )
+        expected = [
+            (result[1][0], tuple(result[0]))
+            for result in brute_force_results()
+            if result[1][0] in targets
+        ]
+        assert [(match.item_id, tuple(match.pickups)) for match in matches] == expected
+
+        limited = list(
+            iter_recipes_for_items(
+                "pc", "v1.7.9b", SEED_STRING, PICKUPS, targets, executor, max_recipes=1
+            )
+        )
+        assert sorted(match.item_id for match in limited) == sorted(
+            set(item_id for item_id, _ in expected)
+        )
+
+    def test_stop_conditions(self, executor):
+        all_items = [
+            match.item_id
+            for match in iter_items_for_pickups(
+                "pc", "v1.7.9b", SEED_STRING, PICKUPS, executor
+            )
+        ]
+
+        stats = SearchStats()
+        targets = all_items[:2]
+        found = list(
+            iter_items_for_pickups(
+                "pc",
+                "v1.7.9b",
+                SEED_STRING,
+                PICKUPS,
+                executor,
+                item_ids=targets,
+                stats=stats,
+            )
+        )
+        assert sorted(match.item_id for match in found) == sorted(targets)
+        assert stats.stopped_early and stats.evaluated < stats.total
+
+        stats = SearchStats()
+        found = list(
+            iter_items_for_pickups(
+                "pc",
+                "v1.7.9b",
+                SEED_STRING,
+                PICKUPS,
+                executor,
+                max_results=3,
+                stats=stats,
+            )
+        )
+        assert [match.item_id for match in found] == all_items[:3]
+        assert stats.stopped_early
+
+        stats = SearchStats()
+        list(
+            iter_uncraftable_items(
+                "pc",
+                "v1.7.9b",
+                SEED_STRING,
+                PICKUPS,
+                executor,
+                stable_after=1,
+                stats=stats,
+            )
+        )
+        assert stats.stopped_early and stats.evaluated < stats.total
+
+        stats = SearchStats()
+        list(
+            iter_uncraftable_items(
+                "pc", "v1.7.9b", SEED_STRING, PICKUPS, executor, stats=stats
+            )
+        )
+        assert not stats.stopped_early and stats.evaluated == stats.total
+
+    def test_item_targets(self):
+        items = ItemListEntry.load_item_list("pc", "v1.7.9b")
+        targets = get_item_targets("pc", "v1.7.9b", ["45", "quality:4"])
+        assert 45 in targets
+        assert all(item_id == 45 or items[item_id].quality == 4 for item_id in targets)
+        with pytest.raises(ValueError):
+            get_item_targets("pc", "v1.7.9b", ["nope"])
+
+    def test_uncraftable_items(self, executor):
+        craftable = {result[1][0] for result in brute_force_results()}
+        items = ItemListEntry.load_item_list("pc", "v1.7.9b")
+        uncraftable = list(
+            iter_uncraftable_items("pc", "v1.7.9b", SEED_STRING, PICKUPS, executor)
+        )
+        assert uncraftable == sorted(set(items) - craftable)
+
+    def test_cheapest_recipes(self):
+        costs = {1: 3, 2: 0.5, 8: 1, 12: 2}
+        expected = sorted(
+            sum(costs[pickup_id] for pickup_id in result[0])
+            for result in brute_force_results()
+            if result[1][0] == 45
+        )
+        context = CraftingContext.get("pc", "v1.7.9b")
+        matches = find_cheapest_recipes(
+            context, string_to_seed(SEED_STRING), PICKUPS, 45, 4, costs
+        )
+        assert [match.cost for match in matches] == expected[:4]
+        for match in matches:
+            assert (
+                get_result("pc", "v1.7.9b", match.pickups, string_to_seed(SEED_STRING))[
+                    1
+                ][0]
+                == 45
+            )
+
+    def test_cheapest_recipes_uncraftable(self):
+        # No weight table any of these pickups can make draws the Dollar, so nothing should be evaluated.
+        context = CraftingContext.get("pc", "v1.7.9b")
+        search = CheapestRecipeSearch(
+            context, string_to_seed(SEED_STRING), list(range(1, 30)), [18], k=1
+        )
+        assert list(search) == []
+        assert search.evaluated == 0
+
+    @pytest.mark.parametrize(
+        "condition", ["quality>=4", "quality=0", "tag=offensive", "passive"]
+    )
+    def test_pruned_recipes_match_unpruned(self, condition):
+        pickups = [1, 2, 3, 6, 8, 21, 23]
+        seed = string_to_seed(SEED_STRING)
+        context = CraftingContext.get("pc", "v1.7.9b")
+        item_ids = set(filter_items(context, [ItemPredicate.parse(condition)]))
+        pruner = RecipePruner(context, item_ids, get_pickup_limits(pickups))
+
+        expected = [
+            recipe
+            for recipe in iter_recipes(pickups)
+            if context.get_result(recipe, seed)[1][0] in item_ids
+        ]
+        kept = list(iter_recipes(pickups, prune=pruner))
+        assert [
+            recipe
+            for recipe in kept
+            if context.get_result(recipe, seed)[1][0] in item_ids
+        ] == expected
+
+    def test_item_predicates(self):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        items = context.items
+        assert all(
+            items[item_id].quality <= 1
+            for item_id in filter_items(context, [ItemPredicate.parse("quality<2")])
+        )
+        assert all(
+            items[item_id].is_active
+            for item_id in filter_items(context, [ItemPredicate.parse("active")])
+        )
+        assert 45 in filter_items(context, [ItemPredicate.parse("pool=treasure")])
+        with pytest.raises(ValueError):
+            ItemPredicate.parse("quality~4")
+
+    def test_fixed_recipes(self):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        matches = list(iter_fixed_recipes("pc", "v1.7.9b", [1, 2, 3, 4, 5, 8, 12, 15]))
+        assert matches
+        for item_id, pickups, _ in matches:
+            for seed_string in ["28RYNMMM", "7BVMYW7D", "G0RGKXTQ"]:
+                assert (
+                    context.get_item(pickups, string_to_seed(seed_string)).item_id
+                    == item_id
+                )
+
+    def test_single_item_weight_table(self):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        assert context.get_table_fixed_item(WeightTable({})) == BREAKFAST_ITEM_ID
+        assert context.get_table_fixed_item(WeightTable({1: 5, 2: 5})) is None
+        assert context.get_table_fixed_item(WeightTable({1: 5})) == 1
+        locked_item = next(
+            item for item in context.items.values() if item.achievement_id is not None
+        )
+        assert (
+            context.get_table_fixed_item(WeightTable({locked_item.item_id: 5}), 0)
+            == BREAKFAST_ITEM_ID
+        )
+
+    def test_grouped_results(self, executor):
+        pickups = [1, 3, 5, 6, 8, 15, 23, 29]
+        seed = string_to_seed(SEED_STRING)
+        context = CraftingContext.get("pc", "v1.7.9b")
+        expected = {
+            recipe: context.get_item(recipe, seed).item_id
+            for recipe in iter_recipes(pickups)
+        }
+        groups = plan_recipe_groups(context, get_pickup_limits(pickups))
+        assert sum(group.count for group in groups) == len(expected)
+        assert len(
+            {table_key for group in groups for table_key in group.table_keys}
+        ) == sum(len(group.table_keys) for group in groups)
+
+        results = list(iter_grouped_results(context, seed, pickups, executor=executor))
+        assert {result.pickups: result.item_id for result in results} == expected
+        assert len(results) == len(expected)
+
+        item_ids = set(filter_items(context, [ItemPredicate.parse("quality>=3")]))
+        matches = iter_recipes_for_items(
+            "pc", "v1.7.9b", SEED_STRING, pickups, item_ids, executor, grouped=True
+        )
+        assert sorted(match.pickups for match in matches) == [
+            recipe for recipe, item_id in expected.items() if item_id in item_ids
+        ]
+
+    def test_sampled_items(self):
+        pickups = [1, 2, 3, 8, 15, 23, 25]
+        seed = string_to_seed(SEED_STRING)
+        context = CraftingContext.get("pc", "v1.7.9b")
+        expected = {
+            context.get_item(recipe, seed).item_id for recipe in iter_recipes(pickups)
+        }
+
+        sampler = CraftableSetSampler(context, seed, pickups, random_seed=0)
+        for stratum in sampler.strata:
+            recipes = {sampler.unrank(stratum, rank) for rank in range(stratum.count)}
+            assert len(recipes) == stratum.count
+            assert all(
+                context.get_table_key(*context.count_pickups(recipe))
+                == stratum.table_key
+                for recipe in recipes
+            )
+
+        sampler.sample(100)
+        assert set(sampler.found) <= expected
+        miss_chances = sampler.get_miss_chances(context.items)
+        assert all(miss_chances[item_id] == 0 for item_id in sampler.found)
+        assert all(0 <= chance <= 1 for chance in miss_chances.values())
+
+        sampler.run(60)
+        assert sampler.exhausted and sampler.evaluated == sampler.total == len(
+            list(iter_recipes(pickups))
+        )
+        assert set(sampler.found) == expected
+        assert not any(sampler.get_miss_chances(context.items).values())
+
+    @pytest.mark.parametrize("condition", ["quality=2", "quality=3", "quality=0"])
+    def test_sampled_items_filtered(self, condition):
+        pickups = [2, 3, 4, 6, 7, 9, 10, 11, 13, 22, 23, 29]
+        seed = string_to_seed(SEED_STRING)
+        context = CraftingContext.get("pc", "v1.7.9b")
+        item_ids = set(filter_items(context, [ItemPredicate.parse(condition)]))
+        pruner = RecipePruner(context, item_ids, get_pickup_limits(pickups))
+        kept = {
+            recipe
+            for recipe in iter_recipes(pickups)
+            if pruner.can_match_table(
+                context.get_table_key(*context.count_pickups(recipe))
+            )
+        }
+        expected = {context.get_item(recipe, seed).item_id for recipe in kept}
+
+        sampler = CraftableSetSampler(
+            context, seed, pickups, item_ids=item_ids, random_seed=0
+        )
+        assert {
+            sampler.unrank(stratum, rank)
+            for stratum in sampler.strata
+            for rank in range(stratum.count)
+        } == kept
+        sampler.run(120)
+        assert sampler.exhausted and sampler.evaluated == len(kept)
+        assert set(sampler.found) == expected & item_ids
+
+
+if __name__ == "__main__":
+    pytest.main()
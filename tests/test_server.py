@@ -0,0 +1,347 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from crafting_calculator.calculator import iter_recipes_for_item
+from crafting_calculator.config import config
+from crafting_calculator.context import CraftingContext
+from crafting_calculator.isaac_rng import string_to_seed
+from crafting_calculator.jobs import JobManager
+from crafting_calculator.server import CraftingServer, parse_query, run_query
+
+
+async def send_requests(server: CraftingServer, requests):
+    # Send every request down one keep-alive connection, returning the status codes and decoded responses.
+    listener = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    responses = []
+    try:
+        for method, path, body in requests:
+            payload = b"" if body is None else json.dumps(body).encode("utf-8")
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+                + payload
+            )
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.lower()] = value.strip()
+            responses.append(
+                (
+                    status,
+                    json.loads(
+                        await reader.readexactly(int(headers["content-length"]))
+                    ),
+                )
+            )
+    finally:
+        writer.close()
+        await writer.wait_closed()
+        listener.close()
+        await listener.wait_closed()
+    return responses
+
+
+class TestServer:
+    def test_requests(self):
+        recipe = [6, 21, 27, 11, 27, 22, 23, 20]
+        with ThreadPoolExecutor(1) as executor:
+            responses = asyncio.run(
+                send_requests(
+                    CraftingServer(executor),
+                    [
+                        ("GET", "/health", None),
+                        (
+                            "POST",
+                            "/craft",
+                            {"id": "a", "seed": "28RYNMMM", "pickups": recipe},
+                        ),
+                        (
+                            "POST",
+                            "/find-item-recipes",
+                            {
+                                "seed": "28RYNMMM",
+                                "pickups": [1, 2, 8, 12],
+                                "items": [45],
+                            },
+                        ),
+                        ("POST", "/craft", {"seed": "28RYNMMM", "pickups": [1, 2]}),
+                        ("GET", "/missing", None),
+                    ],
+                )
+            )
+
+        assert responses[0] == (200, {"status": "ok"})
+        status, output = responses[1]
+        expected = CraftingContext.get("pc", "v1.7.9b").get_item(
+            recipe, string_to_seed("28RYNMMM")
+        )
+        assert (
+            status == 200
+            and output["id"] == "a"
+            and output["item_id"] == expected.item_id
+        )
+
+        status, output = responses[2]
+        with ThreadPoolExecutor(1) as executor:
+            matches = iter_recipes_for_item(
+                "pc", "v1.7.9b", "28RYNMMM", [1, 2, 8, 12], 45, executor
+            )
+            expected = [list(match.pickups) for match in matches]
+        assert (
+            status == 200
+            and [result["pickups"] for result in output["results"]] == expected
+        )
+
+        assert responses[3][0] == 400 and "error" in responses[3][1]
+        assert responses[4][0] == 404
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            {"pickups": [1, True]},
+            {"pickups": [1, 2, 8, 31]},
+            {"inventory": {"1": 2, "8": -1}},
+            {"inventory": {"1": True}},
+        ],
+    )
+    def test_invalid_query(self, query):
+        with pytest.raises(ValueError):
+            parse_query("find-pickup-recipes", {"seed": "28RYNMMM", **query})
+
+    @pytest.mark.parametrize("content_length", ["-5", "abc", "1e3", ""])
+    def test_invalid_content_length(self, content_length):
+        async def send_request():
+            server = CraftingServer()
+            listener = await asyncio.start_server(
+                server.handle_connection, "127.0.0.1", 0
+            )
+            reader, writer = await asyncio.open_connection(
+                "127.0.0.1", listener.sockets[0].getsockname()[1]
+            )
+            writer.write(
+                f"POST /craft HTTP/1.1\r\nContent-Length: {content_length}\r\n\r\n{{}}".encode()
+            )
+            # The server closes the connection, since it can't tell where the next request would start.
+            response = await asyncio.wait_for(reader.read(), 10)
+            writer.close()
+            listener.close()
+            await listener.wait_closed()
+            return response
+
+        assert asyncio.run(send_request()).startswith(b"HTTP/1.1 400 ")
+
+    def test_concurrent_flags(self, monkeypatch):
+        queries = [
+            {
+                "seed": "28RYNMMM",
+                "pickups": [1, 2, 8, 12],
+                "flags": {"has_sacred_orb": True},
+            },
+            {"seed": "28RYNMMM", "pickups": [1, 2, 8, 12]},
+        ] * 4
+        expected = [
+            run_query(*parse_query("find-pickup-recipes", query)) for query in queries
+        ]
+
+        async def run_queries():
+            server = CraftingServer(executor)
+            return await asyncio.gather(
+                *(server.query("find-pickup-recipes", query) for query in queries)
+            )
+
+        # Queries on threads share the global config, so each must still see its own flags, even when another starts
+        # while it's loading game data.
+        get_context = CraftingContext.get
+
+        def slow_get_context(*args):
+            time.sleep(0.01)
+            return get_context(*args)
+
+        monkeypatch.setattr(CraftingContext, "get", staticmethod(slow_get_context))
+        with ThreadPoolExecutor(4) as executor:
+            assert asyncio.run(run_queries()) == expected
+        assert not config["has_sacred_orb"]
+
+
+async def read_stream(server: CraftingServer, path: str, body) -> list:
+    # Send one request, and decode the chunked NDJSON response.
+    listener = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0)
+    reader, writer = await asyncio.open_connection(
+        "127.0.0.1", listener.sockets[0].getsockname()[1]
+    )
+    payload = json.dumps(body).encode("utf-8")
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nConnection: close\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+        + payload
+    )
+    response = await reader.read()
+    writer.close()
+    listener.close()
+    await listener.wait_closed()
+
+    _, _, chunked = response.partition(b"\r\n\r\n")
+    output = b""
+    while True:
+        size, _, chunked = chunked.partition(b"\r\n")
+        if int(size, 16) == 0:
+            break
+        output += chunked[: int(size, 16)]
+        chunked = chunked[int(size, 16) + 2 :]
+    return [json.loads(line) for line in output.splitlines()]
+
+
+class TestEnumerate:
+    def test_stream(self):
+        components = [15, 1, 2, 8, 12]
+        with ThreadPoolExecutor(1) as executor:
+            messages = asyncio.run(
+                read_stream(
+                    CraftingServer(executor),
+                    "/enumerate",
+                    {
+                        "version": "#pc/v1.7.9b",
+                        "seed": "28RYNMMM",
+                        "components": components,
+                    },
+                )
+            )
+
+        # Group the recipes the same way as the web frontend's worker.
+        context = CraftingContext.get("pc", "v1.7.9b")
+        expected = {}
+        recipes = list(itertools.combinations_with_replacement(components, 8))
+        for recipe in recipes:
+            item_recipes = expected.setdefault(
+                context.get_item(recipe, string_to_seed("28RYNMMM")).item_id, []
+            )
+            if len(item_recipes) < 20:
+                item_recipes.append(list(recipe))
+
+        assert messages[0] == {"total": len(recipes)} and messages[-1]["total"] == len(
+            recipes
+        )
+        streamed = {}
+        for message in messages[1:-1]:
+            streamed.setdefault(message["x"], []).extend(message["y"])
+        assert streamed == expected
+
+    def test_disconnect(self):
+        class CountingExecutor(ThreadPoolExecutor):
+            submitted = 0
+
+            def submit(self, *args, **kwargs):
+                CountingExecutor.submitted += 1
+                return super().submit(*args, **kwargs)
+
+        async def disconnect(server: CraftingServer) -> None:
+            # Close the connection once the first recipes arrive, and wait for the server to finish with it.
+            finished = asyncio.Event()
+
+            async def handle_connection(reader, writer):
+                try:
+                    await server.handle_connection(reader, writer)
+                finally:
+                    finished.set()
+
+            listener = await asyncio.start_server(handle_connection, "127.0.0.1", 0)
+            reader, writer = await asyncio.open_connection(
+                "127.0.0.1", listener.sockets[0].getsockname()[1]
+            )
+            body = {
+                "version": "#pc/v1.7.9b",
+                "seed": "28RYNMMM",
+                "components": list(range(1, 15)),
+            }
+            payload = json.dumps(body).encode("utf-8")
+            writer.write(
+                f"POST /enumerate HTTP/1.1\r\nContent-Length: {len(payload)}\r\n\r\n".encode()
+                + payload
+            )
+            while b'"x"' not in await reader.readline():
+                pass
+            writer.close()
+            await asyncio.wait_for(finished.wait(), 60)
+            listener.close()
+            await listener.wait_closed()
+
+        with CountingExecutor(2) as executor:
+            asyncio.run(disconnect(CraftingServer(executor)))
+        # The 203490 recipes take 100 chunks, but only the few in flight when the client left are evaluated.
+        assert CountingExecutor.submitted < 10
+
+
+def wait_for_event(event, channel, cancel_event):
+    # A job which runs until the test lets it finish.
+    event.wait()
+    return "finished"
+
+
+class TestJobs:
+    def test_query_job(self):
+        query = {"seed": "28RYNMMM", "pickups": [1, 2, 8, 12], "items": [45]}
+
+        async def run_job():
+            server = CraftingServer(executor)
+            _, submitted = (
+                await send_requests(
+                    server, [("POST", "/jobs/find-item-recipes", query)]
+                )
+            )[0]
+            while not server.jobs.get(submitted["job_id"]).finished:
+                await asyncio.sleep(0.01)
+            path = f"/jobs/{submitted['job_id']}"
+            return await send_requests(
+                server,
+                [
+                    ("GET", path, None),
+                    ("GET", path + "/results?offset=1", None),
+                    ("DELETE", "/jobs/missing", None),
+                ],
+            )
+
+        with ThreadPoolExecutor(1) as executor:
+            (_, status), (_, results), missing = asyncio.run(run_job())
+            expected = run_query(*parse_query("find-item-recipes", query))
+        assert (
+            status["status"] == "done" and status["evaluated"] == expected["evaluated"]
+        )
+        assert results["results"] == expected["results"][1:]
+        assert missing[0] == 404
+
+    def test_fair_queueing(self):
+        async def run_jobs():
+            jobs = JobManager(executor, max_running=1)
+            events = [threading.Event() for _ in range(4)]
+            first = jobs.submit(wait_for_event, (events[0],), "heavy")
+            heavy = jobs.submit(wait_for_event, (events[1],), "heavy")
+            cancelled = jobs.submit(wait_for_event, (events[2],), "heavy")
+            light = jobs.submit(wait_for_event, (events[3],), "light")
+            jobs.cancel(cancelled.job_id)
+            for event in events:
+                event.set()
+            while jobs.running:
+                await asyncio.sleep(0.01)
+            order = sorted(
+                jobs.list_jobs(), key=lambda job: job.stats.start_time or float("inf")
+            )
+            return [job.job_id for job in order], [first, heavy, cancelled, light]
+
+        with ThreadPoolExecutor(1) as executor:
+            order, (first, heavy, cancelled, light) = asyncio.run(run_jobs())
+        # The light client's job goes before the heavy client's second one, and the cancelled job never starts.
+        assert order == [first.job_id, light.job_id, heavy.job_id, cancelled.job_id]
+        assert cancelled.status == "cancelled" and heavy.summary == "finished"
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,103 @@
+import itertools
+import json
+import os
+import pytest
+from crafting_calculator.calculator import iter_items_for_pickups
+from crafting_calculator.coordinator import ShardCoordinator, merge_shards, run_worker
+from crafting_calculator.multisets import iter_recipes
+from crafting_calculator.shards import get_shard_items, iter_shard_recipes, parse_shard
+
+
+class TestShards:
+    def test_parse_shard(self):
+        assert parse_shard("2/5") == (2, 5)
+        for value in ["5/5", "-1/4", "1", "a/b", "0/0"]:
+            with pytest.raises(ValueError):
+                parse_shard(value)
+
+    def test_shards_cover_everything_once(self):
+        pickups = [1, 2, 8, 12]
+        recipes = list(iter_recipes(pickups))
+        for count in [1, 3, 7]:
+            shards = [
+                list(
+                    iter_shard_recipes(
+                        iter_recipes(pickups), pickups, (index, count), True
+                    )
+                )
+                for index in range(count)
+            ]
+            assert list(itertools.chain(*shards)) == recipes
+            # Ranking each recipe (as for searches which skip some) splits them the same way.
+            assert [
+                list(iter_shard_recipes(iter(recipes), pickups, (index, count)))
+                for index in range(count)
+            ] == shards
+        assert list(
+            itertools.chain(
+                *(get_shard_items(list(range(10)), (index, 4)) for index in range(4))
+            )
+        ) == list(range(10))
+
+    def test_coordinator(self, tmp_path):
+        directory = str(tmp_path / "sweep")
+        argv = [
+            "--seed",
+            "28RYNMMM",
+            "--pickups",
+            "1",
+            "2",
+            "8",
+            "12",
+            "15",
+            "--find-pickup-recipes",
+            "--format",
+            "ndjson",
+            "--shard",
+            "{shard}",
+        ]
+        coordinator = ShardCoordinator.create(directory, argv, 3)
+        with pytest.raises(ValueError):
+            ShardCoordinator.create(directory, argv, 3)
+
+        # Claims are exclusive until they expire.
+        first = coordinator.claim("a")
+        second = coordinator.claim("b")
+        assert first[0] == 0 and second[0] == 1
+        assert coordinator.claim("c")[0] == 2
+        assert coordinator.claim("d") is None
+        # Claims which haven't been renewed for the lease are taken over.
+        for _, claim_path in coordinator.get_claims().values():
+            os.utime(claim_path, (0, 0))
+        assert coordinator.claim("e")[1].endswith("0.1")
+        with pytest.raises(ValueError):
+            merge_shards(directory, str(tmp_path / "merged.ndjson"))
+
+        with pytest.raises(ValueError):
+            run_worker(directory, "f", lease=0)
+        for _, claim_path in coordinator.get_claims().values():
+            os.utime(claim_path, (0, 0))
+        assert run_worker(directory, "f", lease=1, log=lambda message: None) == 3
+        assert coordinator.get_status() == {
+            "shards": 3,
+            "done": 3,
+            "running": 0,
+            "pending": 0,
+        }
+        assert merge_shards(directory, str(tmp_path / "merged.ndjson")) == 3
+        with open(tmp_path / "merged.ndjson") as f:
+            merged = [json.loads(line) for line in f]
+        expected = list(
+            iter_items_for_pickups("pc", "v1.7.9b", "28RYNMMM", [1, 2, 8, 12, 15])
+        )
+        assert [(record["item_id"], record["pickups"]) for record in merged] == [
+            (match.item_id, list(match.pickups)) for match in expected
+        ]
+        assert not any(
+            name.endswith(".tmp")
+            for name in os.listdir(os.path.join(directory, "outputs"))
+        )
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,60 @@
+import random
+import pytest
+from crafting_calculator.context import CraftingContext
+from crafting_calculator.isaac_pickups import PICKUP_LIST
+from crafting_calculator.isaac_rng import string_to_seed
+from crafting_calculator.neighbourhood import get_recipe_swaps
+from crafting_calculator.simulator import BagSimulator, iter_bag_results
+
+
+class TestSimulator:
+    def test_windows_match_single_lookups(self):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        seed = string_to_seed("28RYNMMM")
+        pickup_ids = [pickup.pickup_id for pickup in PICKUP_LIST if pickup is not None]
+        stream = random.Random(0).choices(pickup_ids[:6], k=200) + random.Random(
+            1
+        ).choices(pickup_ids, k=200)
+
+        results = list(iter_bag_results(context, seed, stream))
+        assert len(results) == len(stream) - 7
+        for end, result in enumerate(results, 8):
+            assert list(result.pickups) == stream[end - 8 : end]
+            assert result == context.get_item(stream[end - 8 : end], seed)._replace(
+                pickups=result.pickups
+            )
+
+    def test_bag_fills_before_crafting(self):
+        bag = BagSimulator(
+            CraftingContext.get("pc", "v1.7.9b"), string_to_seed("28RYNMMM")
+        )
+        assert [bag.add(1) for _ in range(7)] == [None] * 7
+        assert bag.add(1) is not None
+        bag.clear()
+        assert bag.add(1) is None
+        with pytest.raises(ValueError):
+            bag.add(0)
+
+    def test_recipe_swaps(self):
+        context = CraftingContext.get("pc", "v1.7.9b")
+        seed = string_to_seed("28RYNMMM")
+        base = [6, 21, 27, 11, 27, 22, 23, 20]
+        swaps = get_recipe_swaps(context, seed, base, [1, 2, 27])
+        assert len(swaps) == 6 * 3 + 2
+        assert len({tuple(swap.pickups) for swap in swaps}) == len(swaps)
+        for swap in swaps:
+            assert sorted(base + [swap.added_id]) == sorted(
+                list(swap.pickups) + [swap.removed_id]
+            )
+            assert context.get_item(swap.pickups, seed) == (
+                swap.pickups,
+                swap.item_id,
+                swap.quality_sum,
+            )
+
+        swaps = get_recipe_swaps(context, seed, base, inventory={1: 1, 27: 2})
+        assert {swap.added_id for swap in swaps} == {1}
+
+
+if __name__ == "__main__":
+    pytest.main()
@@ -0,0 +1,77 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from crafting_calculator.calculator import iter_results_for_pickups
+from crafting_calculator.isaac_rng import string_to_seed
+from crafting_calculator.store import RecipeStore, store_results
+
+
+SEEDS = ["28RYNMMM", "7BVM YW7D"]
+PICKUPS = [1, 2, 8, 12]
+
+
+class TestStore:
+    def test_store_and_query(self, tmp_path):
+        expected = {
+            seed_string: list(
+                iter_results_for_pickups(
+                    "pc", "v1.7.9b", string_to_seed(seed_string), PICKUPS
+                )
+            )
+            for seed_string in SEEDS
+        }
+        with RecipeStore(str(tmp_path / "store.db")) as store, ThreadPoolExecutor(
+            2
+        ) as executor:
+            stored = dict(
+                store_results(store, "pc/v1.7.9b", SEEDS, PICKUPS, executor=executor)
+            )
+            assert [stats.evaluated for stats in stored.values()] == [
+                len(expected[seed_string]) for seed_string in SEEDS
+            ]
+            # Seeds which are already stored, even from more pickups, are skipped.
+            assert dict(
+                store_results(store, "pc/v1.7.9b", SEEDS, [1, 12], executor=executor)
+            ) == {seed_string: None for seed_string in SEEDS}
+
+            for seed_string in SEEDS:
+                assert [
+                    tuple(result)
+                    for result in store.iter_recipes("pc/v1.7.9b", seed_string)
+                ] == [
+                    (list(pickups), item_id, quality_sum)
+                    for pickups, item_id, quality_sum in expected[seed_string]
+                ]
+
+            item_id = expected[SEEDS[0]][0].item_id
+            hearts_and_keys = [
+                seed_string
+                for seed_string in SEEDS
+                if any(
+                    result.item_id == item_id and set(result.pickups) <= {1, 12}
+                    for result in expected[seed_string]
+                )
+            ]
+            assert store.find_seeds_for_item("pc/v1.7.9b", item_id, [1, 12]) == sorted(
+                s.replace(" ", "") for s in hearts_and_keys
+            )
+
+            costs = {1: 1, 2: 5, 8: 2, 12: 3}
+            cheapest = store.find_cheapest_recipes(
+                "pc/v1.7.9b", SEEDS[1], item_id, 3, costs
+            )
+            assert [recipe.cost for recipe in cheapest] == sorted(
+                sum(costs[pickup_id] for pickup_id in result.pickups)
+                for result in expected[SEEDS[1]]
+                if result.item_id == item_id
+            )[:3]
+            assert all(
+                recipe.item_id == item_id and recipe.seed == "7BVMYW7D"
+                for recipe in cheapest
+            )
+
+            # Nothing is stored for other versions.
+            assert store.find_seeds_for_item("pc/v1.7.8a", item_id) == []
+
+
+if __name__ == "__main__":
+    pytest.main()